@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+
+from cache import get_cache
+from key_phrases import get_key_phrase_backend
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_SOURCE = "analysis"
+
+# Memo outcomes in this process: "hits" reused a stored analysis, "misses" had none stored,
+# "stale" had one stored for the location but its inputs have changed since
+memo_counts = {"hits": 0, "misses": 0, "stale": 0}
+
+
+def build_summary(collected_data, gdp, gdp_year, poverty_rate, poverty_year, educational_expense, country):
+    # Create a human-readable summary of collected data
+    summary_parts = []
+
+    # Economic Data Summary
+    if gdp is not None:
+        summary_parts.append(f"GDP of {country} in {gdp_year}: {gdp:.2f} USD.")
+    else:
+        summary_parts.append(f"GDP data for {country} is unavailable.")
+
+    if poverty_rate is not None:
+        summary_parts.append(f"Poverty rate in {country} in {poverty_year}: {poverty_rate}% of the population.")
+    else:
+        summary_parts.append(f"Poverty rate data for {country} is unavailable.")
+
+    if educational_expense is not None:
+        summary_parts.append(f"Educational expenditure of {country}: {educational_expense} USD.")
+    else:
+        summary_parts.append(f"No education data available for {country}.")
+
+    # NDVI Analysis Summary
+    if 'ndvi_data' in collected_data:
+        ndvi_data = collected_data['ndvi_data']
+        ndvi_summary = f"NDVI Summary: Mean: {ndvi_data.get('mean_ndvi', 'N/A')}, Max: {ndvi_data.get('max_ndvi', 'N/A')}, Min: {ndvi_data.get('min_ndvi', 'N/A')}"
+        summary_parts.append(ndvi_summary)
+
+    # Weather Data Analysis Summary
+    if 'weather_data' in collected_data:
+        weather_data = collected_data['weather_data']
+        weather_summary = (
+            f"Temperature: Max: {weather_data['temperature']['max']} K, "
+            f"Avg: {weather_data['temperature']['average']:.2f} K. "
+            f"Average Humidity: {weather_data['humidity']['average']:.2f}%. "
+            f"Total Precipitation: {weather_data['total_precipitation']:.2f} mm. "
+            f"Notable Weather Events: {', '.join(weather_data['key_events'])}"
+        )
+        summary_parts.append(weather_summary)
+
+    # Soil Data Analysis Summary
+    if 'soil_data' in collected_data:
+        soil_summary = collected_data['soil_data']
+        summary_parts.append(f"Soil Data: {soil_summary}")
+
+    # Combine summaries
+    return "\n".join(summary_parts)
+
+
+# Function to generate a detailed analysis of all collected data with the configured key phrase backend
+def generate_analysis(collected_data, gdp, gdp_year, poverty_rate, poverty_year, educational_expense, country, backend=None):
+    combined_summary = build_summary(collected_data, gdp, gdp_year, poverty_rate, poverty_year, educational_expense, country)
+
+    # Extract insights from the summary
+    backend = backend or get_key_phrase_backend()
+    key_phrases = backend.extract([combined_summary])[0]
+
+    # Create a dictionary for a cleaner output
+    analysis_dict = {
+        "Summary": combined_summary,
+        "Key Insights": key_phrases
+    }
+
+    return analysis_dict
+
+
+def generate_analyses(summaries, backend=None):
+    """
+    Key phrases for many summaries in one backend call, so the Azure backend can batch them.
+
+    Parameters:
+    - summaries: list of summary texts from build_summary
+
+    Returns:
+    - list of {"Summary", "Key Insights"} dicts in input order
+    """
+    backend = backend or get_key_phrase_backend()
+    key_phrases = backend.extract(list(summaries))
+    return [
+        {"Summary": summary, "Key Insights": phrases}
+        for summary, phrases in zip(summaries, key_phrases)
+    ]
+
+
+def fingerprint(*inputs):
+    """
+    Stable content hash of JSON-serializable inputs. Keys are sorted so dict ordering does
+    not matter; anything JSON cannot represent is hashed by its string form.
+    """
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def analysis_key(collected_data, country):
+    # One memo entry per location, so a changed input replaces just that location's entry
+    location = collected_data.get("location") or {}
+    if location.get("lat") is not None and location.get("lon") is not None:
+        return {"lat": location["lat"], "lon": location["lon"], "country": country}
+    return {"city": location.get("city", ""), "country": country}
+
+
+def memoized_analysis(collected_data, gdp, gdp_year, poverty_rate, poverty_year, educational_expense, country, backend=None):
+    """
+    generate_analysis with results kept in the shared cache. The stored analysis is reused
+    only while the fingerprint of the collected data, the economic inputs and the key
+    phrase backend is unchanged; otherwise it is recomputed and overwritten.
+
+    Returns:
+    - analysis: dict, as from generate_analysis
+    """
+    backend = backend or get_key_phrase_backend()
+    params = analysis_key(collected_data, country)
+    digest = fingerprint(
+        collected_data, [gdp, gdp_year, poverty_rate, poverty_year, educational_expense, country], backend.name
+    )
+
+    stored = get_cache().get(ANALYSIS_SOURCE, params)
+    if stored is not None and stored.get("fingerprint") == digest:
+        memo_counts["hits"] += 1
+        return stored["analysis"]
+    memo_counts["stale" if stored is not None else "misses"] += 1
+
+    analysis = generate_analysis(
+        collected_data, gdp, gdp_year, poverty_rate, poverty_year, educational_expense, country, backend
+    )
+    get_cache().set(ANALYSIS_SOURCE, params, {"fingerprint": digest, "analysis": analysis})
+    return analysis
+
+
+def memo_stats():
+    """
+    Returns:
+    - dict with hit, miss and stale counts, the hit rate and the number of stored analyses
+    """
+    lookups = sum(memo_counts.values())
+    return dict(
+        memo_counts,
+        hit_rate=round(memo_counts["hits"] / lookups, 4) if lookups else None,
+        entries=get_cache().stats().get(ANALYSIS_SOURCE, {}).get("entries", 0),
+    )
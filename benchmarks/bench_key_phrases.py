@@ -0,0 +1,104 @@
+"""
+Measures key phrase throughput in documents per second on generated impact summaries.
+
+The local RAKE backend always runs. The Azure backend runs against the live service when
+AZURE_LANGUAGE_ENDPOINT and AZURE_LANGUAGE_KEY are set; with --simulated-latency it runs
+against a stand-in client that sleeps that long per call instead, which shows the effect
+of batching without network access.
+
+Run from the repository root:
+    python -m benchmarks.bench_key_phrases --documents 500
+    python -m benchmarks.bench_key_phrases --documents 100 --simulated-latency 0.2
+"""
+import argparse
+import os
+import random
+import time
+from types import SimpleNamespace
+
+from analysis import build_summary
+from key_phrases import AzureKeyPhraseBackend, RakeKeyPhraseBackend
+
+COUNTRIES = ["Kenya", "India", "Brazil", "United Kingdom", "Australia", "Peru", "Viet Nam", "Ghana"]
+SOIL_PROPERTIES = [("CLAY", "g/kg"), ("SAND", "g/kg"), ("SILT", "g/kg"), ("PHH2O", "pH*10"), ("SOC", "dg/kg")]
+
+
+def make_summaries(count, seed=0):
+    rng = random.Random(seed)
+    summaries = []
+    for _ in range(count):
+        country = rng.choice(COUNTRIES)
+        events = [
+            f"Notable rainfall of {rng.uniform(10, 60):.1f}mm on 2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            for _ in range(rng.randint(0, 8))
+        ]
+        collected_data = {
+            "ndvi_data": {"mean_ndvi": rng.uniform(0, 0.8), "max_ndvi": rng.uniform(0.8, 1), "min_ndvi": rng.uniform(-0.2, 0)},
+            "weather_data": {
+                "temperature": {"max": rng.uniform(295, 315), "average": rng.uniform(280, 300)},
+                "humidity": {"average": rng.uniform(30, 90)},
+                "total_precipitation": rng.uniform(100, 2500),
+                "key_events": [f"Highest temperature recorded on 2023-07-{rng.randint(1, 31):02d}"] + events,
+            },
+            "soil_data": "; ".join(
+                f"{name} content at 0-5cm: {rng.randint(5, 600)} ({unit})" for name, unit in SOIL_PROPERTIES
+            ),
+        }
+        summaries.append(build_summary(
+            collected_data, rng.uniform(1e10, 3e12), 2021, rng.choice([None, rng.uniform(0, 40)]), 2019,
+            rng.choice([None, rng.uniform(1e8, 1e11)]), country,
+        ))
+    return summaries
+
+
+class SimulatedAzureClient:
+    # Stands in for TextAnalyticsClient: a fixed delay per call, whatever the batch size
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def extract_key_phrases(self, documents):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [SimpleNamespace(is_error=False, key_phrases=[]) for _ in documents]
+
+
+def run(backend, summaries, one_per_call=False):
+    started = time.perf_counter()
+    if one_per_call:
+        # The old behaviour: one request per summary
+        for summary in summaries:
+            backend.extract([summary])
+    else:
+        backend.extract(summaries)
+    elapsed = time.perf_counter() - started
+    return elapsed, len(summaries) / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--simulated-latency", type=float, default=None, help="seconds per Azure call for the stand-in client")
+    args = parser.parse_args()
+
+    summaries = make_summaries(args.documents)
+    average_length = sum(len(summary) for summary in summaries) / len(summaries)
+    print(f"{len(summaries)} summaries, {average_length:.0f} characters on average")
+
+    elapsed, rate = run(RakeKeyPhraseBackend(), summaries)
+    print(f"local RAKE: {elapsed:.3f} s, {rate:,.0f} documents/s")
+
+    if args.simulated_latency is not None:
+        azure_runs = [("simulated Azure", lambda: SimulatedAzureClient(args.simulated_latency))]
+    elif os.getenv("AZURE_LANGUAGE_ENDPOINT") and os.getenv("AZURE_LANGUAGE_KEY"):
+        azure_runs = [("Azure", lambda: None)]
+    else:
+        azure_runs = []
+        print("Skipping Azure: set AZURE_LANGUAGE_ENDPOINT and AZURE_LANGUAGE_KEY or pass --simulated-latency")
+
+    for label, make_client in azure_runs:
+        for one_per_call in (True, False):
+            backend = AzureKeyPhraseBackend(client=make_client())
+            elapsed, rate = run(backend, summaries, one_per_call)
+            mode = "one document per call" if one_per_call else f"batches of {backend.batch_size}"
+            print(f"{label}, {mode}: {elapsed:.3f} s, {rate:,.1f} documents/s")
@@ -0,0 +1,84 @@
+"""
+Compares the old NDVI path (GeoTIFF on disk -> ImageMagick PNG -> PIL -> grayscale rescale)
+with the in-memory rasterio path on a synthetic float NDVI raster.
+
+Run from the repository root:
+    python -m benchmarks.bench_ndvi --size 1024 --repeat 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from rasterio.io import MemoryFile
+from rasterio.transform import from_origin
+
+from ndvi import analyze_ndvi_data, read_ndvi_band
+
+
+def make_ndvi_geotiff(size, nodata_fraction=0.05, seed=0):
+    # Smooth vegetation field with noise and a few nodata holes, like a Sentinel-2 composite
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / size
+    ndvi = 0.6 * np.sin(3 * x) * np.cos(2 * y) + rng.normal(0, 0.1, (size, size))
+    ndvi = np.clip(ndvi, -1, 1).astype("float32")
+    ndvi[rng.random((size, size)) < nodata_fraction] = -9999
+
+    profile = {
+        "driver": "GTiff", "height": size, "width": size, "count": 1, "dtype": "float32",
+        "crs": "EPSG:4326", "transform": from_origin(0, 0, 0.00027, 0.00027), "nodata": -9999,
+    }
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as dataset:
+            dataset.write(ndvi, 1)
+        return memfile.read()
+
+
+def old_path(geotiff, workdir):
+    from PIL import Image as img
+    from wand.image import Image
+
+    tif_path = os.path.join(workdir, "ndvi_image.tif")
+    png_path = os.path.join(workdir, "ndvi_image.png")
+    with open(tif_path, "wb") as tif_file:
+        tif_file.write(geotiff)
+    with Image(filename=tif_path) as image:
+        image.format = "png"
+        image.save(filename=png_path)
+    return analyze_ndvi_data(np.array(img.open(png_path)))
+
+
+def new_path(geotiff):
+    return analyze_ndvi_data(read_ndvi_band(geotiff))
+
+
+def best_of(repeat, func, *args):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024, help="raster width and height in pixels")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    geotiff = make_ndvi_geotiff(args.size)
+    print(f"Sample raster: {args.size}x{args.size} float32, {len(geotiff)} bytes")
+
+    new_seconds, new_summary = best_of(args.repeat, new_path, geotiff)
+    print(f"in-memory rasterio: {new_seconds * 1000:.1f} ms  {new_summary}")
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            old_seconds, old_summary = best_of(args.repeat, old_path, geotiff, workdir)
+        print(f"disk + PNG round-trip: {old_seconds * 1000:.1f} ms  {old_summary}")
+        print(f"speed-up: {old_seconds / new_seconds:.1f}x")
+    except ImportError as e:
+        print(f"Skipping the old path, Wand/PIL not installed: {e}")
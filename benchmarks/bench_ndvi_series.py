@@ -0,0 +1,72 @@
+"""
+Runs the NDVI time series against the offline Earth Engine stand-in and compares the
+single stacked reduction with one reduceRegion request per period.
+
+Both paths must agree period by period; the report shows how many Earth Engine round
+trips each one needs and what the cloud mask changes in the seasonal signal.
+
+Run from the repository root:
+    python -m benchmarks.bench_ndvi_series --start 2021-01-01 --end 2024-01-01
+    python -m benchmarks.bench_ndvi_series --interval 3
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import ndvi
+from benchmarks import fake_ee
+from ndvi import reduce_ndvi_series, series_periods, summarize_ndvi_series
+
+
+def per_period(ee, lat, lon, start_date, end_date, interval):
+    # One composite and one getInfo per period, the way separate exports would run
+    periods = series_periods(start_date, end_date, interval)
+    region = ee.Geometry.Point([lon, lat]).buffer(ndvi.NDVI_BUFFER_METERS)
+    means = []
+    for i, period in enumerate(periods):
+        image = ndvi.ndvi_series_image(ee, region, [period])
+        properties = image.reduceRegion(reducer=ee.Reducer.mean(), geometry=region, scale=ndvi.NDVI_SCALE).getInfo()
+        means.append(properties.get("NDVI_0"))
+    return means
+
+
+def timed(func, *args):
+    calls = fake_ee.getinfo_calls
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started, fake_ee.getinfo_calls - calls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lat", type=float, default=51.5)
+    parser.add_argument("--lon", type=float, default=-0.12)
+    parser.add_argument("--start", default="2021-01-01")
+    parser.add_argument("--end", default="2024-01-01")
+    parser.add_argument("--interval", type=int, default=1, help="months per composite")
+    args = parser.parse_args()
+
+    window = (args.lat, args.lon, args.start, args.end, args.interval)
+    series, stacked_seconds, stacked_calls = timed(reduce_ndvi_series, fake_ee, *window)
+    separate, separate_seconds, separate_calls = timed(per_period, fake_ee, *window)
+
+    stacked = np.array([np.nan if value is None else value for value in series["mean"]])
+    separate = np.array([np.nan if value is None else value for value in separate])
+    assert np.allclose(stacked, separate, equal_nan=True), "stacked and per-period reductions disagree"
+
+    summary = summarize_ndvi_series(series)
+    mask_clouds = ndvi.mask_clouds
+    ndvi.mask_clouds = lambda ee, image: image
+    try:
+        unmasked = summarize_ndvi_series(reduce_ndvi_series(fake_ee, *window))
+    finally:
+        ndvi.mask_clouds = mask_clouds
+
+    print(f"{len(series['periods'])} periods of {args.interval} month(s)")
+    print(f"stacked:    {stacked_calls:>3} getInfo calls  {stacked_seconds * 1000:8.1f} ms")
+    print(f"per period: {separate_calls:>3} getInfo calls  {separate_seconds * 1000:8.1f} ms")
+    print(f"seasonal amplitude with cloud mask {summary['seasonality']['amplitude']}, "
+          f"without {unmasked['seasonality']['amplitude']}")
+    print(json.dumps({key: summary[key] for key in ("trend", "seasonality", "anomalies", "periods_with_data")}, indent=4))
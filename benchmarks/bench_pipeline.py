@@ -0,0 +1,326 @@
+"""
+Offline benchmark of the collection -> assessment path.
+
+Every external service is replaced: OpenWeather, SoilGrids, World Bank, OECD and Azure by
+the fixture-backed stub server (benchmarks/stub_server.py), Earth Engine by
+benchmarks/fake_ee.py. The agents' handlers are driven directly through an in-process
+context that routes messages between them, so no network or wallet is needed.
+
+Two groups of measurements go into one JSON report:
+- micro: aggregate_weather_data, analyze_ndvi_data, analyze_soil_data and generate_analysis
+- end_to_end: handle_data_request through handle_collected_data, first with empty caches
+  (cold) and then again for the same cities (warm)
+
+Each entry has throughput and p50/p95/p99 latency. Pass --compare with an earlier report
+to print the change per measurement.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline --output bench_report.json
+    python -m benchmarks.bench_pipeline --latency 0.05 --error-rate 0.02 --compare bench_report.json
+    python -m benchmarks.bench_pipeline --micro-only
+    python -m benchmarks.bench_pipeline --wire-version 2 --compare bench_report.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from benchmarks import fake_ee
+from benchmarks.stub_server import StubServer, StubTextAnalyticsClient, load_fixture
+
+BENCH_SENDER = "bench"
+DATA_COLLECTION = "data_collection_agent"
+IMPACT_ASSESSMENT = "impact_assessment_agent"
+
+
+def latency_summary(timings, elapsed=None):
+    """
+    Returns:
+    - dict with count, throughput per second and mean/p50/p95/p99 latency in milliseconds.
+      Throughput uses `elapsed` wall time when given (concurrent runs), else the sum of timings.
+    """
+    timings = np.asarray(timings, dtype=float)
+    if len(timings) == 0:
+        return {"count": 0}
+    wall = elapsed if elapsed is not None else float(timings.sum())
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1000
+    return {
+        "count": int(len(timings)),
+        "throughput_per_s": round(len(timings) / wall, 3) if wall > 0 else None,
+        "mean_ms": round(float(timings.mean()) * 1000, 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def time_calls(func, iterations, warmup=3):
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return latency_summary(timings)
+
+
+def configure_environment(workdir, args):
+    # Module-level settings are read at import, so this runs before any agent module is imported
+    os.environ["FETCH_CACHE_PATH"] = os.path.join(workdir, "cache.sqlite3")
+    os.environ["WEATHER_STORE_DIR"] = os.path.join(workdir, "weather_store")
+    os.environ["WEATHER_WINDOW_DAYS"] = str(args.days)
+    os.environ["DATA_COLLECTION_METRICS_PORT"] = "0"
+    os.environ["IMPACT_METRICS_PORT"] = "0"
+    os.environ["FUND_AGENT"] = "0"
+    os.environ["JOB_SCRATCH_DIR"] = os.path.join(workdir, "scratch")
+    os.environ["JOB_QUEUE_DEPTH"] = str(max(args.cities, 32))
+    os.environ["KEY_PHRASE_BACKEND"] = "local" if args.key_phrases == "local" else "azure"
+    if not args.respect_quotas:
+        # The stub has no quota; keep the limiters from dominating the measurement
+        for name in ("OPEN_WEATHER_CALLS_PER_MINUTE", "SOILGRIDS_CALLS_PER_MINUTE"):
+            os.environ[name] = "1000000"
+        for name in ("OPEN_WEATHER_BURST", "SOILGRIDS_BURST"):
+            os.environ[name] = "1000"
+    sys.modules["ee"] = fake_ee
+
+
+def load_agents(base_url):
+    import data_collection
+    import geocoding
+    import indicators
+    import soil
+
+    geocoding.GEOCODE_URL = f"{base_url}/geo/1.0/direct"
+    geocoding.REVERSE_GEOCODE_URL = f"{base_url}/geo/1.0/reverse"
+    data_collection.BASE_WEATHER_URL = f"{base_url}/data/3.0/onecall"
+    data_collection.OPEN_WEATHER_API_KEY = data_collection.OPEN_WEATHER_API_KEY or "bench"
+    soil.SOILGRIDS_URL = f"{base_url}/soilgrids/v2.0/properties/query"
+    indicators.WORLD_BANK_URL = f"{base_url}/v2/country"
+    indicators.OECD_EXPENDITURE_URL = f"{base_url}/oecd/data"
+
+
+def use_key_phrase_backend(kind, base_url):
+    from key_phrases import AzureKeyPhraseBackend, RakeKeyPhraseBackend, set_key_phrase_backend
+
+    if kind == "azure-stub":
+        set_key_phrase_backend(AzureKeyPhraseBackend(client=StubTextAnalyticsClient(base_url)))
+    elif kind == "local":
+        set_key_phrase_backend(RakeKeyPhraseBackend())
+    # "azure" keeps the live service configured through AZURE_LANGUAGE_ENDPOINT/KEY
+
+
+def run_micro(stub, iterations, base_url):
+    from analysis import generate_analysis
+    from key_phrases import AzureKeyPhraseBackend, RakeKeyPhraseBackend
+    from ndvi import analyze_ndvi_data, read_ndvi_band
+    from soil import analyze_soil_data
+    from weather_series import WeatherSeries, aggregate_weather_data
+    from benchmarks.bench_ndvi import make_ndvi_geotiff
+
+    city = load_fixture("cities.json")[0]
+    end = date.today() - timedelta(days=1)
+    days = [stub.make_day_summary(city["lat"], city["lon"], end - timedelta(days=n)) for n in range(365)]
+    series = WeatherSeries.from_day_summaries(days)
+    ndvi_band = read_ndvi_band(make_ndvi_geotiff(512))
+    soil_data = dict(stub.make_soilgrids(city["lat"], city["lon"]), probe={"lat": city["lat"], "lon": city["lon"], "ring": 0, "distance_km": 0.0})
+
+    collected_data = {
+        "weather_data": aggregate_weather_data(days),
+        "ndvi_data": analyze_ndvi_data(ndvi_band),
+        "soil_data": analyze_soil_data(soil_data),
+        "country_code": city["country"],
+    }
+    economic = (3.1e12, "2021", 1.2, "2019", 1.2e11, "United Kingdom")
+    azure = AzureKeyPhraseBackend(client=StubTextAnalyticsClient(base_url))
+    local = RakeKeyPhraseBackend()
+
+    return {
+        "aggregate_weather_data[365 day summaries]": time_calls(lambda: aggregate_weather_data(days), iterations),
+        "aggregate_weather_data[WeatherSeries]": time_calls(lambda: aggregate_weather_data(series), iterations),
+        "analyze_ndvi_data[512x512]": time_calls(lambda: analyze_ndvi_data(ndvi_band), iterations),
+        "analyze_soil_data": time_calls(lambda: analyze_soil_data(soil_data), iterations),
+        "generate_analysis[local]": time_calls(lambda: generate_analysis(collected_data, *economic, backend=local), iterations),
+        "generate_analysis[azure-stub]": time_calls(lambda: generate_analysis(collected_data, *economic, backend=azure), iterations),
+    }
+
+
+class BenchContext:
+    """
+    Just enough of uagents.Context for the handlers: a logger and send(), with messages
+    delivered in-process through the harness.
+    """
+
+    def __init__(self, harness, name):
+        self.harness = harness
+        self.name = name
+        self.logger = logging.getLogger(name)
+
+    async def send(self, destination, message):
+        await self.harness.deliver(self.name, destination, message)
+
+
+class Harness:
+    def __init__(self, wire_version=1):
+        import data_collection
+        import impact_assessment
+
+        self.wire_version = wire_version
+        self.data_collection = data_collection
+        self.impact_assessment = impact_assessment
+        self.collection_ctx = BenchContext(self, DATA_COLLECTION)
+        self.impact_ctx = BenchContext(self, IMPACT_ASSESSMENT)
+        self.pending = {}
+        self.assessments = set()
+        self.failures = 0
+
+    async def deliver(self, sender, destination, message):
+        from data_sharing import CollectedData, CollectedDataV2
+
+        if sender == DATA_COLLECTION and destination == BENCH_SENDER:
+            # Error replies from the collection agent end the request
+            self._finish(message.correlation_id, ok=False)
+        elif sender == DATA_COLLECTION and isinstance(message, (CollectedData, CollectedDataV2)):
+            # Anything else the collection agent sends goes to the impact agent
+            task = asyncio.create_task(self._assess(message))
+            self.assessments.add(task)
+            task.add_done_callback(self.assessments.discard)
+
+    async def _assess(self, message):
+        try:
+            await self.impact_assessment.assess_collected_data(self.impact_ctx, DATA_COLLECTION, message)
+            self._finish(message.correlation_id, ok=True)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Assessment {message.correlation_id} failed: {e!r}")
+            self._finish(message.correlation_id, ok=False)
+
+    def _finish(self, correlation_id, ok):
+        future = self.pending.pop(correlation_id, None)
+        if future is not None and not future.done():
+            if not ok:
+                self.failures += 1
+            future.set_result(ok)
+
+    async def request(self, city, correlation_id):
+        from data_sharing import LocationRequest
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[correlation_id] = future
+        started = time.perf_counter()
+        await self.data_collection.handle_data_request(
+            self.collection_ctx, BENCH_SENDER,
+            LocationRequest(city=city, correlation_id=correlation_id, accept_versions=list(range(1, self.wire_version + 1))),
+        )
+        await future
+        return time.perf_counter() - started
+
+    async def run_phase(self, phase, cities, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        failures_before = self.failures
+
+        async def one(i, city):
+            async with semaphore:
+                return await self.request(city, f"{phase}-{i}")
+
+        started = time.perf_counter()
+        timings = await asyncio.gather(*(one(i, city) for i, city in enumerate(cities)))
+        elapsed = time.perf_counter() - started
+        return dict(latency_summary(timings, elapsed), failed=self.failures - failures_before)
+
+
+async def run_end_to_end(stub, cities, concurrency, wire_version=1):
+    from metrics import registry
+
+    harness = Harness(wire_version)
+    results = {}
+    for phase in ("cold", "warm"):
+        calls_before = dict(stub.calls)
+        registry.reset()
+        results[phase] = await harness.run_phase(phase, cities, concurrency)
+        results[phase]["stub_calls"] = {
+            route: count - calls_before.get(route, 0) for route, count in stub.calls.items()
+            if count - calls_before.get(route, 0)
+        }
+        results[phase]["stages"] = {
+            histogram["labels"]["stage"]: round(histogram["sum"] / histogram["count"] * 1000, 3)
+            for histogram in registry.snapshot()["histograms"]
+            if histogram["name"] == "stage_duration_seconds"
+        }
+    await harness.impact_assessment.indicator_service.close()
+    return results
+
+
+def compare(report, previous):
+    # Ratio of new to old latency per measurement; below 1.0 is faster
+    print(f"{'measurement':<55} {'old p50 ms':>11} {'new p50 ms':>11} {'ratio':>7}")
+    for group in ("micro", "end_to_end"):
+        for name, new in report.get(group, {}).items():
+            old = previous.get(group, {}).get(name)
+            if not old or not old.get("p50_ms") or not new.get("p50_ms"):
+                continue
+            print(f"{group + ':' + name:<55} {old['p50_ms']:>11.3f} {new['p50_ms']:>11.3f} {new['p50_ms'] / old['p50_ms']:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    parser.add_argument("--iterations", type=int, default=50, help="calls per micro-benchmark")
+    parser.add_argument("--cities", type=int, default=12, help="cities per end-to-end phase, taken from the fixtures")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--days", type=int, default=365, help="weather window per request")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every stub response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub responses that are 503s")
+    parser.add_argument("--key-phrases", choices=["local", "azure-stub", "azure"], default="azure-stub")
+    parser.add_argument("--respect-quotas", action="store_true", help="keep the production rate limits")
+    parser.add_argument("--wire-version", type=int, choices=[1, 2], default=1, help="CollectedData version the requests accept")
+    parser.add_argument("--micro-only", action="store_true")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    previous = None
+    if args.compare:
+        with open(args.compare) as previous_file:
+            previous = json.load(previous_file)
+
+    logging.basicConfig(level=logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    configure_environment(workdir, args)
+    # Output files the handlers write land in the scratch directory
+    os.chdir(workdir)
+
+    stub = StubServer(args.latency, args.jitter, args.error_rate)
+    base_url = stub.start()
+    try:
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "micro": run_micro(stub, args.iterations, base_url),
+        }
+        if not args.micro_only:
+            load_agents(base_url)
+            use_key_phrase_backend(args.key_phrases, base_url)
+            cities = [city["name"] for city in load_fixture("cities.json")]
+            cities = (cities * (args.cities // len(cities) + 1))[:args.cities]
+            report["end_to_end"] = asyncio.run(run_end_to_end(stub, cities, args.concurrency, args.wire_version))
+        report["stub_errors_injected"] = stub.errors
+    finally:
+        stub.stop()
+
+    with open(output, "w") as report_file:
+        json.dump(report, report_file, indent=4)
+    print(json.dumps(report, indent=4))
+    print(f"Report written to {output}; scratch files in {workdir}")
+    if previous is not None:
+        compare(report, previous)
+
+
+if __name__ == "__main__":
+    main()
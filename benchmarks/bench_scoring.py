@@ -0,0 +1,110 @@
+"""
+Measures comparative impact scoring over many locations.
+
+Generated collected data for --locations sites across the fixture countries goes through
+location_metrics and ComparativeScorer the way the impact agent handles arriving results,
+with the table rewritten as they come in. Economic data comes from IndicatorService against
+the stub server (benchmarks/stub_server.py) through CountryEconomics, so each country is
+looked up once. A sample of percentiles and ranks is checked against a plain per-location
+computation.
+
+Run from the repository root:
+    python -m benchmarks.bench_scoring --locations 5000
+    python -m benchmarks.bench_scoring --locations 20000 --flush-interval 0.5
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.stub_server import StubServer, load_fixture
+
+
+def make_collected_data(rng, countries, count):
+    records = []
+    for i in range(count):
+        country = rng.choice(countries)
+        records.append({
+            "location": {"city": f"Site {i}", "lat": rng.uniform(-50, 60), "lon": rng.uniform(-180, 180)},
+            "country_code": country,
+            "ndvi_data": {"mean_ndvi": round(rng.uniform(-0.1, 0.8), 2)} if rng.random() > 0.05 else "NDVI data could not be analyzed due to an error.",
+            "weather_data": {"temperature": {"average": rng.uniform(270, 305)}, "total_precipitation": rng.uniform(50, 3000)},
+            "soil_report": {"coordinates": None, "probe_distance_km": None, "layers": [
+                {"name": "soc", "depth": "0-5cm", "mean": rng.randint(50, 900), "unit": "dg/kg"}
+            ] if rng.random() > 0.2 else []},
+        })
+    return records
+
+
+def percentile(values, value):
+    valid = [v for v in values if v == v]
+    return (sum(v < value for v in valid) + sum(v <= value for v in valid)) / (2 * len(valid)) * 100
+
+
+async def run(args, workdir):
+    import indicators
+    from scoring import SCORE_METRICS, ComparativeScorer, CountryEconomics, location_metrics
+
+    stub = StubServer()
+    base_url = stub.start()
+    indicators.WORLD_BANK_URL = f"{base_url}/v2/country"
+    indicators.OECD_EXPENDITURE_URL = f"{base_url}/oecd/data"
+    service = indicators.IndicatorService()
+    try:
+        rng = random.Random(args.seed)
+        records = make_collected_data(rng, sorted(load_fixture("countries.json")), args.locations)
+        economics = CountryEconomics(service)
+        scorer = ComparativeScorer(os.path.join(workdir, "impact_scores.csv"), args.flush_interval)
+
+        started = time.perf_counter()
+        flushes = 0
+        for collected_data in records:
+            economic_data = await economics.get(collected_data["country_code"])
+            scorer.add(collected_data["location"]["city"], collected_data["country_code"],
+                       location_metrics(collected_data, economic_data))
+            flushes += scorer.flush()
+        scorer.dirty = True
+        flushes += scorer.flush(force=True)
+        elapsed = time.perf_counter() - started
+        lookups = dict(stub.calls)
+    finally:
+        await service.close()
+        stub.stop()
+
+    started = time.perf_counter()
+    table = scorer.scores()
+    scoring_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    scorer.dirty = True
+    scorer.flush(force=True)
+    write_seconds = time.perf_counter() - started
+
+    for i in rng.sample(range(len(scorer)), min(args.verify, len(scorer))):
+        for name in SCORE_METRICS:
+            value = table[name][i]
+            if value == value:
+                expected = percentile(list(table[name]), value)
+                assert abs(table[f"{name}_percentile"][i] - expected) < 1e-9, f"{name} percentile of row {i}"
+        expected_rank = 1 + sum(score > table["score"][i] for score in table["score"] if score == score)
+        assert table["rank"][i] == expected_rank, f"rank of row {i}"
+
+    print(f"{len(scorer)} locations in {elapsed:.2f}s ({len(scorer) / elapsed:,.0f} per second), {flushes} table writes")
+    print(f"stub calls for economic data: {lookups}")
+    print(f"scoring all locations {scoring_seconds * 1000:.1f} ms, writing the table {write_seconds * 1000:.1f} ms")
+    print(f"checked {args.verify} rows against a per-location computation; table in {scorer.path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=5000)
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="least seconds between table writes")
+    parser.add_argument("--verify", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_scoring_")
+    # The cache path is read when the cache module is imported
+    os.environ["FETCH_CACHE_PATH"] = os.path.join(workdir, "cache.sqlite3")
+    asyncio.run(run(args, workdir))
@@ -0,0 +1,81 @@
+"""
+Measures nearest-location lookups in the location index with many stored points.
+
+Points are scattered over land-sized clusters around a few hundred centres, which is how
+collected locations bunch up in practice. Queries fall half near stored points and half
+anywhere, and the result is compared against a brute-force scan for a sample of queries.
+
+Run from the repository root:
+    python -m benchmarks.bench_spatial --points 300000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from spatial_index import REUSE_RADIUS_KM, LocationIndex, haversine_km
+
+
+def scatter(rng, count, centres=300, spread_degrees=2.0):
+    hubs = [(rng.uniform(-55, 70), rng.uniform(-180, 180)) for _ in range(centres)]
+    points = []
+    for _ in range(count):
+        lat, lon = rng.choice(hubs)
+        points.append((lat + rng.gauss(0, spread_degrees), (lon + rng.gauss(0, spread_degrees) + 180) % 360 - 180))
+    return points
+
+
+def brute_force(points, lat, lon, radius_km):
+    best = None
+    for p_lat, p_lon in points:
+        distance = haversine_km(lat, lon, p_lat, p_lon)
+        if distance <= radius_km and (best is None or distance < best[2]):
+            best = (p_lat, p_lon, distance)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--verify", type=int, default=50, help="queries checked against a brute-force scan")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    points = scatter(rng, args.points)
+    queries = [
+        (lat + rng.gauss(0, 0.01), lon + rng.gauss(0, 0.01)) if rng.random() < 0.5 else (rng.uniform(-60, 75), rng.uniform(-180, 180))
+        for lat, lon in (rng.choice(points) for _ in range(args.queries))
+    ]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        index = LocationIndex(os.path.join(workdir, "index.sqlite3"))
+        started = time.perf_counter()
+        for source in REUSE_RADIUS_KM:
+            for lat, lon in points:
+                index.grids[source].add(lat, lon)
+        print(f"Indexed {args.points} points for {len(REUSE_RADIUS_KM)} sources in {time.perf_counter() - started:.2f}s")
+
+        for source, radius in REUSE_RADIUS_KM.items():
+            grid = index.grids[source]
+            timings = []
+            found = 0
+            for lat, lon in queries:
+                started = time.perf_counter()
+                result = grid.nearest(lat, lon, radius)
+                timings.append(time.perf_counter() - started)
+                found += result is not None
+            timings.sort()
+            print(
+                f"{source:<16} radius {radius:>5} km  found {found / len(queries):6.1%}  "
+                f"mean {statistics.mean(timings) * 1e6:7.1f} us  p99 {timings[int(len(timings) * 0.99)] * 1e6:7.1f} us"
+            )
+            for lat, lon in queries[:args.verify]:
+                expected = brute_force(points, lat, lon, radius)
+                actual = grid.nearest(lat, lon, radius)
+                assert (expected is None) == (actual is None) and (expected is None or abs(expected[2] - actual[2]) < 1e-9), \
+                    f"{source}: mismatch at {lat}, {lon}: {actual} != {expected}"
+        print(f"Checked {args.verify} queries per source against a brute-force scan")
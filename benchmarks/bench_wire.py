@@ -0,0 +1,115 @@
+"""
+Compares the CollectedData wire versions on message size and encode/decode time.
+
+The collected data is built the way the data collection agent builds it: a year of daily
+weather from the stub's day summaries, a SoilGrids response and an NDVI time series from
+the offline Earth Engine stand-in. Three messages are measured:
+- v1: CollectedData with the plain dict, including the precomputed weather statistics
+- v2: CollectedDataV2 with typed fields and no daily series
+- v2+daily: CollectedDataV2 carrying the daily weather series as packed arrays
+
+Encoding is building the message and serializing it to JSON; decoding is parsing the JSON
+and turning the message back into the collected data dict. The v2+daily message must decode
+to the same data as v1, statistics included.
+
+Run from the repository root:
+    python -m benchmarks.bench_wire
+    python -m benchmarks.bench_wire --days 1095 --iterations 500
+"""
+import argparse
+import json
+import time
+import zlib
+from datetime import date, timedelta
+
+from benchmarks import fake_ee
+from benchmarks.stub_server import StubServer, load_fixture
+from data_sharing import CollectedData, CollectedDataV2
+from ndvi import reduce_ndvi_series, summarize_ndvi_series
+from soil import format_soil_summary, soil_report
+from weather_series import aggregate_weather_data
+from weather_store import day_records, to_series
+from wire import decode_collected_data, encode_collected_data
+
+# Three years of monthly composites, inside the span the fake Sentinel-2 collection covers
+NDVI_WINDOW = ("2021-01-01", "2024-01-01")
+
+
+def make_collected_data(days):
+    stub = StubServer()
+    city = load_fixture("cities.json")[0]
+    end = date.today() - timedelta(days=1)
+    summaries = [stub.make_day_summary(city["lat"], city["lon"], end - timedelta(days=n)) for n in range(days)]
+    # The pipeline aggregates the series read back from the weather store
+    series = to_series(day_records(sorted(summaries, key=lambda day: day["date"])))
+    report = soil_report(stub.make_soilgrids(city["lat"], city["lon"]))
+
+    data = {
+        "weather_data": aggregate_weather_data(series),
+        "soil_data": format_soil_summary(report),
+        "soil_report": report,
+        "ndvi_data": summarize_ndvi_series(
+            reduce_ndvi_series(fake_ee, city["lat"], city["lon"], *NDVI_WINDOW)
+        ),
+        "country_code": city["country"],
+        "source_points": {
+            stage: {"lat": city["lat"], "lon": city["lon"], "distance_km": 0.0}
+            for stage in ("weather_data", "soil_data", "ndvi_data", "country_code")
+        },
+        "location": {"city": city["name"], "lat": city["lat"], "lon": city["lon"]},
+    }
+    return data, series
+
+
+def measure(encode, model, iterations):
+    """
+    Returns:
+    - dict with the JSON size, its zlib-compressed size and the mean encode/decode time
+    """
+    payload = encode().json()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        encode().json()
+    encode_seconds = (time.perf_counter() - started) / iterations
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        decoded = decode_collected_data(model.parse_raw(payload))
+    decode_seconds = (time.perf_counter() - started) / iterations
+    return {
+        "bytes": len(payload.encode("utf-8")),
+        "zlib_bytes": len(zlib.compress(payload.encode("utf-8"))),
+        "encode_us": round(encode_seconds * 1e6, 1),
+        "decode_us": round(decode_seconds * 1e6, 1),
+    }, decoded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365, help="days of weather in the collected data")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    data, series = make_collected_data(args.days)
+    variants = {
+        "v1": (lambda: encode_collected_data(data, 1, "bench"), CollectedData),
+        "v2": (lambda: encode_collected_data(data, 2, "bench"), CollectedDataV2),
+        "v2+daily": (lambda: encode_collected_data(data, 2, "bench", series), CollectedDataV2),
+    }
+
+    results = {}
+    decoded = {}
+    for name, (encode, model) in variants.items():
+        results[name], decoded[name] = measure(encode, model, args.iterations)
+
+    expected = json.loads(json.dumps(data))
+    assert decoded["v1"] == expected, "v1 does not round-trip"
+    assert decoded["v2+daily"] == expected, "v2 with the daily series does not decode to the v1 data"
+
+    baseline = results["v1"]["bytes"]
+    print(f"{args.days} days of weather, {len(data['ndvi_data']['periods'])} NDVI periods")
+    for name, result in results.items():
+        print(
+            f"{name:<9} {result['bytes']:>8} bytes ({result['bytes'] / baseline:6.1%} of v1)  "
+            f"{result['zlib_bytes']:>7} zlib bytes  encode {result['encode_us']:>8} us  decode {result['decode_us']:>8} us"
+        )
@@ -0,0 +1,338 @@
+"""
+Offline stand-in for the parts of the Earth Engine API this project uses.
+
+Images are procedural: each band is a function of (lat, lon) arrays, and region reductions
+sample pixel centres inside the geometry at the requested scale. The default Sentinel-2
+collection has a seasonal, spatially varying NDVI signal and per-scene cloud percentages,
+so filters, composites and reducers behave like the real thing at small scale.
+
+Pass the module wherever the code takes an `ee` argument, or install it as `ee` in
+sys.modules before importing the agents.
+"""
+import math
+import warnings
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+METRES_PER_DEGREE = 111320.0
+MAX_SAMPLES = 20000
+
+# Number of getInfo round trips, so callers can check how many requests a path would make
+getinfo_calls = 0
+
+
+def Initialize(*args, **kwargs):
+    pass
+
+
+def ServiceAccountCredentials(*args, **kwargs):
+    return None
+
+
+def _timestamp(value):
+    if isinstance(value, (int, float)):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000
+
+
+class ComputedObject:
+    def __init__(self, compute):
+        self._compute = compute
+
+    def getInfo(self):
+        global getinfo_calls
+        getinfo_calls += 1
+        return self._compute()
+
+
+class Geometry:
+    def __init__(self, points, radius=0.0):
+        self.points = points  # list of [lon, lat]
+        self.radius = radius
+
+    @staticmethod
+    def Point(coords):
+        return Geometry([list(coords)])
+
+    @staticmethod
+    def MultiPoint(coords):
+        return Geometry([list(c) for c in coords])
+
+    def buffer(self, distance):
+        return Geometry(self.points, distance)
+
+    def sample(self, scale):
+        # Pixel centres at `scale` metre spacing inside the buffered geometry
+        lats, lons = [], []
+        for lon, lat in self.points:
+            steps = int(self.radius // scale)
+            offsets = np.arange(-steps, steps + 1) * scale
+            dy, dx = np.meshgrid(offsets, offsets, indexing="ij")
+            inside = dx ** 2 + dy ** 2 <= max(self.radius, scale / 2) ** 2
+            lats.append(lat + dy[inside] / METRES_PER_DEGREE)
+            lons.append(lon + dx[inside] / (METRES_PER_DEGREE * math.cos(math.radians(lat))))
+        lat_arr, lon_arr = np.concatenate(lats), np.concatenate(lons)
+        return lat_arr[:MAX_SAMPLES], lon_arr[:MAX_SAMPLES]
+
+
+class Filter:
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    @staticmethod
+    def lt(name, value):
+        return Filter(lambda properties: properties.get(name) is not None and properties[name] < value)
+
+
+class Reducer:
+    def __init__(self, outputs):
+        self.outputs = outputs  # list of (name, function over a 1-D array of valid values)
+
+    @staticmethod
+    def mean():
+        return Reducer([("mean", np.mean)])
+
+    @staticmethod
+    def minMax():
+        return Reducer([("min", np.min), ("max", np.max)])
+
+    @staticmethod
+    def percentile(percentiles):
+        return Reducer([(f"p{p}", lambda values, p=p: np.percentile(values, p)) for p in percentiles])
+
+    @staticmethod
+    def count():
+        return Reducer([("count", len)])
+
+    def combine(self, reducer2, outputPrefix="", sharedInputs=False):
+        return Reducer(self.outputs + [(outputPrefix + name, func) for name, func in reducer2.outputs])
+
+    def apply(self, values):
+        values = values[np.isfinite(values)]
+        result = {}
+        for name, func in self.outputs:
+            if name == "count":
+                result[name] = int(values.size)
+            else:
+                result[name] = float(func(values)) if values.size else None
+        return result
+
+
+class Image:
+    def __init__(self, bands, properties=None):
+        self.bands = bands  # dict of band name -> function(lat, lon) returning an array, NaN where masked
+        self.properties = properties or {}
+
+    def _evaluate(self, lat, lon):
+        return {name: np.asarray(func(lat, lon), dtype="float64") for name, func in self.bands.items()}
+
+    def select(self, names):
+        names = [names] if isinstance(names, str) else names
+        return Image({name: self.bands[name] for name in names}, self.properties)
+
+    def rename(self, names):
+        names = [names] if isinstance(names, str) else names
+        return Image(dict(zip(names, self.bands.values())), self.properties)
+
+    def addBands(self, image):
+        return Image({**self.bands, **image.bands}, self.properties)
+
+    def normalizedDifference(self, names):
+        first, second = self.bands[names[0]], self.bands[names[1]]
+
+        def nd(lat, lon):
+            a, b = np.asarray(first(lat, lon)), np.asarray(second(lat, lon))
+            return (a - b) / (a + b)
+
+        return Image({"nd": nd}, self.properties)
+
+    def get(self, name):
+        return self.properties.get(name)
+
+    @staticmethod
+    def constant(value):
+        return Image({"constant": lambda lat, lon: np.full(np.shape(lat), float(value))})
+
+    def toFloat(self):
+        return self
+
+    def _pixelwise(self, func):
+        # Applies func to every band; masked (NaN) pixels stay masked
+        def band(source):
+            def evaluate(lat, lon):
+                values = np.asarray(source(lat, lon), dtype="float64")
+                with np.errstate(invalid="ignore"):
+                    return np.where(np.isfinite(values), func(np.nan_to_num(values)), np.nan)
+            return evaluate
+
+        return Image({name: band(source) for name, source in self.bands.items()}, self.properties)
+
+    def bitwiseAnd(self, value):
+        return self._pixelwise(lambda values: np.bitwise_and(values.astype("int64"), int(value)).astype("float64"))
+
+    def eq(self, value):
+        return self._pixelwise(lambda values: (values == value).astype("float64"))
+
+    def And(self, image):
+        (first,), (second,) = self.bands.values(), image.bands.values()
+
+        def both(lat, lon):
+            a, b = np.asarray(first(lat, lon), dtype="float64"), np.asarray(second(lat, lon), dtype="float64")
+            return np.where(np.isfinite(a) & np.isfinite(b), ((a != 0) & (b != 0)).astype("float64"), np.nan)
+
+        return Image({next(iter(self.bands)): both}, self.properties)
+
+    def updateMask(self, mask):
+        # Pixels where the mask is 0 (or itself masked) become masked in every band
+        if isinstance(mask, (int, float)):
+            mask = Image.constant(mask)
+        (mask_band,) = mask.bands.values()
+
+        def masked(source):
+            def evaluate(lat, lon):
+                keep = np.asarray(mask_band(lat, lon), dtype="float64")
+                values = np.asarray(source(lat, lon), dtype="float64")
+                return np.where(np.isfinite(keep) & (keep != 0), values, np.nan)
+            return evaluate
+
+        return Image({name: masked(source) for name, source in self.bands.items()}, self.properties)
+
+    def reduceRegion(self, reducer, geometry, scale=30, maxPixels=None, **kwargs):
+        def compute():
+            lat, lon = geometry.sample(scale)
+            result = {}
+            for band, values in self._evaluate(lat, lon).items():
+                for name, value in reducer.apply(values).items():
+                    key = f"{band}_{name}" if len(reducer.outputs) > 1 else band
+                    result[key] = value
+            return result
+
+        return ComputedObject(compute)
+
+    def reduceRegions(self, collection, reducer, scale=30, **kwargs):
+        def compute():
+            features = []
+            for feature in collection.features:
+                lat, lon = feature.geometry.sample(scale)
+                properties = dict(feature.properties)
+                for band, values in self._evaluate(lat, lon).items():
+                    for name, value in reducer.apply(values).items():
+                        properties[name if len(self.bands) == 1 else f"{band}_{name}"] = value
+                features.append({"type": "Feature", "geometry": None, "properties": properties})
+            return {"type": "FeatureCollection", "features": features}
+
+        return ComputedObject(compute)
+
+
+class ImageCollection:
+    def __init__(self, source):
+        if isinstance(source, str):
+            source = COLLECTIONS[source]()
+        self.images = list(source)
+
+    def filterBounds(self, geometry):
+        return ImageCollection(self.images)
+
+    def filterDate(self, start, end):
+        start, end = _timestamp(start), _timestamp(end)
+        return ImageCollection(
+            [image for image in self.images if start <= image.properties["system:time_start"] < end]
+        )
+
+    def filter(self, filter_):
+        return ImageCollection([image for image in self.images if filter_.predicate(image.properties)])
+
+    def map(self, func):
+        return ImageCollection([func(image) for image in self.images])
+
+    def merge(self, collection):
+        return ImageCollection(self.images + collection.images)
+
+    def select(self, names):
+        return ImageCollection([image.select(names) for image in self.images])
+
+    def size(self):
+        return ComputedObject(lambda: len(self.images))
+
+    def median(self):
+        images = self.images
+        names = list(images[0].bands) if images else []
+
+        def band_median(name):
+            def func(lat, lon):
+                if not images:
+                    return np.full(np.shape(lat), np.nan)
+                stack = np.stack([np.asarray(image.bands[name](lat, lon), dtype="float64") for image in images])
+                # Pixels masked in every image stay masked, as in Earth Engine
+                with np.errstate(all="ignore"), warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    return np.nanmedian(stack, axis=0) if np.isfinite(stack).any() else stack[0]
+            return func
+
+        return Image({name: band_median(name) for name in names})
+
+
+class Feature:
+    def __init__(self, geometry, properties=None):
+        self.geometry = geometry
+        self.properties = dict(properties or {})
+
+
+class FeatureCollection:
+    def __init__(self, features):
+        self.features = list(features)
+
+
+def synthetic_sentinel2(start="2020-01-01", end="2025-01-01", revisit_days=5, seed=0):
+    """
+    Sentinel-2-like scenes every `revisit_days` with B4/B8 reflectance driven by a seasonal
+    NDVI signal plus a spatial pattern, and a random CLOUDY_PIXEL_PERCENTAGE per scene.
+    Cloudy pixels are bright in both bands (NDVI near 0) and flagged in the QA60 band,
+    bit 10 for opaque cloud and bit 11 for cirrus, as in the real product.
+    """
+    rng = np.random.default_rng(seed)
+    day = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    last = datetime.strptime(end, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    images = []
+    while day < last:
+        doy = day.timetuple().tm_yday
+        cloudy = float(rng.uniform(0, 60))
+        phase = float(rng.uniform(0, 2 * np.pi))
+
+        def ndvi(lat, lon, doy=doy):
+            lat, lon = np.asarray(lat), np.asarray(lon)
+            return np.clip(
+                0.35 + 0.25 * np.sin(2 * np.pi * (doy - 100) / 365)
+                + 0.15 * np.sin(np.radians(lat) * 400) * np.cos(np.radians(lon) * 400),
+                -0.9, 0.9,
+            )
+
+        def cloud(lat, lon, cloudy=cloudy, phase=phase):
+            # Smooth cloud field covering roughly `cloudy` percent of the scene
+            lat, lon = np.asarray(lat), np.asarray(lon)
+            field = 0.5 + 0.5 * np.sin(np.radians(lat) * 40000 + phase) * np.cos(np.radians(lon) * 40000 - phase)
+            return field < cloudy / 100
+
+        def b8(lat, lon, cloud=cloud):
+            return np.where(cloud(lat, lon), 0.6, 0.3)
+
+        def b4(lat, lon, ndvi=ndvi, cloud=cloud):
+            value = ndvi(lat, lon)
+            return np.where(cloud(lat, lon), 0.58, 0.3 * (1 - value) / (1 + value))
+
+        def qa60(lat, lon, cloud=cloud):
+            return np.where(cloud(lat, lon), float(1 << 10), 0.0)
+
+        images.append(Image(
+            {"B4": b4, "B8": b8, "QA60": qa60},
+            {"system:time_start": day.timestamp() * 1000, "CLOUDY_PIXEL_PERCENTAGE": cloudy},
+        ))
+        day += timedelta(days=revisit_days)
+    return images
+
+
+# Collections served by ImageCollection(<asset id>); replace entries to change the fake data
+COLLECTIONS = {
+    "COPERNICUS/S2_SR_HARMONIZED": synthetic_sentinel2,
+}
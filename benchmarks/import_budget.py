@@ -0,0 +1,87 @@
+"""
+Measures how long each module takes to import in a fresh interpreter and checks it
+against a budget. Exits with status 1 when a module is over budget, so it can gate CI.
+
+The weather modules are what a worker doing only weather aggregation imports; together
+they must stay well under a second. The agent modules only have to import without
+touching Earth Engine, Azure or the wallet, which the --forbid check enforces.
+
+Run from the repository root:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --repeat 5 --modules weather_series weather_store
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# Seconds per module, measured as the best of --repeat cold imports
+BUDGETS = {
+    "weather_series": 0.5,
+    "weather_store": 0.5,
+    "weather_fetch": 0.75,
+    "cache": 0.25,
+    "metrics": 0.25,
+    "ndvi": 0.75,
+    "soil": 0.75,
+    "indicators": 0.75,
+    "analysis": 0.5,
+    "data_collection": 3.0,
+    "impact_assessment": 3.0,
+}
+# Modules that must not be imported just by importing the agents; they load on first use
+FORBIDDEN = ["ee", "rasterio", "azure.ai.textanalytics", "matplotlib", "wand", "PIL"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": sorted(set(sys.modules) & set({forbidden!r}))}}))
+"""
+
+
+def measure(module, repeat):
+    """
+    Returns:
+    - dict with the best import time in seconds and the forbidden modules it pulled in,
+      or {"error": ...} if the import failed
+    """
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, forbidden=FORBIDDEN)],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"}
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        best = probe["seconds"] if best is None else min(best, probe["seconds"])
+        loaded = probe["loaded"]
+    return {"seconds": round(best, 4), "loaded": loaded}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="*", default=list(BUDGETS))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<20} {'seconds':>8} {'budget':>7}  result")
+    for module in args.modules:
+        result = measure(module, args.repeat)
+        budget = BUDGETS.get(module)
+        if "error" in result:
+            print(f"{module:<20} {'-':>8} {budget or '-':>7}  could not import: {result['error']}")
+            continue
+        problems = []
+        if budget is not None and result["seconds"] > budget:
+            problems.append("over budget")
+        if result["loaded"]:
+            problems.append(f"imported {', '.join(result['loaded'])} eagerly")
+        failed = failed or bool(problems)
+        print(f"{module:<20} {result['seconds']:>8.3f} {budget or '-':>7}  {'; '.join(problems) or 'ok'}")
+
+    sys.exit(1 if failed else 0)
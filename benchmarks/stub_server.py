@@ -0,0 +1,288 @@
+"""
+Local stand-in for the HTTP APIs the agents call, replaying the recorded responses in
+benchmarks/fixtures with configurable latency and error injection.
+
+Routes:
+    GET  /geo/1.0/direct, /geo/1.0/reverse        OpenWeather geocoding
+    GET  /data/3.0/onecall/day_summary            OpenWeather daily aggregation
+    GET  /soilgrids/v2.0/properties/query         SoilGrids
+    GET  /v2/country/{countries}/indicator/{ids}  World Bank (paginated)
+    GET  /oecd/data/{key}                         OECD SDMX-ML generic data
+    POST /text/analytics/v3.1/keyPhrases          Azure Text Analytics
+
+Each day summary is the recorded document with values shifted by a smooth seasonal
+signal and a deterministic per-date offset, so aggregation has realistic work to do.
+
+Run from the repository root to serve it on its own:
+    python -m benchmarks.stub_server --port 8089 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import copy
+import json
+import math
+import os
+import random
+import threading
+import zlib
+from datetime import date
+from types import SimpleNamespace
+
+import requests
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+SDMX_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<message:GenericData xmlns:message="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message" '
+    'xmlns:generic="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/data/generic">'
+    '<message:Header><message:ID>IREF000001</message:ID><message:Test>false</message:Test></message:Header>'
+    '<message:DataSet action="Replace" structureRef="DSD_EAG_UOE_FIN@DF_UOE_FIN_INDIC_SOURCE_NATURE">'
+)
+SDMX_FOOTER = "</message:DataSet></message:GenericData>"
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as fixture_file:
+        return json.load(fixture_file)
+
+
+def stable_random(*parts):
+    # Same inputs, same numbers, across runs and processes
+    return random.Random(zlib.crc32(json.dumps(parts).encode("utf-8")))
+
+
+class StubServer:
+    """
+    Serves the fixtures from a background thread with its own event loop, so blocking
+    clients (requests, the Azure SDK) can call it from the benchmark's event loop.
+
+    Parameters:
+    - latency: seconds added to every response
+    - jitter: extra uniformly random seconds on top of latency
+    - error_rate: fraction of requests answered with a 503 (Retry-After: 0)
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.host = host
+        self.port = port
+        self.calls = {}
+        self.errors = {}
+        self._random = random.Random(seed)
+        self._cities = load_fixture("cities.json")
+        self._countries = load_fixture("countries.json")
+        self._day_summary = load_fixture("day_summary.json")
+        self._soilgrids = load_fixture("soilgrids.json")
+        self._key_phrases = load_fixture("key_phrases.json")
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def app(self):
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get("/geo/1.0/direct", self.geocode)
+        app.router.add_get("/geo/1.0/reverse", self.reverse_geocode)
+        app.router.add_get("/data/3.0/onecall/day_summary", self.day_summary)
+        app.router.add_get("/soilgrids/v2.0/properties/query", self.soilgrids)
+        app.router.add_get("/v2/country/{countries}/indicator/{indicators}", self.world_bank)
+        app.router.add_get("/oecd/data/{key}", self.oecd)
+        app.router.add_post("/text/analytics/v3.1/keyPhrases", self.key_phrases)
+        return app
+
+    @web.middleware
+    async def _inject(self, request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        self.calls[route] = self.calls.get(route, 0) + 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors[route] = self.errors.get(route, 0) + 1
+            return web.Response(status=503, headers={"Retry-After": "0"}, text="injected error")
+        return await handler(request)
+
+    def _nearest_city(self, lat, lon):
+        return min(self._cities, key=lambda city: (city["lat"] - lat) ** 2 + (city["lon"] - lon) ** 2)
+
+    async def geocode(self, request):
+        name = request.query.get("q", "").split(",")[0].strip().lower()
+        matches = [city for city in self._cities if city["name"].lower() == name]
+        return web.json_response([
+            {"name": city["name"], "lat": city["lat"], "lon": city["lon"], "country": city["country"], "state": city["state"]}
+            for city in matches[:1]
+        ])
+
+    async def reverse_geocode(self, request):
+        city = self._nearest_city(float(request.query["lat"]), float(request.query["lon"]))
+        return web.json_response([
+            {"name": city["name"], "lat": city["lat"], "lon": city["lon"], "country": city["country"], "state": city["state"]}
+        ])
+
+    def make_day_summary(self, lat, lon, day):
+        rng = stable_random(round(lat, 4), round(lon, 4), day.isoformat())
+        # Seasonal swing with the sign of the hemisphere, plus day-to-day noise
+        season = math.cos(2 * math.pi * (day.timetuple().tm_yday - 200) / 365.25) * (1 if lat >= 0 else -1)
+        shift = 8 * season + rng.gauss(0, 2)
+
+        summary = copy.deepcopy(self._day_summary)
+        summary.update(lat=lat, lon=lon, date=day.isoformat())
+        for key in summary["temperature"]:
+            summary["temperature"][key] = round(summary["temperature"][key] + shift, 2)
+        summary["humidity"]["afternoon"] = round(min(100.0, max(5.0, 71 - 2 * shift + rng.gauss(0, 8))), 1)
+        summary["precipitation"]["total"] = round(rng.expovariate(1 / 2.5) if rng.random() < 0.45 else 0.0, 2)
+        summary["cloud_cover"]["afternoon"] = round(rng.uniform(0, 100), 1)
+        return summary
+
+    def make_soilgrids(self, lat, lon):
+        rng = stable_random(round(lat, 4), round(lon, 4), "soil")
+        response = copy.deepcopy(self._soilgrids)
+        response["geometry"]["coordinates"] = [lon, lat]
+        # About one point in five has no data, so the ring search gets exercised
+        empty = rng.random() < 0.2
+        for layer in response["properties"]["layers"]:
+            for depth in layer["depths"]:
+                depth["values"]["mean"] = None if empty else round(depth["values"]["mean"] * rng.uniform(0.6, 1.4))
+        return response
+
+    async def day_summary(self, request):
+        lat, lon = float(request.query["lat"]), float(request.query["lon"])
+        return web.json_response(self.make_day_summary(lat, lon, date.fromisoformat(request.query["date"])))
+
+    async def soilgrids(self, request):
+        return web.json_response(self.make_soilgrids(float(request.query["lat"]), float(request.query["lon"])))
+
+    async def world_bank(self, request):
+        countries = request.match_info["countries"].split(";")
+        indicators = request.match_info["indicators"].split(";")
+        first, last = (int(year) for year in request.query.get("date", "2000:2021").split(":"))
+        records = []
+        for code in countries:
+            match = self._countries.get(code.upper()) or next(
+                (country for country in self._countries.values() if country["iso3"] == code.upper()), None
+            )
+            if match is None:
+                continue
+            iso2 = next(iso2 for iso2, country in self._countries.items() if country is match)
+            for indicator in indicators:
+                latest = match["gdp"] if indicator.startswith("NY.GDP") else match["poverty"]
+                for year in range(last, first - 1, -1):
+                    value = None if latest is None else round(latest * (1 - 0.02 * (last - year)), 2)
+                    records.append({
+                        "indicator": {"id": indicator, "value": indicator},
+                        "country": {"id": iso2, "value": match["name"]},
+                        "countryiso3code": match["iso3"],
+                        "date": str(year),
+                        "value": value,
+                        "unit": "",
+                        "obs_status": "",
+                        "decimal": 0,
+                    })
+
+        per_page = int(request.query.get("per_page", 50))
+        page = int(request.query.get("page", 1))
+        pages = max(1, math.ceil(len(records) / per_page))
+        header = {"page": page, "pages": pages, "per_page": per_page, "total": len(records), "sourceid": "2"}
+        return web.json_response([header, records[(page - 1) * per_page:page * per_page]])
+
+    async def oecd(self, request):
+        areas = request.match_info["key"].split(".")[0]
+        wanted = set(areas.split("+")) if areas else None
+        first = int(request.query.get("startPeriod", 2021))
+        last = int(request.query.get("endPeriod", first))
+
+        response = web.StreamResponse(headers={"Content-Type": "application/vnd.sdmx.genericdata+xml"})
+        await response.prepare(request)
+        await response.write(SDMX_HEADER.encode("utf-8"))
+        for country in self._countries.values():
+            if country["expenditure"] is None or (wanted is not None and country["iso3"] not in wanted):
+                continue
+            series = [
+                '<generic:Series><generic:SeriesKey>',
+                f'<generic:Value id="REF_AREA" value="{country["iso3"]}"/>',
+                '<generic:Value id="MEASURE" value="EXP"/><generic:Value id="UNIT_MEASURE" value="XDC"/>',
+                '</generic:SeriesKey>',
+            ]
+            for year in range(first, last + 1):
+                value = country["expenditure"] * (1 - 0.03 * (last - year))
+                series.append(
+                    f'<generic:Obs><generic:ObsDimension value="{year}"/><generic:ObsValue value="{value:.1f}"/></generic:Obs>'
+                )
+            series.append("</generic:Series>")
+            await response.write("".join(series).encode("utf-8"))
+        await response.write(SDMX_FOOTER.encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    async def key_phrases(self, request):
+        body = await request.json()
+        phrases = self._key_phrases["documents"][0]["keyPhrases"]
+        documents = [
+            {"id": document["id"], "keyPhrases": [phrase for phrase in phrases if phrase.lower() in document["text"].lower()], "warnings": []}
+            for document in body["documents"]
+        ]
+        return web.json_response({"documents": documents, "errors": [], "modelVersion": self._key_phrases["modelVersion"]})
+
+    def start(self):
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.app())
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, self.host, self.port)
+            self._loop.run_until_complete(site.start())
+            self.port = site._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name="stub-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class StubTextAnalyticsClient:
+    """
+    Speaks to the stub's keyPhrases route with the TextAnalyticsClient.extract_key_phrases
+    call shape, for AzureKeyPhraseBackend(client=...).
+    """
+
+    def __init__(self, base_url):
+        self.url = f"{base_url}/text/analytics/v3.1/keyPhrases"
+        self.session = requests.Session()
+
+    def extract_key_phrases(self, documents):
+        body = {"documents": [{"id": str(i), "language": "en", "text": text} for i, text in enumerate(documents)]}
+        response = self.session.post(self.url, json=body, timeout=30)
+        response.raise_for_status()
+        return [
+            SimpleNamespace(is_error=False, key_phrases=document["keyPhrases"], error=None)
+            for document in response.json()["documents"]
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubServer(args.latency, args.jitter, args.error_rate, port=args.port)
+    web.run_app(server.app(), host=server.host, port=args.port)
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv("FETCH_CACHE_PATH", "fetch_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("FETCH_CACHE_MAX_ENTRIES", "20000"))
+
+# Coordinates are rounded to 4 decimals (~11 m) so the same site always maps to the same key
+COORDINATE_PRECISION = 4
+COORDINATE_KEYS = {"lat", "lon"}
+
+DAY = 24 * 60 * 60
+
+# Time-to-live per source, in seconds. None means the entry never expires.
+SOURCE_TTLS = {
+    "geocode": 90 * DAY,
+    "reverse_geocode": 90 * DAY,
+    "ndvi": 30 * DAY,
+    "soil": 180 * DAY,
+    "worldbank": 7 * DAY,
+    "oecd": 7 * DAY,
+    # Memoized impact analyses; entries are also replaced whenever their inputs change
+    "analysis": 7 * DAY,
+    # When each warming catalogue entry was last refreshed
+    "warming": None,
+}
+DEFAULT_TTL = 7 * DAY
+
+
+def normalize_params(params):
+    """
+    Builds a stable cache key from request parameters: coordinates are rounded,
+    strings are trimmed and lower-cased, dates become ISO strings and keys are sorted.
+    """
+    normalized = {}
+    for name, value in params.items():
+        if name in COORDINATE_KEYS and value is not None:
+            value = round(float(value), COORDINATE_PRECISION)
+        elif isinstance(value, str):
+            value = value.strip().lower()
+        elif isinstance(value, (date, datetime)):
+            value = value.strftime("%Y-%m-%d")
+        normalized[name] = value
+    return json.dumps(normalized, sort_keys=True)
+
+
+class Cache:
+    """
+    Persistent key/value cache backed by SQLite, shared by both agents.
+
+    Entries are keyed by source and normalized request parameters, expire after the
+    source's TTL and are evicted least-recently-used once `max_entries` is exceeded.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, ttls=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(SOURCE_TTLS if ttls is None else ttls)
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, source TEXT NOT NULL, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_source ON entries (source)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(source, params):
+        return f"{source}:{normalize_params(params)}"
+
+    def get(self, source, params):
+        key = self.make_key(source, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            ttl = self.ttls.get(source, DEFAULT_TTL)
+            if row is not None and ttl is not None and now - row[1] > ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses[source] = self.misses.get(source, 0) + 1
+                record_cache(source, hit=False)
+                return None
+
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits[source] = self.hits.get(source, 0) + 1
+            record_cache(source, hit=True)
+        return json.loads(row[0])
+
+    def set(self, source, params, value):
+        key = self.make_key(source, params)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, source, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, source, json.dumps(value), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def invalidate(self, source=None, params=None):
+        """
+        Removes one entry (source and params), every entry of a source (source only)
+        or the whole cache (no arguments). Returns the number of entries removed.
+        """
+        with self._lock:
+            if source is not None and params is not None:
+                cursor = self._conn.execute("DELETE FROM entries WHERE key = ?", (self.make_key(source, params),))
+            elif source is not None:
+                cursor = self._conn.execute("DELETE FROM entries WHERE source = ?", (source,))
+            else:
+                cursor = self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+        return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT source, COUNT(*) FROM entries GROUP BY source").fetchall()
+        entries = dict(rows)
+        sources = set(entries) | set(self.hits) | set(self.misses)
+        stats = {}
+        for source in sorted(sources):
+            hits, misses = self.hits.get(source, 0), self.misses.get(source, 0)
+            stats[source] = {
+                "entries": entries.get(source, 0),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            }
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    # One cache per process, opened on first use. The first use is often in a worker thread
+    # (geocoding, NDVI), so creation is guarded to keep it to one SQLite connection.
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = Cache()
+            logger.info(f"Using cache at {_cache.path}")
+    return _cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the shared lookup cache")
+    parser.add_argument("command", choices=["stats", "invalidate"])
+    parser.add_argument("--source", help="limit invalidation to one source, e.g. weather or soil")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(get_cache().stats(), indent=4))
+    else:
+        removed = get_cache().invalidate(source=args.source)
+        print(f"Removed {removed} entries")
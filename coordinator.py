@@ -0,0 +1,310 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import time
+
+import requests
+from dotenv import load_dotenv
+from uagents import Agent, Context
+from uagents.setup import fund_agent_if_low
+
+from data_sharing import (
+    data_sharing_proto, BusyResponse, CollectedData, CollectedDataV2, HealthCheck, LocationRequest, WorkerStatus,
+)
+from geocoding import geocode
+from metrics import new_correlation_id, registry, start_metrics_server
+
+load_dotenv()
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OPEN_WEATHER_API_KEY = os.getenv("OPEN_WEATHER_API_KEY")
+FUND_AGENT = os.getenv("FUND_AGENT", "1") == "1"
+
+COORDINATOR_SEED = os.getenv("COORDINATOR_SEED", "data_collection_coordinator")
+COORDINATOR_PORT = int(os.getenv("COORDINATOR_PORT", "8000"))
+# Comma-separated addresses of the data collection workers behind this coordinator
+COORDINATOR_WORKERS = [address.strip() for address in os.getenv("COORDINATOR_WORKERS", "").split(",") if address.strip()]
+# Where results go when a request does not name a reply_to agent
+IMPACT_AGENT_ADDRESS = os.getenv("IMPACT_AGENT_ADDRESS", "agent1qd55537kkcuvwq0wd5tgwuw2lylul94wju62pa4wzfnwhy65xydekmlzh8x")
+METRICS_PORT = int(os.getenv("COORDINATOR_METRICS_PORT", "9100"))
+
+# Requests are sharded on coordinates rounded to this many decimals (about 1 km at 2), so
+# nearby locations land on the same worker and reuse its weather store and caches
+SHARD_PRECISION = int(os.getenv("SHARD_PRECISION", "2"))
+# Points per worker on the hash ring; more points spread keys more evenly
+RING_REPLICAS = 64
+
+# Seconds between health checks; a worker that has not answered for three is considered down
+WORKER_HEALTH_INTERVAL = float(os.getenv("WORKER_HEALTH_INTERVAL", "10"))
+WORKER_STALE_SECONDS = 3 * WORKER_HEALTH_INTERVAL
+# A cold request fetches a year of daily weather, so allow several minutes before giving up on a worker
+WORKER_TIMEOUT = float(os.getenv("WORKER_TIMEOUT", "900"))
+# Requests in flight on one worker before the next worker on the ring is preferred
+WORKER_MAX_IN_FLIGHT = int(os.getenv("WORKER_MAX_IN_FLIGHT", "8"))
+# How long a worker that timed out is skipped, and how many workers a request is tried on
+WORKER_COOLDOWN = float(os.getenv("WORKER_COOLDOWN", "60"))
+MAX_ATTEMPTS = 3
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring over worker addresses. Adding or removing a worker only moves
+    the keys next to that worker's points, so the other workers keep their caches warm.
+    """
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self.nodes = list(dict.fromkeys(nodes))
+        self.points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self.hashes = [point for point, _ in self.points]
+
+    def preference(self, key):
+        """
+        Returns:
+        - every node once, in ring order starting from the owner of `key`
+        """
+        order = []
+        start = bisect.bisect(self.hashes, _hash(key))
+        for i in range(len(self.points)):
+            node = self.points[(start + i) % len(self.points)][1]
+            if node not in order:
+                order.append(node)
+                if len(order) == len(self.nodes):
+                    break
+        return order
+
+
+def shard_key(lat, lon, precision=SHARD_PRECISION):
+    return f"{round(lat, precision):.{precision}f},{round(lon, precision):.{precision}f}"
+
+
+class WorkerState:
+    def __init__(self, address):
+        self.address = address
+        self.registered = time.monotonic()
+        self.last_seen = None
+        self.down_until = 0.0
+        self.status = None
+        # Correlation IDs of the requests this worker is handling
+        self.in_flight = set()
+
+    def healthy(self, now):
+        return now - (self.last_seen or self.registered) <= WORKER_STALE_SECONDS and now >= self.down_until
+
+    def load(self):
+        # Our own count of requests in flight, or the worker's if it reported more (e.g. batches)
+        reported = self.status.running + self.status.queued if self.status else 0
+        return max(len(self.in_flight), reported)
+
+
+class Dispatch:
+    def __init__(self, request, requester, shard, reply_to):
+        self.request = request
+        self.requester = requester
+        self.shard = shard
+        self.reply_to = reply_to
+        self.worker = None
+        self.tried = []
+        self.sent_at = None
+        # Latest BusyResponse from a worker, passed on if no other worker can take the request
+        self.busy = None
+
+
+ring = HashRing(COORDINATOR_WORKERS)
+workers = {address: WorkerState(address) for address in COORDINATOR_WORKERS}
+# Requests sent to a worker and not yet answered, by correlation ID
+dispatches = {}
+
+# Agent setup
+coordinator_agent = Agent(
+    name="data_collection_coordinator",
+    seed=COORDINATOR_SEED,
+    port=COORDINATOR_PORT,
+    endpoint=f"http://localhost:{COORDINATOR_PORT}/submit"
+)
+
+logger.info(f"Agent address: {coordinator_agent.address}")
+
+
+@coordinator_agent.on_event("startup")
+async def startup(ctx: Context):
+    start_metrics_server(METRICS_PORT)
+    if not workers:
+        ctx.logger.warning("No workers configured; set COORDINATOR_WORKERS to their addresses")
+    ctx.logger.info(f"Coordinating {len(workers)} data collection workers")
+    if FUND_AGENT:
+        await asyncio.to_thread(fund_agent_if_low, coordinator_agent.wallet.address())
+
+
+def pick_worker(dispatch, now):
+    """
+    Chooses the first healthy, untried worker in the shard's ring order that has room.
+    If every healthy worker is at WORKER_MAX_IN_FLIGHT, the least loaded one is used.
+
+    Returns:
+    - WorkerState, or None when no untried worker is healthy
+    """
+    candidates = [
+        workers[address] for address in ring.preference(dispatch.shard)
+        if address not in dispatch.tried and workers[address].healthy(now)
+    ]
+    for worker in candidates:
+        if worker.load() < WORKER_MAX_IN_FLIGHT:
+            return worker
+    return min(candidates, key=WorkerState.load, default=None)
+
+
+def release(request_id):
+    dispatch = dispatches.get(request_id)
+    if dispatch is not None and dispatch.worker in workers:
+        workers[dispatch.worker].in_flight.discard(request_id)
+    return dispatch
+
+
+async def dispatch_request(ctx: Context, request_id):
+    dispatch = dispatches[request_id]
+    worker = pick_worker(dispatch, time.monotonic()) if len(dispatch.tried) < MAX_ATTEMPTS else None
+    if worker is None:
+        del dispatches[request_id]
+        if dispatch.busy is not None:
+            registry.inc("dispatches_rejected_total")
+            await ctx.send(dispatch.requester, dispatch.busy)
+        elif dispatch.tried:
+            ctx.logger.error(f"Request {request_id} failed on {len(dispatch.tried)} workers")
+            await ctx.send(dispatch.requester, CollectedData(
+                data={"error": f"Data collection failed on {len(dispatch.tried)} workers"}, correlation_id=request_id,
+            ))
+        else:
+            registry.inc("dispatches_rejected_total")
+            await ctx.send(dispatch.requester, BusyResponse(
+                reason="No data collection worker is available", queued=len(dispatches),
+                retry_after=WORKER_HEALTH_INTERVAL, correlation_id=request_id,
+            ))
+        return
+
+    dispatch.worker = worker.address
+    dispatch.tried.append(worker.address)
+    dispatch.sent_at = time.monotonic()
+    worker.in_flight.add(request_id)
+    registry.inc("dispatches_total", worker=worker.address, attempt=str(len(dispatch.tried)))
+    ctx.logger.info(f"Request {request_id} ({dispatch.shard}) -> {worker.address} (attempt {len(dispatch.tried)})")
+    await ctx.send(worker.address, dispatch.request)
+
+
+async def redispatch(ctx: Context, request_id, reason):
+    dispatch = release(request_id)
+    if dispatch is None:
+        return
+    ctx.logger.warning(f"Re-dispatching request {request_id} away from {dispatch.worker}: {reason}")
+    registry.inc("redispatches_total", reason=reason)
+    await dispatch_request(ctx, request_id)
+
+
+def seen(sender, status=None):
+    worker = workers.get(sender)
+    if worker is not None:
+        worker.last_seen = time.monotonic()
+        if status is not None:
+            worker.status = status
+    return worker
+
+
+@data_sharing_proto.on_message(model=LocationRequest, replies={CollectedData, CollectedDataV2, BusyResponse})
+async def handle_location_request(ctx: Context, sender: str, msg: LocationRequest):
+    request_id = msg.correlation_id or new_correlation_id()
+    if request_id in dispatches:
+        # Same request sent twice; the first one is already being handled
+        return
+
+    # Geocode here (a cache hit after the first time) so the shard follows the coordinates
+    try:
+        geocode_data = await asyncio.to_thread(geocode, msg.city, msg.state, msg.country, OPEN_WEATHER_API_KEY)
+    except requests.exceptions.RequestException as e:
+        ctx.logger.warning(f"Geocoding {msg.city} failed, sharding by name: {e}")
+        geocode_data = None
+    if geocode_data:
+        shard = shard_key(geocode_data[0]["lat"], geocode_data[0]["lon"])
+    else:
+        # The worker reports the geocoding error back; the name keeps retries on one shard
+        shard = ",".join(part.strip().lower() for part in (msg.city, msg.state, msg.country))
+
+    request = LocationRequest(**dict(msg.dict(), correlation_id=request_id, reply_to=coordinator_agent.address))
+    dispatches[request_id] = Dispatch(request, sender, shard, msg.reply_to or IMPACT_AGENT_ADDRESS)
+    await dispatch_request(ctx, request_id)
+
+
+# Results are passed on in whichever version the worker negotiated with the original requester
+async def forward_result(ctx: Context, sender: str, msg, failed):
+    seen(sender)
+    dispatch = release(msg.correlation_id)
+    if dispatch is None:
+        # A late answer from a worker the request was already taken away from
+        ctx.logger.info(f"Ignoring result for unknown request {msg.correlation_id} from {sender}")
+        return
+    del dispatches[msg.correlation_id]
+    registry.observe("dispatch_duration_seconds", time.monotonic() - dispatch.sent_at)
+
+    # Every result passes through here: errors go back to the requester, data on to its destination
+    if failed:
+        registry.inc("results_total", outcome="error")
+        await ctx.send(dispatch.requester, msg)
+    else:
+        registry.inc("results_total", outcome="ok")
+        await ctx.send(dispatch.reply_to, msg)
+
+
+@data_sharing_proto.on_message(model=CollectedData, replies={CollectedData})
+async def handle_worker_result(ctx: Context, sender: str, msg: CollectedData):
+    await forward_result(ctx, sender, msg, "error" in msg.data)
+
+
+@data_sharing_proto.on_message(model=CollectedDataV2, replies={CollectedDataV2})
+async def handle_worker_result_v2(ctx: Context, sender: str, msg: CollectedDataV2):
+    await forward_result(ctx, sender, msg, bool(msg.error))
+
+
+@data_sharing_proto.on_message(model=BusyResponse, replies={CollectedData, BusyResponse})
+async def handle_worker_busy(ctx: Context, sender: str, msg: BusyResponse):
+    seen(sender)
+    if msg.correlation_id in dispatches:
+        dispatches[msg.correlation_id].busy = msg
+        await redispatch(ctx, msg.correlation_id, "busy")
+
+
+@data_sharing_proto.on_message(model=WorkerStatus, replies={})
+async def handle_worker_status(ctx: Context, sender: str, msg: WorkerStatus):
+    seen(sender, msg)
+
+
+@coordinator_agent.on_interval(period=WORKER_HEALTH_INTERVAL)
+async def check_workers(ctx: Context):
+    now = time.monotonic()
+    for worker in workers.values():
+        if not worker.healthy(now) and worker.in_flight:
+            # Down or silent: move its requests to the next worker on the ring
+            for request_id in list(worker.in_flight):
+                await redispatch(ctx, request_id, "unhealthy")
+        await ctx.send(worker.address, HealthCheck())
+
+    for request_id, dispatch in list(dispatches.items()):
+        if dispatch.sent_at is not None and now - dispatch.sent_at > WORKER_TIMEOUT:
+            workers[dispatch.worker].down_until = now + WORKER_COOLDOWN
+            await redispatch(ctx, request_id, "timeout")
+
+    healthy = sum(worker.healthy(now) for worker in workers.values())
+    ctx.logger.debug(f"{healthy}/{len(workers)} workers healthy, {len(dispatches)} requests in flight")
+
+
+# Include data_sharing_proto in the agent
+coordinator_agent.include(data_sharing_proto)
+
+if __name__ == "__main__":
+    coordinator_agent.run()
@@ -1,387 +1,717 @@
+import asyncio
 import requests
 import json
 import logging
-from uagents import Agent, Context, Model, Protocol
+from uagents import Agent, Context
 from uagents.setup import fund_agent_if_low
 from dotenv import load_dotenv
 import os
-from oauthlib.oauth2 import BackendApplicationClient
-from requests_oauthlib import OAuth2Session
-import rasterio
-import numpy as np
-import matplotlib.pyplot as plt
-import ee  # Importing Google Earth Engine
-import geemap
-from PIL import Image as img
-from wand.image import Image
-from data_sharing import data_sharing_proto, CollectedData
+from data_sharing import (
+    data_sharing_proto, BusyResponse, CollectedData, CollectedDataV2, HealthCheck, LocationRequest, BatchLocationRequest,
+    WorkerStatus,
+)
+from weather_fetch import CombinedLimiter, fetch_day_summaries, open_weather_limiter
+from cache import get_cache, COORDINATE_PRECISION
+from soil import format_soil_summary, get_soil_data, soil_report, soilgrids_limiter
+from weather_series import aggregate_weather_data
+from weather_store import append_days, day_records, load_days, missing_dates, select_range, to_series
+from geocoding import geocode, reverse_geocode
+from spatial_index import get_location_index
+from job_queue import JobQueue, QueueFull, replace_file
+from warming import (
+    WARM_INTERVAL, Warmer, WarmingPaused, load_catalogue, refresh_economic_data, warm_earth_engine_limiter,
+    warm_soilgrids_limiter, warm_weather_limiter,
+)
+from metrics import correlation_id, registry, request_context, stage, start_metrics_server, timed_stage
+from wire import encode_collected_data, negotiate
+from ndvi import (
+    NDVI_BUFFER_METERS, NDVI_INTERVAL_MONTHS, NDVI_MODE, NDVI_SCALE, analyze_ndvi_data, download_ndvi_geotiff,
+    earth_engine, ndvi_composite, read_ndvi_band, reduce_ndvi_series, reduce_ndvi_stats, reduce_ndvi_stats_batch,
+    summarize_ndvi_series, summarize_ndvi_stats,
+)
 import time
-from datetime import datetime, timedelta
-# Authenticate Google Earth Engine
+from datetime import datetime, timedelta, timezone
 
 
 load_dotenv()
 
 # Environment variables
 OPEN_WEATHER_API_KEY = os.getenv("OPEN_WEATHER_API_KEY")
+# Top up the agent's testnet wallet on startup; set to 0 where there is no faucet to reach
+FUND_AGENT = os.getenv("FUND_AGENT", "1") == "1"
 
-SERVICE_ACCOUNT_PATH = "C:/Users/amanb/Downloads/fetch/project/amanbawa96-962dbd7e7042.json"
-SOILGRIDS_URL = "https://rest.isric.org/soilgrids/v2.0/properties/query"
-
-credentials = ee.ServiceAccountCredentials(None, SERVICE_ACCOUNT_PATH)
-ee.Initialize(credentials)
+# Agent identity; give each worker its own seed and port to run several on one machine
+DATA_COLLECTION_SEED = os.getenv("DATA_COLLECTION_SEED", "data_collection")
+DATA_COLLECTION_PORT = int(os.getenv("DATA_COLLECTION_PORT", "8001"))
+# Where collected data goes when a request does not name a reply_to agent
+IMPACT_AGENT_ADDRESS = os.getenv("IMPACT_AGENT_ADDRESS", "agent1qd55537kkcuvwq0wd5tgwuw2lylul94wju62pa4wzfnwhy65xydekmlzh8x")
 
 # API Endpoints
-GEOCODE_URL = "http://api.openweathermap.org/geo/1.0/direct"
 BASE_WEATHER_URL = "https://api.openweathermap.org/data/3.0/onecall"
 
+# One limiter for every OpenWeather call the agent makes, so concurrent requests share the quota
+weather_limiter = open_weather_limiter()
+# Catalogue warming also takes from its own smaller budgets, so live requests keep headroom
+warming_weather_limiter = CombinedLimiter(warm_weather_limiter, weather_limiter)
+warming_soil_limiter = CombinedLimiter(warm_soilgrids_limiter, soilgrids_limiter)
+
 # Logging setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Days of weather history collected when a request does not name a date range
+WEATHER_WINDOW_DAYS = int(os.getenv("WEATHER_WINDOW_DAYS", "365"))
+
+# Sentinel-2 window used for the NDVI composite
+NDVI_START_DATE = "2022-10-01"
+NDVI_END_DATE = "2022-10-31"
+# Date range of the per-period composites in the "series" NDVI mode
+NDVI_SERIES_START_DATE = os.getenv("NDVI_SERIES_START_DATE", "2021-01-01")
+NDVI_SERIES_END_DATE = os.getenv("NDVI_SERIES_END_DATE", "2024-01-01")
+
+# Locations collected at the same time within one batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+
+# Local port for /metrics and /metrics.json; 0 turns the endpoint off
+METRICS_PORT = int(os.getenv("DATA_COLLECTION_METRICS_PORT", "9101"))
+
+# Days of weather fetched between checks for live traffic while warming the catalogue
+WARM_WEATHER_CHUNK_DAYS = 30
+
 # Agent setup
 data_col_agent = Agent(
     name="data_collection_agent",
-    seed="data_collection",
-    port = 8001,
-    endpoint="http://localhost:8001/submit"
+    seed=DATA_COLLECTION_SEED,
+    port = DATA_COLLECTION_PORT,
+    endpoint=f"http://localhost:{DATA_COLLECTION_PORT}/submit"
 )
 
-fund_agent_if_low(wallet_address=data_col_agent.wallet.address())
 logger.info(f"Agent address: {data_col_agent.address}")
 
-# Weather Request and Response Models
-class LocationRequest(Model):
-    city: str
-    state: str = ""
-    country: str = ""
 
+@data_col_agent.on_event("startup")
+async def startup(ctx: Context):
+    start_metrics_server(METRICS_PORT)
+    if FUND_AGENT:
+        # Blocking faucet call; done once the agent runs, not when the module is imported
+        await asyncio.to_thread(fund_agent_if_low, wallet_address=data_col_agent.wallet.address())
+
+def weather_window(start_date="", end_date=""):
+    """
+    Resolves the weather date range for a request. Missing bounds default to a rolling
+    window of WEATHER_WINDOW_DAYS ending yesterday.
 
-class CollectedData(Model):
-    data: dict
+    Parameters:
+    - start_date, end_date: str, YYYY-MM-DD or empty
 
+    Returns:
+    - (start_date, end_date) as datetime objects
+    """
+    end = datetime.strptime(end_date, "%Y-%m-%d") if end_date else \
+        datetime.combine(datetime.now(timezone.utc).date() - timedelta(days=1), datetime.min.time())
+    start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else end - timedelta(days=WEATHER_WINDOW_DAYS - 1)
+    if start > end:
+        raise ValueError(f"Weather window starts after it ends: {start_date} > {end_date}")
+    return start, end
 
-def get_daily_weather_aggregate(lat, lon, start_date, end_date, api_key, city):
-    # Check if data for the given city already exists
-    output_filename = f"data_collection_weather_{city}.json"
 
-    if os.path.exists(output_filename):
-        logger.info(f"Using existing weather data from {output_filename}")
-        with open(output_filename, 'r') as json_file:
-            aggregated_weather_data = json.load(json_file)
-        return aggregated_weather_data
+async def get_daily_weather_aggregate(lat, lon, start_date, end_date, api_key, city, limiter=None):
+    """
+    Returns the daily weather series for a location and date range. Days already in the
+    local weather store are reused; only missing days (never fetched, or failed before)
+    are requested from the API and merged into the store, under `limiter` (the shared
+    weather_limiter by default).
+
+    Returns:
+    - WeatherSeries with one entry per day that could be retrieved
+    """
+    # Read into memory rather than mapped: append_days below replaces the file, which Windows
+    # refuses while a mapping of it is still open
+    stored = await asyncio.to_thread(load_days, lat, lon, mmap=False)
+    missing = missing_dates(stored, start_date, end_date)
+    if len(missing) == 0:
+        logger.info(f"Using stored weather data for {city}")
+        return to_series(select_range(stored, start_date, end_date))
+
+    # Fetch only the missing days, concurrently under the shared rate limit
+    logger.info(f"Fetching {len(missing)} missing days of weather data for {city} from OpenWeather API")
+    started = time.monotonic()
+    dates = missing.astype(object)
+    with stage("weather_fetch"):
+        day_summaries = await fetch_day_summaries(
+            f"{BASE_WEATHER_URL}/day_summary", lat, lon, dates, api_key, limiter=limiter or weather_limiter
+        )
 
-    # If the file does not exist, make API calls
-    logger.info("Fetching weather data from OpenWeather API")
     aggregated_weather_data = []
-    current_date = start_date
-
-    day = 1
-    while current_date <= end_date:
-        url = f"{BASE_WEATHER_URL}/day_summary?lat={lat}&lon={lon}&date={current_date.strftime('%Y-%m-%d')}&appid={api_key}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            logger.info(f"Fetching data for day {day}")
-            day+= 1
+    for day, data in zip(dates, day_summaries):
+        if data is not None:
             aggregated_weather_data.append(data)
         else:
-            logger.error(f"Failed to retrieve data for {current_date.strftime('%Y-%m-%d')}: {response.status_code}")
+            # Left out of the store, so the next request for this range retries it
+            logger.error(f"Failed to retrieve data for {day.strftime('%Y-%m-%d')}")
+    logger.info(f"Fetched {len(aggregated_weather_data)}/{len(dates)} days in {time.monotonic() - started:.1f}s")
 
-        current_date += timedelta(days=1)
-        time.sleep(1)  # Sleep for 1 second to ensure we don't exceed rate limits
+    # Merge the new days into the store for future use
+    if aggregated_weather_data:
+        stored = await asyncio.to_thread(append_days, lat, lon, day_records(aggregated_weather_data))
+        logger.info(f"Weather data for {city} stored ({len(stored)} days on disk)")
 
-    # Save data to JSON file for future use
-    with open(output_filename, 'w') as json_file:
-        json.dump(aggregated_weather_data, json_file, indent=4)
-    logger.info(f"Weather data saved to {output_filename}")
+    return to_series(select_range(stored, start_date, end_date))
 
-    return aggregated_weather_data
 
+def ndvi_window(mode=NDVI_MODE):
+    # The series mode covers a multi-year range; the single-composite modes one month
+    if mode == "series":
+        return NDVI_SERIES_START_DATE, NDVI_SERIES_END_DATE
+    return NDVI_START_DATE, NDVI_END_DATE
 
-def aggregate_weather_data(weather_data):
-    # Aggregating temperature, humidity, cloud cover, etc.
-    temp_min = min([day['temperature']['min'] for day in weather_data])
-    temp_max = max([day['temperature']['max'] for day in weather_data])
-    temp_avg = sum([day['temperature']['afternoon'] for day in weather_data]) / len(weather_data)
-    humidity_avg = sum([day['humidity']['afternoon'] for day in weather_data]) / len(weather_data)
-    total_precipitation = sum([day['precipitation']['total'] for day in weather_data])
 
-    key_events = []
-    for day in weather_data:
-        if day['temperature']['max'] == temp_max:
-            key_events.append(f"Highest temperature recorded on {day['date']} with {temp_max}K")
-        if day['precipitation']['total'] > 10:  # Arbitrary threshold for notable rainfall
-            key_events.append(f"Notable rainfall of {day['precipitation']['total']}mm on {day['date']}")
+# Function to get NDVI statistics using Google Earth Engine
+def get_ndvi_summary(lat, lon, start_date, end_date, mode=NDVI_MODE):
+    cache_params = {"lat": lat, "lon": lon, "start": start_date, "end": end_date, "mode": mode, "buffer": NDVI_BUFFER_METERS}
+    if mode == "series":
+        cache_params["interval"] = NDVI_INTERVAL_MONTHS
+    cached = get_cache().get("ndvi", cache_params)
+    if cached is not None:
+        return cached
 
-    return {
-        "temperature": {
-            "min": temp_min,
-            "max": temp_max,
-            "average": temp_avg
-        },
-        "humidity": {
-            "average": humidity_avg
-        },
-        "total_precipitation": total_precipitation,
-        "key_events": key_events
-    }
+    logger.info(f"Fetching NDVI data using Google Earth Engine ({mode} mode)")
+    ee = earth_engine()
+    point = ee.Geometry.Point([lon, lat])
+
+    try:
+        if mode == "series":
+            # Every period's composite is reduced in one request; no single composite is needed
+            ndvi_summary = summarize_ndvi_series(reduce_ndvi_series(ee, lat, lon, start_date, end_date))
+            get_cache().set("ndvi", cache_params, ndvi_summary)
+            return ndvi_summary
+
+        ndvi_image = ndvi_composite(ee, point, start_date, end_date)
+        if mode == "raster":
+            # Download the same buffer the reduce mode summarizes into memory and read the float
+            # band directly; pixels of the bounding box outside the buffer are clipped to nodata
+            region = point.buffer(NDVI_BUFFER_METERS)
+            with stage("ndvi_download"):
+                ndvi_geotiff = download_ndvi_geotiff(ndvi_image.clip(region), region, scale=NDVI_SCALE)
+            logger.info(f"NDVI data downloaded successfully ({len(ndvi_geotiff)} bytes)")
+            with stage("ndvi_analyze"):
+                ndvi_summary = analyze_ndvi_data(read_ndvi_band(ndvi_geotiff))
+        else:
+            # Reduce the composite inside Earth Engine and only fetch the statistics
+            ndvi_summary = summarize_ndvi_stats(reduce_ndvi_stats(ee, ndvi_image, lat, lon))
+        logger.debug(f"NDVI summary: {ndvi_summary}")
+        get_cache().set("ndvi", cache_params, ndvi_summary)
+
+    except Exception as e:
+        logger.error(f"Failed to download or process NDVI image: {e}")
+        ndvi_summary = "NDVI data could not be analyzed due to an error."
+
+    return ndvi_summary
 
-def analyze_soil_data(soil_data):
+
+# Function to get NDVI statistics for many points with one reduceRegions call per chunk
+def get_ndvi_summaries(points, start_date, end_date):
+    summaries = [None] * len(points)
+    missing = []
+    for i, (lat, lon) in enumerate(points):
+        cache_params = {"lat": lat, "lon": lon, "start": start_date, "end": end_date, "mode": "reduce", "buffer": NDVI_BUFFER_METERS}
+        summaries[i] = get_cache().get("ndvi", cache_params)
+        if summaries[i] is None:
+            missing.append(i)
+    if not missing:
+        return summaries
+
+    ee = earth_engine()
+    region = ee.Geometry.MultiPoint([[points[i][1], points[i][0]] for i in missing])
+    ndvi_image = ndvi_composite(ee, region, start_date, end_date)
+    stats = reduce_ndvi_stats_batch(ee, ndvi_image, [points[i] for i in missing])
+    for i, point_stats in zip(missing, stats):
+        lat, lon = points[i]
+        summaries[i] = summarize_ndvi_stats(point_stats)
+        cache_params = {"lat": lat, "lon": lon, "start": start_date, "end": end_date, "mode": "reduce", "buffer": NDVI_BUFFER_METERS}
+        get_cache().set("ndvi", cache_params, summaries[i])
+    return summaries
+
+
+# Weather stage: fetch the daily series and aggregate it
+async def collect_weather(lat, lon, city, window, limiter=None):
+    start_date, end_date = window
+    weather_data = await get_daily_weather_aggregate(lat, lon, start_date, end_date, OPEN_WEATHER_API_KEY, city, limiter)
+    with stage("weather_aggregate"):
+        return aggregate_weather_data(weather_data)
+
+
+# Soil stage: probe SoilGrids and extract the soil properties. Warming passes should_pause,
+# checked before each probe.
+async def collect_soil(lat, lon, limiter=None, should_pause=None):
+    with stage("soil_probe"):
+        soil_data = await get_soil_data(lat, lon, limiter=limiter, should_pause=should_pause)
+    if soil_data is None:
+        raise WarmingPaused()
+    if "error" in soil_data:
+        # No sample within reach; a failed stage rather than a summary without coordinates
+        raise ValueError(soil_data["error"])
+    return soil_report(soil_data)
+
+
+# NDVI stage: the Earth Engine work runs in a worker thread, after a token from `limiter` if given
+async def collect_ndvi(lat, lon, limiter=None):
+    if limiter is not None:
+        await limiter.acquire()
+    return await asyncio.to_thread(get_ndvi_summary, lat, lon, *ndvi_window())
+
+
+# Location index source behind each collected field
+INDEX_SOURCES = {"weather_data": "weather", "soil_data": "soil", "ndvi_data": "ndvi", "country_code": "reverse_geocode"}
+
+
+def reusable(name, result):
+    # Only real results are offered to nearby requests; an NDVI error message, a soil report
+    # without values or a missing country code would spread to every site in the reuse radius
+    if name == "ndvi_data":
+        return isinstance(result, dict)
+    if name == "soil_data":
+        return bool(result and result["layers"])
+    return bool(result)
+
+
+async def run_in_turn(stages, should_pause):
     """
-    Analyzes the soil data and returns a summary with key soil properties.
+    Runs stages one after another, checking should_pause() before each, and returns their
+    results the way gather(return_exceptions=True) would.
 
     Parameters:
-    - soil_data: dict, the JSON response from SoilGrids API
+    - stages: callables each returning the coroutine for one stage
 
     Returns:
-    - soil_summary: str, a summary report of the soil properties
+    - list of results, or None if should_pause() turned true or a stage raised WarmingPaused
+    """
+    results = []
+    for start in stages:
+        if should_pause():
+            return None
+        try:
+            results.append(await start())
+        except WarmingPaused:
+            return None
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+async def collect_location_data(lat, lon, city, window=None, ndvi_summary=None, should_pause=None):
     """
+    Runs every stage that only depends on the coordinates at the same time.
+    Blocking stages (requests, Earth Engine downloads) run in worker threads
+    so the agent's event loop stays free. An NDVI summary computed ahead of time
+    (e.g. for a whole batch) can be passed in to skip that stage.
 
-    layers = soil_data.get("properties", {}).get("layers", [])
-    analysis_results = []
-    all_null = True  # Flag to track if all mean values are null
-
-    # Extract and analyze key soil properties
-    analysis_results.append(f"At coordinates:{soil_data.get('geometry',{}).get('coordinates')}")
-    for layer in layers:
-        name = layer.get("name")
-        if layer.get("depths") and len(layer["depths"]) > 0:
-            depth = layer["depths"][0]  # Assume we're interested in the top layer for simplicity
-            mean_value = depth.get("values", {}).get("mean")
-            depth_range = depth.get("range", {})
-
-            if mean_value is not None:
-                all_null = False  # Found a non-null mean value
-                depth_label = depth.get("label", f"{depth_range.get('top_depth', '?')} - {depth_range.get('bottom_depth', '?')} cm")
-                analysis_results.append(f"{name.upper()} content at {depth_label}: {mean_value} ({layer['unit_measure']['mapped_units']})")
-
-    # Check if all properties have null means
-    if all_null:
-        analysis_results.append("No valid soil data found for the provided coordinates.")
-
-    # Generate a summary report
-    soil_summary = "; ".join(analysis_results)  # Changed to use "; " instead of newline
-    return soil_summary
-
-
-# Function to get soil data
-def get_soil_data(lat, lon):
-    coordinate_offsets = [-0.5, 0, 0.5]
-
-    # Iterate through possible offsets to find valid soil data
-    for lat_offset in coordinate_offsets:
-        for lon_offset in coordinate_offsets:
-            adjusted_lat = lat + lat_offset
-            adjusted_lon = lon + lon_offset
-            url = f"{SOILGRIDS_URL}?lon={adjusted_lon}&lat={adjusted_lat}&property=clay&property=phh2o&property=sand&property=silt&property=soc&depth=0-5cm&depth=0-30cm&value=mean"
-            try:
-                response = requests.get(url, headers={"accept": "application/json"})
-                response.raise_for_status()
-                soil_data = response.json()
+    Each stage runs for the nearest location already collected for its source within the
+    source's reuse radius, or for the site itself if there is none. The point each stage
+    used is recorded under "source_points". The soil summary text is accompanied by its
+    numbers under "soil_report".
 
-                # Check if all mean values are null using analyze_soil_data function
-                if not analyze_soil_data(soil_data).startswith("No valid soil data"):
-                    return soil_data  # Return the soil data if it's valid
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Failed to fetch soil data for lat={adjusted_lat}, lon={adjusted_lon}: {e}")
+    Catalogue warming passes `should_pause`. The stages then run one at a time under the
+    warming budgets, and collection stops before the next stage or soil probe once it
+    returns True.
 
-    # If all attempts fail, return an error message
-    return {"error": "No valid soil data found after retries"}
+    Parameters:
+    - window: (start_date, end_date) for the weather series, defaults to weather_window()
+    - should_pause: callable, for background warming only
 
+    Returns:
+    - combined_data: dict, the collected data; stages that failed are listed under "errors".
+      None if should_pause stopped the collection.
+    """
+    index = get_location_index()
+    sites = {}
+    for name, source in INDEX_SOURCES.items():
+        sites[name] = index.nearest(source, lat, lon) or (lat, lon, 0.0)
+
+    weather_lat, weather_lon, _ = sites["weather_data"]
+    soil_lat, soil_lon, _ = sites["soil_data"]
+    ndvi_lat, ndvi_lon, _ = sites["ndvi_data"]
+    country_lat, country_lon, _ = sites["country_code"]
+    warming = should_pause is not None
+    window = window or weather_window()
+    # Each stage is started by calling its entry, so warming only creates the ones it runs
+    stages = {
+        "weather_data": lambda: timed_stage("weather", collect_weather(
+            weather_lat, weather_lon, city, window, warming_weather_limiter if warming else None
+        )),
+        "soil_data": lambda: timed_stage("soil", collect_soil(
+            soil_lat, soil_lon, warming_soil_limiter if warming else None, should_pause
+        )),
+    }
+    if ndvi_summary is None:
+        stages["ndvi_data"] = lambda: timed_stage("ndvi", collect_ndvi(
+            ndvi_lat, ndvi_lon, warm_earth_engine_limiter if warming else None
+        ))
+    stages["country_code"] = lambda: timed_stage("reverse_geocode", asyncio.to_thread(
+        reverse_geocode, country_lat, country_lon, OPEN_WEATHER_API_KEY
+    ))
+    if warming:
+        results = await run_in_turn(stages.values(), should_pause)
+        if results is None:
+            return None
+    else:
+        results = await asyncio.gather(*(start() for start in stages.values()), return_exceptions=True)
+
+    combined_data = {}
+    errors = {}
+    source_points = {}
+    for name, result in zip(stages, results):
+        if isinstance(result, Exception):
+            logger.error(f"Stage {name} failed for {city}: {result!r}")
+            errors[name] = str(result) or type(result).__name__
+            continue
+        if result is not None:
+            combined_data[name] = result
+        site_lat, site_lon, distance_km = sites[name]
+        source_points[name] = {"lat": site_lat, "lon": site_lon, "distance_km": round(distance_km, 3)}
+        if (site_lat, site_lon) == (lat, lon) and reusable(name, result):
+            # Collected for this site, so later requests nearby can reuse it
+            index.add(INDEX_SOURCES[name], lat, lon)
+
+    if "soil_data" in combined_data:
+        # The numbers go out in the typed wire format, the summary text in the plain dict
+        combined_data["soil_report"] = combined_data["soil_data"]
+        combined_data["soil_data"] = format_soil_summary(combined_data["soil_report"])
+    if ndvi_summary is not None:
+        combined_data["ndvi_data"] = ndvi_summary
+    combined_data["source_points"] = source_points
+    if errors:
+        combined_data["errors"] = errors
+    return combined_data
+
+
+# Full pipeline for one location, run once per job however many requests were merged into it
+async def run_collection_job(job):
+    msg, window = job.payload
 
+    # Step 1: Fetch geocode data
+    try:
+        with stage("geocode"):
+            geocode_data = await asyncio.to_thread(geocode, msg.city, msg.state, msg.country, OPEN_WEATHER_API_KEY)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to fetch data: {e}")
+        return {"error": str(e)}
 
-# Function for reverse geocoding
-def reverse_geocode(lat, lon, api_key):
-    url = f"http://api.openweathermap.org/geo/1.0/reverse?lat={lat}&lon={lon}&limit=1&appid={api_key}"
-    response = requests.get(url)
-    if response.status_code == 200 and len(response.json()) > 0:
-        return response.json()[0].get("country")
-    else:
-        return None
+    if not geocode_data:
+        logger.error("No geocode data found for the provided location")
+        return {"error": "No geocode data found"}
 
-def analyze_ndvi_data(ndvi_data):
-    """
-    Analyzes the NDVI data and returns a structured dictionary with key observations.
+    lat = geocode_data[0]["lat"]
+    lon = geocode_data[0]["lon"]
+    logger.info(f"Successfully fetched geocodes: lat={lat}, lon={lon}")
 
-    Parameters:
-    - ndvi_data: ndarray, a 2D array representing NDVI values in grayscale from the image.
+    # Step 2: Fetch weather, NDVI, soil and country code concurrently
+    combined_data = await collect_location_data(lat, lon, msg.city, window)
+    combined_data["location"] = {"city": msg.city, "lat": lat, "lon": lon}
 
-    Returns:
-    - ndvi_summary: dict, a summary report of NDVI observations.
-    """
-    if ndvi_data is None or ndvi_data.size == 0:
-        return {
-            "summary": "No NDVI data available for analysis."
-        }
-
-    # Normalize NDVI values back from grayscale
-    ndvi_values = (ndvi_data / 255.0) * 2 - 1  # Rescaling grayscale values (0 to 255) to NDVI range (-1 to 1)
-    ndvi_mean = ndvi_values.mean()
-    ndvi_max = ndvi_values.max()
-    ndvi_min = ndvi_values.min()
-
-    # Determine the general trend in the NDVI values
-    ndvi_trend = "stable"
-    if ndvi_max - ndvi_min > 0.5:
-        ndvi_trend = "fluctuating"
-    elif ndvi_mean > 0.4:
-        ndvi_trend = "consistently high"
-
-    key_events = []
-    if ndvi_max > 0.6:
-        key_events.append(f"High vegetation density observed (Max NDVI: {ndvi_max:.2f})")
-    if ndvi_min < -0.2:
-        key_events.append(f"Low vegetation density or possibly barren land observed (Min NDVI: {ndvi_min:.2f})")
-
-    # Create a structured summary report
-    ndvi_summary = {
-        "mean_ndvi": round(ndvi_mean, 2),
-        "max_ndvi": round(ndvi_max, 2),
-        "min_ndvi": round(ndvi_min, 2),
-        "trend": ndvi_trend,
-        "key_events": key_events if key_events else "No significant events observed."
-    }
+    # Write combined data to a JSON file, replacing any earlier one in a single rename
+    output_filename = f"data_collection_{msg.city}.json"
+    await asyncio.to_thread(
+        replace_file, job.scratch_dir, output_filename, lambda json_file: json.dump(combined_data, json_file, indent=4)
+    )
+    logger.info(f"Combined data saved to {output_filename}")
+    return combined_data
 
-    return ndvi_summary
 
-def convert_tiff_to_png(input_file, output_file):
-    try:
-        # Open the TIFF file using Wand and convert it to PNG
-        with Image(filename=input_file) as img:
-            img.format = 'png'
-            img.save(filename=output_file)
-        print(f"Successfully converted {input_file} to {output_file}")
-    except Exception as e:
-        print(f"Error during conversion: {e}")
+# Location requests in flight; requests for the same place and window share one job
+collection_jobs = JobQueue(run_collection_job, name="collection")
+
+
+def location_key(msg: LocationRequest, window):
+    # Requests that differ only in case or surrounding spaces name the same location
+    start_date, end_date = window
+    return (msg.city.strip().lower(), msg.state.strip().lower(), msg.country.strip().lower(), start_date, end_date)
+
+
+# Serves one location request: joins or starts its job, then delivers the shared result
+async def run_data_pipeline(ctx: Context, sender: str, msg: LocationRequest):
+    with request_context(msg.correlation_id or None, kind="collection") as record:
+        version = negotiate(msg.accept_versions)
+        try:
+            window = weather_window(msg.start_date, msg.end_date)
+        except ValueError as e:
+            ctx.logger.error(f"Invalid weather window: {e}")
+            await ctx.send(sender, encode_collected_data({"error": str(e)}, version, correlation_id.get()))
+            return
+
+        try:
+            job, coalesced = collection_jobs.submit(location_key(msg, window), (msg, window))
+        except QueueFull as e:
+            ctx.logger.warning(f"Rejecting request for {msg.city}: {e}")
+            await ctx.send(sender, BusyResponse(reason=str(e), queued=e.queued, retry_after=e.retry_after,
+                                                correlation_id=correlation_id.get()))
+            return
+        record["job"] = job.id
+        if coalesced:
+            ctx.logger.info(f"Request for {msg.city} joined job {job.id} already in progress")
+
+        try:
+            combined_data = await job.result()
+        except Exception as e:
+            combined_data = {"error": str(e) or type(e).__name__}
+
+        if "error" in combined_data:
+            await ctx.send(sender, encode_collected_data(combined_data, version, correlation_id.get()))
+            return
+
+        # Send weather response data to the requester
+        # await ctx.send(sender, CollectedData(data=combined_data))
+
+        try:
+            await send_data_to_impact_agent(ctx,combined_data, msg.reply_to or IMPACT_AGENT_ADDRESS, version, window)
+        except Exception as e:
+            ctx.logger.error(f"Failed to send data to Impact Assessment Agent: {e}")
+
+
+# Pipelines currently running; holding references keeps the tasks from being garbage collected
+running_pipelines = set()
 
 
 # Handler for Weather and NDVI Requests
-@data_sharing_proto.on_message(model=LocationRequest, replies={CollectedData})
+@data_sharing_proto.on_message(model=LocationRequest, replies={CollectedData, CollectedDataV2, BusyResponse})
 async def handle_data_request(ctx: Context, sender: str, msg: LocationRequest):
-    ctx.logger.info(f"Received WeatherRequest for city: {msg.city}")
+    ctx.logger.info(f"Received WeatherRequest for city: {msg.city} ({collection_jobs.stats()})")
+    warmer.note_live_request()
 
-    # Step 1: Fetch geocode data
-    url = f"{GEOCODE_URL}?q={msg.city},{msg.state},{msg.country}&limit=1&appid={OPEN_WEATHER_API_KEY}"
-    ctx.logger.info(f"Geocode request URL: {url}")
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        geocode_data = response.json()
+    # Run the pipeline as a background task so the agent keeps processing other messages
+    task = asyncio.create_task(run_data_pipeline(ctx, sender, msg))
+    running_pipelines.add(task)
+    task.add_done_callback(running_pipelines.discard)
 
-        if geocode_data:
-            lat = geocode_data[0]["lat"]
-            lon = geocode_data[0]["lon"]
-            ctx.logger.info(f"Successfully fetched geocodes: lat={lat}, lon={lon}")
 
-            # Step 2: Fetch weather data
+async def collect_batch(cities, points, on_result, window=None):
+    """
+    Collects data for many locations. City names are geocoded first, then locations that
+    round to the same coordinates are collected once. All locations share the module-level
+    rate limiters, and each result is passed to `on_result` as soon as it is ready.
 
-            start_date = datetime(2021, 1, 1)
-            end_date = datetime(2021, 12, 31)
+    Parameters:
+    - cities: list of LocationRequest
+    - points: list of LocationPoint
+    - on_result: async callable taking (labels, lat, lon, combined_data)
+    - window: (start_date, end_date) for the weather series, defaults to weather_window()
 
+    Returns:
+    - stats: dict with request and unique location counts, "geocode_failed" (city queries
+      that could not be geocoded), "failed" (locations with stage errors) and throughput
+    """
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
 
-            # Get weather data for the year 2021
-            weather_data = get_daily_weather_aggregate(lat, lon, start_date, end_date, OPEN_WEATHER_API_KEY, msg.city)
+    # Geocode each distinct city query once
+    queries = {}
+    for city in cities:
+        queries.setdefault((city.city.strip().lower(), city.state.strip().lower(), city.country.strip().lower()), city)
 
-            # Aggregate weather data
-            aggregated_weather = aggregate_weather_data(weather_data)
+    async def resolve(city):
+        async with semaphore:
+            try:
+                return city, await asyncio.to_thread(geocode, city.city, city.state, city.country, OPEN_WEATHER_API_KEY)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Failed to geocode {city.city}: {e}")
+                return city, None
+
+    resolved = await asyncio.gather(*(resolve(city) for city in queries.values()))
+
+    # Group labels by rounded coordinates so duplicate sites are collected once
+    locations = {}
+    geocode_failed = 0
+    for city, geocode_data in resolved:
+        if not geocode_data:
+            geocode_failed += 1
+            continue
+        lat, lon = geocode_data[0]["lat"], geocode_data[0]["lon"]
+        key = (round(lat, COORDINATE_PRECISION), round(lon, COORDINATE_PRECISION))
+        locations.setdefault(key, (lat, lon, []))[2].append(city.city)
+    for point in points:
+        key = (round(point.lat, COORDINATE_PRECISION), round(point.lon, COORDINATE_PRECISION))
+        locations.setdefault(key, (point.lat, point.lon, []))[2].append(point.label or f"{point.lat},{point.lon}")
+
+    # In reduce mode, NDVI for every location comes from batched reduceRegions calls
+    ndvi_summaries = [None] * len(locations)
+    if NDVI_MODE == "reduce" and locations:
+        ndvi_points = [(lat, lon) for lat, lon, _ in locations.values()]
+        try:
+            ndvi_summaries = await asyncio.to_thread(get_ndvi_summaries, ndvi_points, NDVI_START_DATE, NDVI_END_DATE)
+        except Exception as e:
+            logger.error(f"Batched NDVI reduction failed, falling back to per-location requests: {e}")
+
+    async def collect(lat, lon, labels, ndvi_summary):
+        async with semaphore:
+            return labels, lat, lon, await collect_location_data(lat, lon, labels[0], window, ndvi_summary)
+
+    tasks = [
+        asyncio.create_task(collect(lat, lon, labels, ndvi_summary))
+        for (lat, lon, labels), ndvi_summary in zip(locations.values(), ndvi_summaries)
+    ]
+    failed = 0
+    for task in asyncio.as_completed(tasks):
+        labels, lat, lon, combined_data = await task
+        if "errors" in combined_data:
+            failed += 1
+        await on_result(labels, lat, lon, combined_data)
+
+    elapsed = time.monotonic() - started
+    return {
+        "requested": len(cities) + len(points),
+        "unique_locations": len(locations),
+        "geocode_failed": geocode_failed,
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 3),
+        "locations_per_second": round(len(locations) / elapsed, 3) if elapsed > 0 else None,
+    }
 
-            #Step 3: Fetch NDVI data using Google Earth Engine
-            ctx.logger.info("Fetching NDVI data using Google Earth Engine")
-            point = ee.Geometry.Point([lon, lat])
-            start_date = "2022-10-01"
-            end_date = "2022-10-31"
-            collection = ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED") \
-                .filterBounds(point) \
-                .filterDate(start_date, end_date) \
-                .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
 
-            # Calculate NDVI
-            def calculate_ndvi(image):
-                ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
-                return image.addBands(ndvi)
+def write_records(results_file, records):
+    # One JSON record per line, flushed as each location finishes
+    for record in records:
+        results_file.write(json.dumps(record) + "\n")
+    results_file.flush()
 
-            collection = collection.map(calculate_ndvi)
-            ndvi_image = collection.median().select('NDVI')
 
-            # Step 4: Generate download URL for the NDVI GeoTIFF
-            geemap.ee_export_image(ndvi_image, filename='ndvi_image.tif', scale=30, region=point, file_per_band=False)
+async def run_batch_pipeline(ctx: Context, sender: str, msg: BatchLocationRequest, batch_id: str):
+    with request_context(msg.correlation_id or batch_id, kind="batch"):
+        version = negotiate(msg.accept_versions)
+        try:
+            window = weather_window(msg.start_date, msg.end_date)
+        except ValueError as e:
+            ctx.logger.error(f"Invalid weather window for batch {batch_id}: {e}")
+            await ctx.send(sender, encode_collected_data({"error": str(e)}, version, correlation_id.get()))
+            return
 
-            # Step 5: Download the NDVI GeoTIFF locally
-            ndvi_filename = 'ndvi_image.tif'
+        output_filename = f"data_collection_batch_{batch_id}.ndjson"
 
+        # File writes go through worker threads so a large batch does not hold up other handlers;
+        # on_result is awaited once per location in turn, so the writes never overlap
+        results_file = await asyncio.to_thread(open, output_filename, 'w')
+        try:
+            async def on_result(labels, lat, lon, combined_data):
+                records = [dict(combined_data, location={"city": label, "lat": lat, "lon": lon}) for label in labels]
+                await asyncio.to_thread(write_records, results_file, records)
+                for record in records:
+                    await ctx.send(sender, await collected_message(record, version, window))
 
-            ctx.logger.info(f"NDVI data downloaded successfully to {ndvi_filename}")
+            stats = await collect_batch(msg.cities, msg.points, on_result, window)
+        finally:
+            await asyncio.to_thread(results_file.close)
 
-            convert_tiff_to_png('ndvi_image.tif', 'ndvi_image.png')
+        ctx.logger.info(
+            f"Batch {batch_id}: {stats['unique_locations']} locations ({stats['requested']} requested, "
+            f"{stats['geocode_failed']} not geocoded, {stats['failed']} with stage errors) in {stats['elapsed_seconds']}s, "
+            f"{stats['locations_per_second']} locations/s; results in {output_filename}"
+        )
 
-            try:
-                ndvi_image_png = img.open("ndvi_image.png")
-                # Convert image to a numpy array for further processing if needed
-                ndvi_data = np.array(ndvi_image_png)
 
-                ndvi_summary = analyze_ndvi_data(ndvi_data)
-                print(ndvi_summary)
+@data_sharing_proto.on_message(model=BatchLocationRequest, replies={CollectedData, CollectedDataV2})
+async def handle_batch_request(ctx: Context, sender: str, msg: BatchLocationRequest):
+    batch_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    ctx.logger.info(f"Received batch {batch_id} with {len(msg.cities)} cities and {len(msg.points)} points")
+    warmer.note_live_request()
 
-            except Exception as e:
-                ctx.logger.error(f"Failed to load or process NDVI image: {e}")
-                ndvi_summary = "NDVI data could not be analyzed due to an error."
+    task = asyncio.create_task(run_batch_pipeline(ctx, sender, msg, batch_id))
+    running_pipelines.add(task)
+    task.add_done_callback(running_pipelines.discard)
 
-            # Step 5: Store the NDVI value in the data response
 
+async def warm_site(site, should_pause):
+    """
+    Brings one catalogue site up to date: the rolling weather window, then the soil, NDVI
+    and country code stages. Every call is made under the warming budgets, and the site
+    is left as it is when `should_pause()` turns true between weather chunks, stages or
+    soil probes.
 
-            soil_data = get_soil_data(lat, lon)
+    Parameters:
+    - site: dict with "city" (and optionally "state", "country") or "lat"/"lon"
 
-            ctx.logger.info("Successfully fetched soil data")
+    Returns:
+    - the collected data, or None if warming stopped early
+    """
+    label = site.get("label") or site.get("city") or f"{site['lat']},{site['lon']}"
+    if site.get("lat") is not None:
+        lat, lon = site["lat"], site["lon"]
+    else:
+        geocode_data = await asyncio.to_thread(geocode, site["city"], site.get("state", ""), site.get("country", ""), OPEN_WEATHER_API_KEY)
+        if not geocode_data:
+            raise ValueError(f"No geocode data found for {label}")
+        lat, lon = geocode_data[0]["lat"], geocode_data[0]["lon"]
 
-            soil_summary = analyze_soil_data(soil_data)
+    # Fill the weather store where the pipeline will read it from
+    weather_lat, weather_lon, _ = get_location_index().nearest("weather", lat, lon) or (lat, lon, 0.0)
+    start_date, end_date = weather_window()
+    stored = await asyncio.to_thread(load_days, weather_lat, weather_lon, mmap=False)
+    missing = missing_dates(stored, start_date, end_date).astype(object)
+    for offset in range(0, len(missing), WARM_WEATHER_CHUNK_DAYS):
+        if should_pause():
+            return None
+        dates = missing[offset:offset + WARM_WEATHER_CHUNK_DAYS]
+        day_summaries = await fetch_day_summaries(
+            f"{BASE_WEATHER_URL}/day_summary", weather_lat, weather_lon, dates, OPEN_WEATHER_API_KEY,
+            limiter=warming_weather_limiter,
+        )
+        fetched = [data for data in day_summaries if data is not None]
+        if fetched:
+            await asyncio.to_thread(append_days, weather_lat, weather_lon, day_records(fetched))
 
-            # Combine weather and soil data
-            combined_data = {
-                "weather_data": aggregated_weather,
-                "soil_data": soil_summary
-            }
-            combined_data["ndvi_data"] = ndvi_summary
+    # Weather is now served from the store; this fills the remaining stages' caches
+    return await collect_location_data(lat, lon, label, should_pause=should_pause)
 
-            country_code = reverse_geocode(lat, lon, OPEN_WEATHER_API_KEY)
-            if country_code:
-                combined_data["country_code"] = country_code
 
+_indicator_service = None
 
 
-            # Write combined data to a JSON file
-            output_filename = f"data_collection_{msg.city}.json"
-            with open(output_filename, 'w') as json_file:
-                json.dump(combined_data, json_file, indent=4)
+async def warm_countries(countries):
+    # The impact agent reads the same cache, so its lookups for these countries become hits
+    global _indicator_service
+    if _indicator_service is None:
+        from indicators import IndicatorService
+        _indicator_service = IndicatorService()
+    await refresh_economic_data(_indicator_service, countries)
 
-            ctx.logger.info(f"Combined data saved to {output_filename}")
 
+# Pre-fetches the WARM_CATALOGUE sites and countries while no live request is being served
+warmer = Warmer(load_catalogue(), warm_site, warm_countries, is_busy=lambda: bool(running_pipelines))
 
-            # Send weather response data to the requester
-            # await ctx.send(sender, CollectedData(data=combined_data))
 
-            try:
-                await send_data_to_impact_agent(ctx,combined_data)
-            except Exception as e:
-                ctx.logger.error(f"Failed to send data to Impact Assessment Agent: {e}")
-                
-        else:
-            ctx.logger.error("No geocode data found for the provided location")
-            await ctx.send(sender, CollectedData(data={"error": "No geocode data found"}))
-    except requests.exceptions.RequestException as e:
-        ctx.logger.error(f"Failed to fetch data: {e}")
-        await ctx.send(sender, CollectedData(data={"error": str(e)}))
+@data_col_agent.on_interval(period=WARM_INTERVAL)
+async def warm_catalogue(ctx: Context):
+    warmer.tick()
+
 
+# Load report for the coordinator's health checks
+@data_sharing_proto.on_message(model=HealthCheck, replies={WorkerStatus})
+async def handle_health_check(ctx: Context, sender: str, msg: HealthCheck):
+    await ctx.send(sender, WorkerStatus(**collection_jobs.stats()))
 
 
+def daily_weather(combined_data, window):
+    # The series the weather summary was computed from, read back from the store
+    point = combined_data.get("source_points", {}).get("weather_data")
+    if "weather_data" not in combined_data or point is None:
+        return None
+    return to_series(select_range(load_days(point["lat"], point["lon"], mmap=False), *window))
+
+
+async def collected_message(data, version, window):
+    """
+    Builds the CollectedData message in the version negotiated with the receiver.
+    Version 2 also carries the daily weather series, read from the store in a worker thread.
+    """
+    daily = await asyncio.to_thread(daily_weather, data, window) if version >= 2 else None
+    message = encode_collected_data(data, version, correlation_id.get(), daily)
+    registry.inc("collected_messages_total", version=str(version))
+    return message
 
 
 # Function to trigger sending data to Impact Assessment Agent
-async def send_data_to_impact_agent(ctx,data):
-    impact_agent_address = "agent1qd55537kkcuvwq0wd5tgwuw2lylul94wju62pa4wzfnwhy65xydekmlzh8x"
+async def send_data_to_impact_agent(ctx,data, impact_agent_address=IMPACT_AGENT_ADDRESS, version=1, window=None):
     await ctx.send(
         impact_agent_address,
-        CollectedData(data=data)
+        await collected_message(data, version, window or weather_window())
     )
 # Include data_sharing_proto in the agent
 
@@ -1,8 +1,135 @@
+from typing import Optional
+
 from uagents import Protocol, Model
 
+# Weather Request and Response Models
+class LocationRequest(Model):
+    city: str
+    state: str = ""
+    country: str = ""
+    # Weather window as YYYY-MM-DD; empty means a rolling window ending yesterday
+    start_date: str = ""
+    end_date: str = ""
+    # Optional request ID for tracing; one is generated when empty
+    correlation_id: str = ""
+    # Agent that receives the collected data; empty sends it to the impact assessment agent
+    reply_to: str = ""
+    # CollectedData wire versions the receiver can read; the highest one both sides know is used
+    accept_versions: list[int] = [1]
+
+# A raw coordinate pair, for batch requests that skip geocoding
+class LocationPoint(Model):
+    lat: float
+    lon: float
+    label: str = ""
+
+# Batch of locations to collect in one run; results stream back one CollectedData per location
+class BatchLocationRequest(Model):
+    cities: list[LocationRequest] = []
+    points: list[LocationPoint] = []
+    start_date: str = ""
+    end_date: str = ""
+    correlation_id: str = ""
+    accept_versions: list[int] = [1]
+
 # Data model to hold the collected data
 class CollectedData(Model):
     data: dict
+    # ID of the request that produced this data, carried on to the impact assessment
+    correlation_id: str = ""
+
+# NumPy array packed for the wire: zlib-compressed and base64-encoded. Whole-number arrays
+# and decimals that fit `scale` exactly are sent as integer deltas, which compress far better.
+class PackedArray(Model):
+    dtype: str
+    shape: list[int]
+    # "raw", or "delta-int16", "delta-int32" or "delta-int64"
+    encoding: str = "raw"
+    # Delta-encoded values were multiplied by this before rounding to integers
+    scale: int = 1
+    data: str
+
+class WeatherSummary(Model):
+    temp_min: float
+    temp_max: float
+    temp_avg: float
+    humidity_avg: float
+    total_precipitation: float
+    key_events: list[str] = []
+    # Daily series by field, plus "date"; the receiver derives the period statistics from it
+    daily: dict[str, PackedArray] = {}
+
+class SoilLayer(Model):
+    name: str
+    depth: str
+    mean: float
+    unit: str
+
+class SoilSummary(Model):
+    # [lon, lat] queried from SoilGrids
+    coordinates: Optional[list[float]] = None
+    # Set when the nearest valid sample was used instead of the site itself
+    probe_distance_km: Optional[float] = None
+    layers: list[SoilLayer] = []
+
+class NdviSummary(Model):
+    mean_ndvi: Optional[float] = None
+    max_ndvi: Optional[float] = None
+    min_ndvi: Optional[float] = None
+    valid_pixels: Optional[int] = None
+    # Series mode only: "period" start dates, "ndvi" (NaN where no clear pixel) and "clear_pixels"
+    series: dict[str, PackedArray] = {}
+    # The rest of the report (percentiles, trend, seasonality, key events, ...) as ndvi.py builds it
+    details: dict = {}
+
+class SourcePoint(Model):
+    lat: float
+    lon: float
+    distance_km: float = 0.0
+
+# Version 2 of CollectedData: typed numeric fields instead of preformatted text, and daily
+# series as packed arrays. Only sent to requesters that list 2 in accept_versions.
+class CollectedDataV2(Model):
+    version: int = 2
+    correlation_id: str = ""
+    city: str = ""
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    country_code: str = ""
+    weather: Optional[WeatherSummary] = None
+    soil: Optional[SoilSummary] = None
+    ndvi: Optional[NdviSummary] = None
+    source_points: dict[str, SourcePoint] = {}
+    # Stages that failed, by stage name
+    errors: dict[str, str] = {}
+    # Set instead of the data when the whole request failed
+    error: str = ""
+
+# Sent instead of a result when the data collection agent's job queue is full
+class BusyResponse(Model):
+    reason: str
+    queued: int = 0
+    # Suggested delay in seconds before sending the request again
+    retry_after: float = 0.0
+    correlation_id: str = ""
+
+# Sent by the coordinator to each worker; workers answer with a WorkerStatus
+class HealthCheck(Model):
+    pass
+
+# A data collection worker's current load
+class WorkerStatus(Model):
+    running: int
+    queued: int
+    concurrency: int
+    max_queued: int
+
+# Economic impact results sent back to the agent that supplied the collected data
+class EconomicImpactResponse(Model):
+    gdp: Optional[float] = None
+    poverty_rate: Optional[float] = None
+    educational_expense: Optional[float] = None
+    analysis: dict = {}
 
 # Protocol to facilitate data sharing between agents
 data_sharing_proto = Protocol(name="data_sharing_proto", version=1.0)
@@ -0,0 +1,47 @@
+import logging
+
+import requests
+
+from cache import get_cache
+from metrics import record_call
+
+logger = logging.getLogger(__name__)
+
+# API Endpoints
+GEOCODE_URL = "http://api.openweathermap.org/geo/1.0/direct"
+REVERSE_GEOCODE_URL = "http://api.openweathermap.org/geo/1.0/reverse"
+
+
+# Function for geocoding a city name
+def geocode(city, state, country, api_key):
+    cache_params = {"city": city, "state": state, "country": country}
+    cached = get_cache().get("geocode", cache_params)
+    if cached is not None:
+        return cached
+
+    url = f"{GEOCODE_URL}?q={city},{state},{country}&limit=1&appid={api_key}"
+    response = requests.get(url)
+    record_call("openweather_geocode", len(response.content), response.status_code)
+    response.raise_for_status()
+    geocode_data = response.json()
+    if geocode_data:
+        get_cache().set("geocode", cache_params, geocode_data)
+    return geocode_data
+
+
+# Function for reverse geocoding
+def reverse_geocode(lat, lon, api_key):
+    cached = get_cache().get("reverse_geocode", {"lat": lat, "lon": lon})
+    if cached is not None:
+        return cached
+
+    url = f"{REVERSE_GEOCODE_URL}?lat={lat}&lon={lon}&limit=1&appid={api_key}"
+    response = requests.get(url)
+    record_call("openweather_geocode", len(response.content), response.status_code)
+    if response.status_code == 200 and len(response.json()) > 0:
+        country_code = response.json()[0].get("country")
+        if country_code:
+            get_cache().set("reverse_geocode", {"lat": lat, "lon": lon}, country_code)
+        return country_code
+    else:
+        return None
@@ -1,15 +1,20 @@
-from uagents import Agent, Context, Protocol, Field, Model
+from uagents import Agent, Context
 from uagents.setup import fund_agent_if_low
-import requests
-from data_sharing import data_sharing_proto, CollectedData
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.textanalytics import TextAnalyticsClient
-import xml.etree.ElementTree as ET
+from data_sharing import (
+    data_sharing_proto, BatchLocationRequest, BusyResponse, CollectedData, CollectedDataV2, EconomicImpactResponse,
+    LocationRequest,
+)
+from indicators import IndicatorService
+from analysis import memoized_analysis, memo_stats
+from metrics import request_context, stage, start_metrics_server
+from scoring import SCORE_FLUSH_INTERVAL, ComparativeScorer, CountryEconomics, location_metrics
+from wire import SUPPORTED_VERSIONS, decode_collected_data
 from dotenv import load_dotenv
 import os
 import logging
 import json
-from ai_engine import UAgentResponse, UAgentResponseType
+import asyncio
+import re
 
 load_dotenv()
 # Logging setup
@@ -25,196 +30,144 @@ impact_assessment_agent = Agent(
     endpoint="http://localhost:8002/submit"
 )
 
-fund_agent_if_low(impact_assessment_agent.wallet.address())
-# Azure Cognitive Services setup
-endpoint = os.getenv("AZURE_LANGUAGE_ENDPOINT")
-key = os.getenv("AZURE_LANGUAGE_KEY")
-text_analytics_client = TextAnalyticsClient(endpoint=endpoint, credential=AzureKeyCredential(key))
-
 logger.info(f"Agent address: {impact_assessment_agent.address}")
 
-# Weather Request and Response Models
-class LocationRequest(Model):
-    city: str =
-    state: str = ""
-    country: str = ""
-
-
-
-def get_value(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        if len(data) > 1 and len(data[1]) > 0:
-            # Loop through the data to find the most recent value in or before 2021
-            for record in sorted(data[1], key=lambda x: x.get("date"), reverse=True):
-                year = int(record.get("date"))
-                if year <= 2021 and record.get("value") is not None:
-                    return record["value"], record["date"], record["countryiso3code"], record["country"]["value"]  # Return the value, year, and country code
-    return None, None, None, None
-
-
-def get_educational_expenditure(country_3_letter_code):
-    url = f"https://sdmx.oecd.org/public/rest/data/OECD.EDU.IMEP,DSD_EAG_UOE_FIN@DF_UOE_FIN_INDIC_SOURCE_NATURE,3.0/{country_3_letter_code}.EXP._T.S13.INST_EDU.DIR_EXP.V.XDC.SOURCE?startPeriod=2021&endPeriod=2021"
-    logger.info(url)
-    # Make the HTTP request
-    response = requests.get(url)
-    if response.status_code == 200:
-        # Parse the XML response
-        root = ET.fromstring(response.content)
-
-        # Define the namespaces used in the XML
-        namespaces = {
-            'message': 'http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message',
-            'generic': 'http://www.sdmx.org/resources/sdmxml/schemas/v2_1/data/generic'
-        }
-
-        # Extract the ObsValue element
-        # Notice the correct usage of namespaces and deep navigation
-        obs_value_element = root.find(".//generic:Obs/generic:ObsValue", namespaces)
-
-        # Extract and print the value if it exists
-        if obs_value_element is not None:
-            expenditure_value = obs_value_element.attrib.get("value")
-            if expenditure_value:
-                return expenditure_value
-            else:
-                logger.info("Expenditure value is empty.")
-        else:
-            logger.info("Expenditure value not found in the XML.")
-    else:
-        print("Failed to fetch data from the API. Status code:", response.status_code)
+# One pooled HTTP session for all World Bank and OECD lookups
+indicator_service = IndicatorService()
 
-    return None
+# Local port for /metrics and /metrics.json; 0 turns the endpoint off
+METRICS_PORT = int(os.getenv("IMPACT_METRICS_PORT", "9102"))
+# Top up the agent's testnet wallet on startup; set to 0 where there is no faucet to reach
+FUND_AGENT = os.getenv("FUND_AGENT", "1") == "1"
+# Data collection agent, or the coordinator in front of a pool of them
+DATA_COLLECTION_AGENT_ADDRESS = os.getenv(
+    "DATA_COLLECTION_AGENT_ADDRESS", "agent1qfjd3x4ygc00rgpd67kuzwksh92tgj6m4ajqkn0hn5y6eagt0k4qvx88hnt"
+)
+# Comma-separated cities to assess on startup. Several cities go out as one batch request,
+# which a data collection agent serves directly (a coordinator only takes single requests).
+IMPACT_CITIES = [city.strip() for city in os.getenv("IMPACT_CITIES", "London").split(",") if city.strip()]
+# Directory for the per-location analysis files
+IMPACT_OUTPUT_DIR = os.getenv("IMPACT_OUTPUT_DIR", ".")
 
-CITY_NAME = "London"
-@impact_assessment_agent.on_event("startup")
-async def ask_data(ctx:Context):
-    ctx.logger.info(f"Asking data")
+# Economic data fetched once per country, however many of its locations are assessed
+country_economics = CountryEconomics(indicator_service)
+# Comparative scores across every location assessed, kept in one table
+scorer = ComparativeScorer()
 
-    location_request = LocationRequest(city=CITY_NAME, state="", country="")
 
-    await ctx.send("agent1qfjd3x4ygc00rgpd67kuzwksh92tgj6m4ajqkn0hn5y6eagt0k4qvx88hnt", location_request)
+@impact_assessment_agent.on_event("startup")
+async def startup(ctx: Context):
+    start_metrics_server(METRICS_PORT)
+    if FUND_AGENT:
+        # Blocking faucet call; done once the agent runs, not when the module is imported
+        await asyncio.to_thread(fund_agent_if_low, impact_assessment_agent.wallet.address())
 
 
-@data_sharing_proto.on_message(model=CollectedData, replies={})
-async def handle_collected_data(ctx: Context, sender: str, msg: CollectedData):
-    ctx.logger.info(f"Received collected data from Data Collection Agent")
-
-    # Extract country code from the collected data
-    country_code = msg.data.get("country_code", None)
-    if not country_code:
-        ctx.logger.error("Country code is missing in the collected data.")
-        return
-
-    # Perform economic impact assessment
-    economic_data = get_economic_educational_data(country_code)
-    if economic_data:
-        gdp, gdp_year, gdp_country = economic_data.get('GDP')
-        poverty_rate, poverty_year = economic_data.get('poverty_rate')
-        education_expense = economic_data.get("educational_expenditure")
-
-        # Generate a detailed analysis
-        analysis = generate_analysis(msg.data, gdp, gdp_year, poverty_rate, poverty_year, education_expense, gdp_country)
-
-        output_filename = f"impact_analysis_{CITY_NAME}.json"
-        with open(output_filename, 'w') as json_file:
-            json.dump(analysis, json_file, indent=4)
-        logger.info(f"Impact analysis saved to {output_filename}")
-
-        #Send the economic impact response back
-        await ctx.send(
-            sender,
-            EconomicImpactResponse(gdp=gdp, poverty_rate=poverty_rate, educational_expense=education_expense,
-                                   analysis=analysis)
-        )
-
-
-# Function to retrieve economic data from the World Bank API
-def get_economic_educational_data(country_code):
-    # World Bank API for GDP and Poverty data
-    gdp_indicator = "NY.GDP.MKTP.CD"  # GDP in current USD
-    poverty_indicator = "SI.POV.DDAY"  # Poverty headcount ratio at $2.15 a day (2017 PPP) (% of population)
-    base_url = "https://api.worldbank.org/v2/country"
-
-    # Construct URLs for both indicators
-    gdp_url = f"{base_url}/{country_code}/indicator/{gdp_indicator}?format=json"
-    poverty_url = f"{base_url}/{country_code}/indicator/{poverty_indicator}?format=json"
-
-    # Fetch GDP data
-    gdp_value, gdp_year, gdp_iso3count, gdp_country = get_value(gdp_url)
-    # Fetch poverty data
-    poverty_value, poverty_year, poverty_iso3count, poverty_country = get_value(poverty_url)
-
-    educational_expenditure = get_educational_expenditure(gdp_iso3count)
-
-    return {
-        "GDP": (gdp_value, gdp_year, gdp_country),
-        "poverty_rate": (poverty_value, poverty_year),
-        "educational_expenditure": educational_expenditure
-    }
-
-
-# Function to generate a detailed analysis of all collected data using Azure Text Analytics
-def generate_analysis(collected_data, gdp, gdp_year, poverty_rate, poverty_year, educational_expense, country):
-    # Create a human-readable summary of collected data
-    summary_parts = []
-
-    # Economic Data Summary
-    if gdp is not None:
-        summary_parts.append(f"GDP of {country} in {gdp_year}: {gdp:.2f} USD.")
-    else:
-        summary_parts.append(f"GDP data for {country} is unavailable.")
+@impact_assessment_agent.on_event("startup")
+async def ask_data(ctx:Context):
+    ctx.logger.info(f"Asking data for {len(IMPACT_CITIES)} cities")
 
-    if poverty_rate is not None:
-        summary_parts.append(f"Poverty rate in {country} in {poverty_year}: {poverty_rate}% of the population.")
+    if len(IMPACT_CITIES) == 1:
+        request = LocationRequest(city=IMPACT_CITIES[0], state="", country="", accept_versions=SUPPORTED_VERSIONS)
     else:
-        summary_parts.append(f"Poverty rate data for {country} is unavailable.")
+        request = BatchLocationRequest(cities=[LocationRequest(city=city) for city in IMPACT_CITIES],
+                                       accept_versions=SUPPORTED_VERSIONS)
 
-    if educational_expense is not None:
-        summary_parts.append(f"Educational expenditure of {country}: {educational_expense} USD.")
-    else:
-        summary_parts.append(f"No education data available for {country}.")
-
-    # NDVI Analysis Summary
-    if 'ndvi_data' in collected_data:
-        ndvi_data = collected_data['ndvi_data']
-        ndvi_summary = f"NDVI Summary: Mean: {ndvi_data.get('mean_ndvi', 'N/A')}, Max: {ndvi_data.get('max_ndvi', 'N/A')}, Min: {ndvi_data.get('min_ndvi', 'N/A')}"
-        summary_parts.append(ndvi_summary)
-
-    # Weather Data Analysis Summary
-    if 'weather_data' in collected_data:
-        weather_data = collected_data['weather_data']
-        weather_summary = (
-            f"Temperature: Max: {weather_data['temperature']['max']} K, "
-            f"Avg: {weather_data['temperature']['average']:.2f} K. "
-            f"Average Humidity: {weather_data['humidity']['average']:.2f}%. "
-            f"Total Precipitation: {weather_data['total_precipitation']:.2f} mm. "
-            f"Notable Weather Events: {', '.join(weather_data['key_events'])}"
-        )
-        summary_parts.append(weather_summary)
-
-    # Soil Data Analysis Summary
-    if 'soil_data' in collected_data:
-        soil_summary = collected_data['soil_data']
-        summary_parts.append(f"Soil Data: {soil_summary}")
-
-    # Combine summaries
-    combined_summary = "\n".join(summary_parts)
-
-    # Analyze the summary with Azure Text Analytics to extract insights
-    response = text_analytics_client.extract_key_phrases([combined_summary])
-    key_phrases = response[0].key_phrases if not response[0].is_error else []
-
-    # Create a dictionary for a cleaner output
-    analysis_dict = {
-        "Summary": combined_summary,
-        "Key Insights": key_phrases
-    }
-
-    return analysis_dict
+    await ctx.send(DATA_COLLECTION_AGENT_ADDRESS, request)
 
 
+@data_sharing_proto.on_message(model=BusyResponse, replies={})
+async def handle_busy(ctx: Context, sender: str, msg: BusyResponse):
+    ctx.logger.warning(f"Data collection agent is busy ({msg.queued} queued), retry in {msg.retry_after}s: {msg.reason}")
+
+
+@data_sharing_proto.on_message(model=CollectedData, replies={})
+async def handle_collected_data(ctx: Context, sender: str, msg: CollectedData):
+    await assess_collected_data(ctx, sender, msg)
+
+
+@data_sharing_proto.on_message(model=CollectedDataV2, replies={})
+async def handle_collected_data_v2(ctx: Context, sender: str, msg: CollectedDataV2):
+    await assess_collected_data(ctx, sender, msg)
+
+
+async def assess_collected_data(ctx: Context, sender: str, msg):
+    with request_context(msg.correlation_id or None, kind="assessment"):
+        ctx.logger.info(f"Received collected data from Data Collection Agent")
+        with stage("decode"):
+            collected_data = decode_collected_data(msg)
+        if "error" in collected_data:
+            ctx.logger.error(f"Data collection failed: {collected_data['error']}")
+            return
+        label = location_label(collected_data, msg.correlation_id)
+
+        # Extract country code from the collected data
+        country_code = collected_data.get("country_code", None)
+        if not country_code:
+            ctx.logger.error("Country code is missing in the collected data.")
+            # Still compared on the site's own data
+            scorer.add(label, "", location_metrics(collected_data, None))
+            scorer.flush()
+            return
+
+        # Perform economic impact assessment
+        with stage("economic_data"):
+            economic_data = await get_economic_educational_data(country_code)
+        if economic_data:
+            gdp, gdp_year, gdp_country = economic_data.get('GDP')
+            poverty_rate, poverty_year = economic_data.get('poverty_rate')
+            education_expense = economic_data.get("educational_expenditure")
+
+            # Generate a detailed analysis, reusing the stored one if nothing has changed. Run in a
+            # worker thread: a throttled Azure call backs off with blocking sleeps between retries.
+            with stage("analysis"):
+                analysis = await asyncio.to_thread(
+                    memoized_analysis, collected_data, gdp, gdp_year, poverty_rate, poverty_year, education_expense, gdp_country
+                )
+            ctx.logger.info(f"Analysis memo: {memo_stats()}")
+
+            output_filename = analysis_path(label)
+            with open(output_filename, 'w') as json_file:
+                json.dump(analysis, json_file, indent=4)
+            logger.info(f"Impact analysis saved to {output_filename}")
+
+            with stage("scoring"):
+                scorer.add(label, country_code, location_metrics(collected_data, economic_data))
+                scorer.flush()
+
+            #Send the economic impact response back
+            await ctx.send(
+                sender,
+                EconomicImpactResponse(gdp=gdp, poverty_rate=poverty_rate, educational_expense=education_expense,
+                                       analysis=analysis)
+            )
+
+
+# Function to retrieve economic data from the World Bank and OECD APIs
+async def get_economic_educational_data(country_code):
+    return await country_economics.get(country_code)
+
+
+def location_label(collected_data, correlation_id=""):
+    # The city name, else the coordinates, else the request ID
+    location = collected_data.get("location") or {}
+    if location.get("city"):
+        return location["city"]
+    if location.get("lat") is not None:
+        return f"{location['lat']},{location['lon']}"
+    return correlation_id or "unknown"
+
+
+def analysis_path(label):
+    # One analysis file per location; characters that don't belong in file names become "_"
+    name = re.sub(r"[^\w.,-]+", "_", label)
+    return os.path.join(IMPACT_OUTPUT_DIR, f"impact_analysis_{name}.json")
+
+
+# Writes the scores table once results stop arriving, since writes are spaced out while they do
+@impact_assessment_agent.on_interval(period=SCORE_FLUSH_INTERVAL)
+async def flush_scores(ctx: Context):
+    scorer.flush(force=True)
 
 
 # Include protocol in the agent
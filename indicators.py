@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+from xml.etree.ElementTree import ParseError
+
+import aiohttp
+
+from cache import get_cache
+from metrics import record_call
+from sdmx import fetch_sdmx_table
+
+logger = logging.getLogger(__name__)
+
+WORLD_BANK_URL = "https://api.worldbank.org/v2/country"
+OECD_EXPENDITURE_URL = "https://sdmx.oecd.org/public/rest/data/OECD.EDU.IMEP,DSD_EAG_UOE_FIN@DF_UOE_FIN_INDIC_SOURCE_NATURE,3.0"
+
+GDP_INDICATOR = "NY.GDP.MKTP.CD"  # GDP in current USD
+POVERTY_INDICATOR = "SI.POV.DDAY"  # Poverty headcount ratio at $2.15 a day (2017 PPP) (% of population)
+INDICATORS = [GDP_INDICATOR, POVERTY_INDICATOR]
+
+# Multi-indicator queries need an explicit source; 2 is World Development Indicators
+WORLD_BANK_SOURCE = 2
+WORLD_BANK_PER_PAGE = 1000
+FIRST_YEAR = 2000
+LATEST_YEAR = 2021  # most recent value in or before this year
+EXPENDITURE_YEAR = 2021
+# Series key after the country: total direct government expenditure on educational institutions
+EXPENDITURE_SERIES = "EXP._T.S13.INST_EDU.DIR_EXP.V.XDC.SOURCE"
+
+MAX_CONNECTIONS = 16
+REQUEST_TIMEOUT = 60  # seconds
+
+
+def latest_values(records, latest_year=LATEST_YEAR):
+    """
+    Picks the most recent non-null value per (country, indicator) from World Bank records.
+
+    Returns:
+    - dict of (country code, indicator) -> (value, year, iso3, country name), with every
+      entry reachable by both the ISO2 and the ISO3 country code
+    """
+    latest = {}
+    for record in records:
+        if record.get("value") is None or not record.get("date") or int(record["date"]) > latest_year:
+            continue
+        key = (record["country"]["id"], record["indicator"]["id"])
+        if key not in latest or int(record["date"]) > int(latest[key][1]):
+            latest[key] = (record["value"], record["date"], record["countryiso3code"], record["country"]["value"])
+
+    for (iso2, indicator), value in list(latest.items()):
+        latest[(value[2], indicator)] = value
+    return latest
+
+
+class IndicatorService:
+    """
+    Fetches World Bank and OECD indicators for many countries at once over one pooled
+    aiohttp session, with results kept in the shared cache.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._session = None
+
+    async def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def _world_bank_page(self, url, params, page):
+        session = await self.session()
+        async with session.get(url, params=dict(params, page=page)) as response:
+            body = await response.read()
+            record_call("worldbank", len(body), response.status)
+            response.raise_for_status()
+            # The World Bank API answers with text/html content type on some errors
+            data = json.loads(body)
+            if data and isinstance(data[0], dict) and "message" in data[0]:
+                # Errors come back as 200 with [{"message": [...]}] in place of the page header
+                raise ValueError(f"World Bank error: {data[0]['message']}")
+            return data
+
+    async def fetch_world_bank(self, countries, indicators=INDICATORS):
+        """
+        Fetches every indicator for every country with one paginated multi-country,
+        multi-indicator query. Pages after the first are fetched concurrently.
+
+        Returns:
+        - list of World Bank observation records
+
+        Raises:
+        - aiohttp.ClientError, asyncio.TimeoutError or ValueError if a page could not be read
+        """
+        url = f"{WORLD_BANK_URL}/{';'.join(countries)}/indicator/{';'.join(indicators)}"
+        params = {
+            "format": "json",
+            "source": WORLD_BANK_SOURCE,
+            "per_page": WORLD_BANK_PER_PAGE,
+            "date": f"{FIRST_YEAR}:{LATEST_YEAR}",
+        }
+        first = await self._world_bank_page(url, params, 1)
+        if len(first) < 2 or first[1] is None:
+            logger.error(f"World Bank query for {countries} returned no data: {first}")
+            return []
+
+        records = list(first[1])
+        pages = int(first[0].get("pages", 1))
+        if pages > 1:
+            rest = await asyncio.gather(*(self._world_bank_page(url, params, page) for page in range(2, pages + 1)))
+            for data in rest:
+                records.extend(data[1] or [])
+        return records
+
+    async def fetch_expenditure(self, iso3_codes=None, start_year=EXPENDITURE_YEAR, end_year=EXPENDITURE_YEAR):
+        """
+        Streams expenditure observations for many countries and years from one OECD request.
+        With no countries given the whole data set is downloaded; otherwise the download stops
+        as soon as every requested country has a value for end_year.
+
+        Returns:
+        - SdmxTable with REF_AREA, ..., TIME_PERIOD keys, or None if the request failed
+        """
+        countries = "+".join(iso3_codes or [])
+        url = f"{OECD_EXPENDITURE_URL}/{countries}.{EXPENDITURE_SERIES}"
+        wanted = {(iso3, str(end_year)) for iso3 in iso3_codes} if iso3_codes else None
+        session = await self.session()
+        table = await fetch_sdmx_table(session, url, {"startPeriod": start_year, "endPeriod": end_year}, wanted)
+        if table is None:
+            logger.info(f"OECD request for {countries or 'all countries'} failed")
+        return table
+
+    def cache_expenditure(self, table):
+        """
+        Caches every (country, year) observation in a table, so one download serves later
+        requests for any of the countries it covered.
+
+        Returns:
+        - dict of (iso3, year) -> value
+        """
+        values = {(iso3, int(year)): value for (iso3, year), value in table.lookup("REF_AREA", "TIME_PERIOD").items()}
+        for (iso3, year), value in values.items():
+            get_cache().set("oecd", {"country": iso3, "year": year}, value)
+        return values
+
+    async def warm_expenditure(self, iso3_codes=None, start_year=FIRST_YEAR, end_year=EXPENDITURE_YEAR):
+        # One download for every country and year, so later lookups never leave the cache
+        table = await self.fetch_expenditure(iso3_codes, start_year, end_year)
+        return len(self.cache_expenditure(table)) if table is not None else 0
+
+    async def world_bank_values(self, countries):
+        """
+        Latest GDP and poverty values per country, from the cache where possible. If the
+        query fails, the missing countries get no values and nothing is cached for them.
+
+        Returns:
+        - dict of country -> {indicator: (value, year, iso3, country name)}
+        """
+        results = {country: {} for country in countries}
+        missing = set()
+        for country in countries:
+            for indicator in INDICATORS:
+                cached = get_cache().get("worldbank", {"country": country, "indicator": indicator})
+                if cached is None:
+                    missing.add(country)
+                else:
+                    results[country][indicator] = tuple(cached)
+
+        if missing:
+            try:
+                results.update(await self.refresh_world_bank(sorted(missing)))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.error(f"World Bank request for {sorted(missing)} failed: {e!r}")
+                for country in missing:
+                    results[country] = dict.fromkeys(INDICATORS, (None, None, None, None))
+        return results
+
+    async def refresh_world_bank(self, countries):
+        """
+        Fetches the latest GDP and poverty values for the countries and replaces their cache
+        entries. Nothing is cached if the query fails.
+
+        Returns:
+        - dict of country -> {indicator: (value, year, iso3, country name)}
+        """
+        latest = latest_values(await self.fetch_world_bank(countries))
+        results = {}
+        for country in countries:
+            results[country] = {}
+            for indicator in INDICATORS:
+                value = latest.get((country.upper(), indicator), (None, None, None, None))
+                # "No value" is cached as well, since the query covered every page
+                get_cache().set("worldbank", {"country": country, "indicator": indicator}, value)
+                results[country][indicator] = value
+        return results
+
+    async def expenditure_values(self, iso3_codes):
+        results = {}
+        missing = []
+        for iso3 in iso3_codes:
+            cached = get_cache().get("oecd", {"country": iso3, "year": EXPENDITURE_YEAR})
+            if cached is None:
+                missing.append(iso3)
+            else:
+                results[iso3] = cached
+
+        if missing:
+            try:
+                table = await self.fetch_expenditure(missing)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ParseError) as e:
+                # ParseError: a truncated download or an HTML error page in place of SDMX-ML
+                logger.error(f"OECD request for {missing} failed: {e!r}")
+                table = None
+            values = self.cache_expenditure(table) if table is not None else {}
+            for iso3 in missing:
+                results[iso3] = values.get((iso3, EXPENDITURE_YEAR))
+                if results[iso3] is None:
+                    logger.info(f"Expenditure value not found for {iso3}")
+        return results
+
+    async def economic_data(self, countries):
+        """
+        GDP, poverty rate and educational expenditure for many countries in one round.
+        OECD lookups need ISO3 codes; when every code is already known from the cache they
+        run alongside the World Bank query, otherwise right after it.
+
+        Returns:
+        - dict of country -> {"GDP": (value, year, name), "poverty_rate": (value, year),
+          "educational_expenditure": value}
+        """
+        known_iso3 = {}
+        for country in countries:
+            cached = get_cache().get("worldbank", {"country": country, "indicator": GDP_INDICATOR})
+            if cached is not None and cached[2]:
+                known_iso3[country] = cached[2]
+
+        if len(known_iso3) == len(countries):
+            world_bank, expenditure = await asyncio.gather(
+                self.world_bank_values(countries), self.expenditure_values(sorted(set(known_iso3.values())))
+            )
+        else:
+            world_bank = await self.world_bank_values(countries)
+            iso3_codes = {country: values[GDP_INDICATOR][2] for country, values in world_bank.items()}
+            expenditure = await self.expenditure_values(sorted({code for code in iso3_codes.values() if code}))
+            known_iso3.update(iso3_codes)
+
+        results = {}
+        for country in countries:
+            gdp_value, gdp_year, _, gdp_country = world_bank[country][GDP_INDICATOR]
+            poverty_value, poverty_year, _, _ = world_bank[country][POVERTY_INDICATOR]
+            results[country] = {
+                "GDP": (gdp_value, gdp_year, gdp_country),
+                "poverty_rate": (poverty_value, poverty_year),
+                "educational_expenditure": expenditure.get(known_iso3.get(country)),
+            }
+        return results
@@ -0,0 +1,171 @@
+import asyncio
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Jobs run at the same time, and jobs allowed to wait for a slot before submissions are refused
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "32"))
+# Parent of the per-job scratch directories. Keep it on the same filesystem as the output
+# files so finished files can be moved into place with an atomic rename.
+JOB_SCRATCH_DIR = os.getenv("JOB_SCRATCH_DIR", "scratch")
+# Assumed job duration until one has finished, used for the retry hint in busy replies
+DEFAULT_JOB_SECONDS = 30.0
+
+
+class QueueFull(Exception):
+    """
+    Raised by JobQueue.submit when every slot is busy and the queue is at its depth limit.
+    """
+
+    def __init__(self, queued, retry_after):
+        super().__init__(f"Job queue is full ({queued} jobs waiting)")
+        self.queued = queued
+        self.retry_after = retry_after
+
+
+class JobCancelled(Exception):
+    """
+    Set as a job's result when the job's task is cancelled before it finishes, e.g. when the
+    agent shuts down, so requesters get an error instead of waiting forever.
+    """
+
+    def __init__(self, job):
+        super().__init__(f"Job {job.id} was cancelled")
+
+
+class Job:
+    def __init__(self, job_id, key, payload):
+        self.id = job_id
+        self.key = key
+        self.payload = payload
+        # Requests merged into this job, including the one that created it
+        self.requesters = 1
+        self.submitted = time.monotonic()
+        # Private directory for intermediate files, created when the job starts
+        self.scratch_dir = None
+        self.future = asyncio.get_running_loop().create_future()
+
+    async def result(self):
+        # shield() so one requester being cancelled does not cancel the job for the others
+        return await asyncio.shield(self.future)
+
+
+class JobQueue:
+    """
+    Runs `run(job)` for submitted jobs, at most `concurrency` at a time. Submitting a key
+    that is already queued or running joins that job instead of starting another one,
+    and every requester awaits the same result. Once `concurrency + max_queued` jobs are
+    in flight, new keys are refused with QueueFull.
+    """
+
+    def __init__(self, run, concurrency=JOB_CONCURRENCY, max_queued=JOB_QUEUE_DEPTH, scratch_dir=JOB_SCRATCH_DIR, name="jobs"):
+        self.run = run
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.scratch_dir = scratch_dir
+        self.name = name
+        # Jobs queued or running, by key
+        self.jobs = {}
+        self.running = 0
+        self.average_seconds = None
+        self._ids = itertools.count(1)
+        self._slots = None
+        self._tasks = set()
+
+    @property
+    def queued(self):
+        return len(self.jobs) - self.running
+
+    def retry_after(self):
+        # Rough time until a slot frees up for a job submitted now
+        average = self.average_seconds or DEFAULT_JOB_SECONDS
+        return round(average * (self.queued // max(self.concurrency, 1) + 1), 1)
+
+    def submit(self, key, payload):
+        """
+        Parameters:
+        - key: hashable, requests with equal keys share one job
+        - payload: passed to `run` as job.payload; ignored when joining an existing job
+
+        Returns:
+        - (job, coalesced): the job to await, and whether it was already in flight
+        """
+        job = self.jobs.get(key)
+        if job is not None:
+            job.requesters += 1
+            registry.inc("jobs_coalesced_total", queue=self.name)
+            return job, True
+
+        if len(self.jobs) >= self.concurrency + self.max_queued:
+            registry.inc("jobs_rejected_total", queue=self.name)
+            raise QueueFull(self.queued, self.retry_after())
+
+        if self._slots is None:
+            # Created on first use so it binds to the agent's running event loop
+            self._slots = asyncio.Semaphore(self.concurrency)
+        job = Job(next(self._ids), key, payload)
+        self.jobs[key] = job
+        registry.inc("jobs_submitted_total", queue=self.name)
+        task = asyncio.create_task(self._execute(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job, False
+
+    async def _execute(self, job):
+        try:
+            async with self._slots:
+                self.running += 1
+                started = time.monotonic()
+                registry.observe("job_wait_seconds", started - job.submitted, queue=self.name)
+                try:
+                    os.makedirs(self.scratch_dir, exist_ok=True)
+                    job.scratch_dir = tempfile.mkdtemp(prefix=f"{self.name}_{job.id}_", dir=self.scratch_dir)
+                    result = await self.run(job)
+                finally:
+                    elapsed = time.monotonic() - started
+                    self.average_seconds = elapsed if self.average_seconds is None else 0.8 * self.average_seconds + 0.2 * elapsed
+                    self.running -= 1
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.key}) failed: {e!r}")
+            job.future.set_exception(e)
+            # Mark the exception as retrieved in case every requester has gone away
+            job.future.exception()
+        else:
+            job.future.set_result(result)
+        finally:
+            if not job.future.done():
+                # Cancelled while waiting for a slot or running; the CancelledError still propagates
+                logger.warning(f"Job {job.id} ({job.key}) was cancelled")
+                job.future.set_exception(JobCancelled(job))
+                job.future.exception()
+            # Later requests for the same key start a fresh job
+            del self.jobs[job.key]
+            if job.scratch_dir:
+                shutil.rmtree(job.scratch_dir, ignore_errors=True)
+            if job.requesters > 1:
+                logger.info(f"Job {job.id} served {job.requesters} requests")
+
+    def stats(self):
+        return {"running": self.running, "queued": self.queued, "concurrency": self.concurrency, "max_queued": self.max_queued}
+
+
+def replace_file(scratch_dir, path, write):
+    """
+    Writes a file inside a job's scratch directory, then renames it over `path`, so
+    readers and concurrent jobs never see a partially written file.
+
+    Parameters:
+    - write: callable taking the open text file
+    """
+    tmp_path = os.path.join(scratch_dir, os.path.basename(path))
+    with open(tmp_path, "w") as tmp_file:
+        write(tmp_file)
+    os.replace(tmp_path, path)
@@ -0,0 +1,187 @@
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+
+from metrics import record_call, record_retry
+
+logger = logging.getLogger(__name__)
+
+# "azure" for Azure Text Analytics, "local" for the offline RAKE extractor
+KEY_PHRASE_BACKEND = os.getenv("KEY_PHRASE_BACKEND", "azure")
+AZURE_BATCH_SIZE = 10  # documents per extract_key_phrases call, the service limit
+MAX_KEY_PHRASES = 20
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers him his how i if in into is it its itself just me more most my no nor not
+now of off on once only or other our out over own same she should so some such than that the their
+them then there these they this those through to too under until up very was we were what when where
+which while who whom why will with would you your
+k mm usd cm n/a
+""".split())
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9'-]*")
+# Phrases never span punctuation or standalone numbers (codes like PHH2O stay words)
+BOUNDARY_PATTERN = re.compile(r"[.,;:!?()\[\]{}\"/*\n]|(?<![A-Za-z0-9])[-+]?\d[\d.,:%-]*")
+
+
+class KeyPhraseBackend:
+    """
+    Extracts key phrases from summary texts. Backends take a list of documents so callers
+    can hand over everything they have at once.
+    """
+
+    name = "base"
+
+    def extract(self, documents):
+        """
+        Returns:
+        - list of key phrase lists, one per document in input order
+        """
+        raise NotImplementedError
+
+
+class AzureKeyPhraseBackend(KeyPhraseBackend):
+    """
+    Azure Text Analytics key phrases, sending documents in groups of up to `batch_size`
+    so a batch of N summaries costs ceil(N / batch_size) calls instead of N.
+    """
+
+    name = "azure"
+
+    def __init__(self, client=None, batch_size=AZURE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from azure.ai.textanalytics import TextAnalyticsClient
+            from azure.core.credentials import AzureKeyCredential
+
+            endpoint = os.getenv("AZURE_LANGUAGE_ENDPOINT")
+            key = os.getenv("AZURE_LANGUAGE_KEY")
+            self._client = TextAnalyticsClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+        return self._client
+
+    def extract(self, documents):
+        results = []
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            response = self._extract_batch(batch)
+            for document in response:
+                if document.is_error:
+                    logger.error(f"Key phrase extraction failed: {document.error}")
+                    results.append([])
+                else:
+                    results.append(list(document.key_phrases))
+        return results
+
+    def _extract_batch(self, batch):
+        # Retries throttled and failing calls with the same jittered backoff as fetch_json.
+        # Imported here since weather_fetch loads aiohttp, which the local backend never needs.
+        from weather_fetch import MAX_RETRIES, RETRY_STATUSES, backoff_delay
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self.client.extract_key_phrases(batch)
+                record_call("azure_text_analytics", sum(len(document.encode("utf-8")) for document in batch))
+                return response
+            except Exception as e:
+                # Azure SDK errors: HttpResponseError carries the status code, while
+                # ServiceRequestError and ServiceResponseError are connection failures
+                status = getattr(e, "status_code", None)
+                connection_error = type(e).__name__ in ("ServiceRequestError", "ServiceResponseError")
+                record_call("azure_text_analytics", status=status or type(e).__name__)
+                if attempt == MAX_RETRIES or not (status in RETRY_STATUSES or connection_error):
+                    raise
+                response = getattr(e, "response", None)
+                retry_after = response.headers.get("Retry-After") if response is not None else None
+                logger.warning(f"Key phrase extraction raised {e!r} (attempt {attempt + 1})")
+            record_retry("azure_text_analytics")
+            time.sleep(backoff_delay(attempt, retry_after))
+
+
+class RakeKeyPhraseBackend(KeyPhraseBackend):
+    """
+    Local, CPU-only key phrases using RAKE: candidate phrases are the runs of words between
+    stopwords, punctuation and numbers, and each phrase scores the sum of its words'
+    degree / frequency ratios.
+    """
+
+    name = "local"
+
+    def __init__(self, max_phrases=MAX_KEY_PHRASES, max_words=4):
+        self.max_phrases = max_phrases
+        self.max_words = max_words
+
+    def candidates(self, text):
+        phrases = []
+        for fragment in BOUNDARY_PATTERN.split(text):
+            current = []
+            for word in WORD_PATTERN.findall(fragment):
+                lower = word.lower()
+                if lower in STOPWORDS:
+                    if current:
+                        phrases.append(current)
+                    current = []
+                else:
+                    current.append(word)
+            if current:
+                phrases.append(current)
+        return [phrase for phrase in phrases if len(phrase) <= self.max_words]
+
+    def extract_one(self, text):
+        phrases = self.candidates(text)
+        frequency = defaultdict(int)
+        degree = defaultdict(int)
+        for phrase in phrases:
+            for word in phrase:
+                frequency[word.lower()] += 1
+                degree[word.lower()] += len(phrase)
+
+        scores = {}
+        seen = set()
+        for phrase in phrases:
+            key = " ".join(phrase)
+            if key.lower() not in seen:
+                seen.add(key.lower())
+                scores[key] = sum(degree[word.lower()] / frequency[word.lower()] for word in phrase)
+        # Ties keep the order the phrases appear in the text
+        ranked = sorted(scores, key=lambda key: -scores[key])
+        return ranked[:self.max_phrases]
+
+    def extract(self, documents):
+        return [self.extract_one(document) for document in documents]
+
+
+BACKENDS = {
+    AzureKeyPhraseBackend.name: AzureKeyPhraseBackend,
+    RakeKeyPhraseBackend.name: RakeKeyPhraseBackend,
+}
+
+_backend = None
+
+
+def get_key_phrase_backend(name=None):
+    """
+    Returns the backend selected by `name` or KEY_PHRASE_BACKEND, shared across calls
+    when the configured default is used.
+    """
+    global _backend
+    if name is not None:
+        return BACKENDS[name]()
+    if _backend is None:
+        if KEY_PHRASE_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown KEY_PHRASE_BACKEND {KEY_PHRASE_BACKEND!r}, expected one of {sorted(BACKENDS)}")
+        _backend = BACKENDS[KEY_PHRASE_BACKEND]()
+        logger.info(f"Using the {_backend.name} key phrase backend")
+    return _backend
+
+
+def set_key_phrase_backend(backend):
+    # Replaces the shared backend, e.g. with an Azure backend built around a custom client
+    global _backend
+    _backend = backend
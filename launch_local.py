@@ -0,0 +1,80 @@
+"""
+Runs a coordinator and a pool of data collection workers as separate local processes,
+optionally with the impact assessment agent pointed at the coordinator.
+
+Each worker gets its own seed, agent port and metrics port; they share the cache and the
+weather store on disk. Stop everything with Ctrl+C.
+
+    python launch_local.py --workers 4
+    python launch_local.py --workers 2 --with-impact
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from uagents.crypto import Identity
+
+
+def address_for(seed):
+    # The address an Agent created with this seed will have
+    return Identity.from_seed(seed, 0).address
+
+
+def spawn(script, env, processes):
+    process = subprocess.Popen([sys.executable, script], env=dict(os.environ, **env))
+    processes.append(process)
+    return process
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-port", type=int, default=8010, help="agent port of the first worker")
+    parser.add_argument("--metrics-port", type=int, default=9110, help="metrics port of the first worker; 0 turns them off")
+    parser.add_argument("--coordinator-port", type=int, default=8000)
+    parser.add_argument("--seed-prefix", default="data_collection_worker")
+    parser.add_argument("--with-impact", action="store_true", help="also run impact_assessment.py against the coordinator")
+    args = parser.parse_args()
+
+    coordinator_seed = f"{args.seed_prefix}_coordinator"
+    coordinator_address = address_for(coordinator_seed)
+    processes = []
+    worker_addresses = []
+    for i in range(args.workers):
+        seed = f"{args.seed_prefix}_{i}"
+        worker_addresses.append(address_for(seed))
+        spawn("data_collection.py", {
+            "DATA_COLLECTION_SEED": seed,
+            "DATA_COLLECTION_PORT": str(args.worker_port + i),
+            "DATA_COLLECTION_METRICS_PORT": str(args.metrics_port + i if args.metrics_port else 0),
+        }, processes)
+        print(f"worker {i}: {worker_addresses[-1]} on port {args.worker_port + i}")
+
+    spawn("coordinator.py", {
+        "COORDINATOR_SEED": coordinator_seed,
+        "COORDINATOR_PORT": str(args.coordinator_port),
+        "COORDINATOR_WORKERS": ",".join(worker_addresses),
+    }, processes)
+    print(f"coordinator: {coordinator_address} on port {args.coordinator_port}")
+
+    if args.with_impact:
+        spawn("impact_assessment.py", {"DATA_COLLECTION_AGENT_ADDRESS": coordinator_address}, processes)
+
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+        print("A process exited; stopping the rest")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
@@ -0,0 +1,261 @@
+import contextvars
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "fetch_"
+# Upper bounds in seconds for the latency histograms; the last bucket catches everything
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, math.inf]
+
+# The request being handled. Context variables are copied into tasks and worker threads,
+# so stages running under gather() or asyncio.to_thread() still report to their request.
+correlation_id = contextvars.ContextVar("correlation_id", default="")
+_request_record = contextvars.ContextVar("request_record", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """
+    Process-wide counters and histograms, keyed by metric name and label values.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """
+        Returns:
+        - dict with "counters" and "histograms" lists, ready for json.dumps
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "buckets": {("+Inf" if bound == math.inf else str(bound)): total for bound, total in histogram.cumulative()},
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus_text(self):
+        # Prometheus text exposition format, version 0.0.4
+        lines = []
+        snapshot = self.snapshot()
+        typed = set()
+        for counter in snapshot["counters"]:
+            name = METRIC_PREFIX + counter["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_labels(counter['labels'])} {counter['value']}")
+        for histogram in snapshot["histograms"]:
+            name = METRIC_PREFIX + histogram["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, total in histogram["buckets"].items():
+                lines.append(f"{name}_bucket{_labels(dict(histogram['labels'], le=bound))} {total}")
+            lines.append(f"{name}_sum{_labels(histogram['labels'])} {histogram['sum']}")
+            lines.append(f"{name}_count{_labels(histogram['labels'])} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+registry = Registry()
+
+
+def new_correlation_id():
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def request_context(request_id=None, kind="request"):
+    """
+    Marks the start of one request: sets its correlation ID and collects the stages, calls,
+    bytes, retries and cache lookups recorded while it runs. The total duration is
+    recorded under the stage `kind`, and the finished record is logged.
+
+    Yields:
+    - record: dict, the per-request record, which is filled in as the request proceeds
+    """
+    record = {
+        "correlation_id": request_id or new_correlation_id(),
+        "stages": {},
+        "calls": {},
+        "bytes": {},
+        "retries": {},
+        "cache": {},
+    }
+    id_token = correlation_id.set(record["correlation_id"])
+    record_token = _request_record.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - started
+        record["stages"][kind] = round(elapsed, 6)
+        registry.observe("stage_duration_seconds", elapsed, stage=kind)
+        logger.info(f"Metrics for {kind} {record['correlation_id']}: {json.dumps(record)}")
+        _request_record.reset(record_token)
+        correlation_id.reset(id_token)
+
+
+def _add(section, key, value):
+    record = _request_record.get()
+    if record is not None:
+        record[section][key] = record[section].get(key, 0) + value
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a pipeline stage into the stage_duration_seconds histogram and the current
+    request's record. Works around awaits as well as blocking code.
+    """
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe("stage_duration_seconds", elapsed, stage=name)
+        if outcome == "error":
+            registry.inc("stage_errors_total", stage=name)
+        record = _request_record.get()
+        if record is not None:
+            record["stages"][name] = round(record["stages"].get(name, 0) + elapsed, 6)
+
+
+async def timed_stage(name, awaitable):
+    # stage() for an awaitable that is handed to gather() rather than awaited inline
+    with stage(name):
+        return await awaitable
+
+
+def record_call(source, nbytes=0, status=None):
+    # One outbound call (HTTP request, Earth Engine getInfo, ...) and the bytes it returned
+    registry.inc("outbound_calls_total", source=source, status=str(status) if status is not None else "")
+    _add("calls", source, 1)
+    if nbytes:
+        registry.inc("outbound_bytes_total", nbytes, source=source)
+        _add("bytes", source, nbytes)
+
+
+def record_retry(source):
+    registry.inc("outbound_retries_total", source=source)
+    _add("retries", source, 1)
+
+
+def record_cache(source, hit):
+    registry.inc("cache_lookups_total", source=source, result="hit" if hit else "miss")
+    record = _request_record.get()
+    if record is not None:
+        counts = record["cache"].setdefault(source, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path in ("/metrics", "/"):
+            body = registry.prometheus_text().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps(registry.snapshot(), indent=2).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Serves /metrics (Prometheus text) and /metrics.json from a daemon thread.
+    A port of 0 or None leaves the endpoint off.
+
+    Returns:
+    - the ThreadingHTTPServer, or None
+    """
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,433 @@
+import logging
+import os
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import requests
+
+from metrics import record_call
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_TIMEOUT = 120  # seconds
+
+# "reduce" computes the statistics inside Earth Engine; "raster" downloads the GeoTIFF and computes them locally;
+# "series" reduces a cloud-masked composite per NDVI_INTERVAL_MONTHS over a multi-year range
+NDVI_MODE = os.getenv("NDVI_MODE", "reduce")
+NDVI_BUFFER_METERS = float(os.getenv("NDVI_BUFFER_METERS", "500"))
+NDVI_SCALE = 30  # metres, Sentinel-2 red/NIR bands resampled as before
+NDVI_PERCENTILES = [10, 25, 50, 75, 90]
+# Features per reduceRegions call; keeps each batched request well inside Earth Engine's limits
+NDVI_BATCH_SIZE = 500
+# Length of each composite in the "series" mode, in months
+NDVI_INTERVAL_MONTHS = int(os.getenv("NDVI_INTERVAL_MONTHS", "1"))
+# Scenes this cloudy are skipped before pixel-level masking; the mask handles the rest
+NDVI_SERIES_MAX_CLOUD = 60
+# Sentinel-2 QA60 bits for opaque clouds and cirrus
+QA60_CLOUD_BITS = (1 << 10) | (1 << 11)
+# Periods whose NDVI departs from their seasonal mean by more than this many standard deviations,
+# and by at least NDVI_ANOMALY_MIN, so noise in a very regular series is not reported
+NDVI_ANOMALY_Z = 2.0
+NDVI_ANOMALY_MIN = 0.05
+
+# Earth Engine credentials: a service account JSON key file, and optionally the account's email
+# (read from the key when empty). Without a key, the credentials stored by `earthengine authenticate` are used.
+EE_SERVICE_ACCOUNT_KEY = os.getenv("EE_SERVICE_ACCOUNT_KEY", "")
+EE_SERVICE_ACCOUNT = os.getenv("EE_SERVICE_ACCOUNT", "")
+EE_PROJECT = os.getenv("EE_PROJECT") or None
+
+_ee = None
+_ee_lock = threading.Lock()
+
+
+def earth_engine():
+    """
+    Imports and initializes the Earth Engine client the first time an NDVI stage needs it.
+    Stages run in worker threads, so initialization is guarded by a lock.
+
+    Returns:
+    - the initialized `ee` module
+    """
+    global _ee
+    with _ee_lock:
+        if _ee is None:
+            import ee
+
+            if EE_SERVICE_ACCOUNT_KEY:
+                credentials = ee.ServiceAccountCredentials(EE_SERVICE_ACCOUNT or None, EE_SERVICE_ACCOUNT_KEY)
+                ee.Initialize(credentials, project=EE_PROJECT)
+            else:
+                ee.Initialize(project=EE_PROJECT)
+            logger.info("Earth Engine initialized")
+            _ee = ee
+    return _ee
+
+
+def ndvi_composite(ee, region, start_date, end_date):
+    """
+    Builds the median NDVI composite of low-cloud Sentinel-2 scenes over a region.
+
+    Parameters:
+    - ee: the Earth Engine module (or a fake with the same surface)
+    - region: ee.Geometry used to select scenes
+    - start_date, end_date: str, date window in YYYY-MM-DD form
+
+    Returns:
+    - ee.Image with a single NDVI band
+    """
+    collection = ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED") \
+        .filterBounds(region) \
+        .filterDate(start_date, end_date) \
+        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
+
+    # Calculate NDVI
+    def calculate_ndvi(image):
+        ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
+        return image.addBands(ndvi)
+
+    collection = collection.map(calculate_ndvi)
+    return collection.median().select('NDVI')
+
+
+def mask_clouds(ee, image):
+    # Masks pixels flagged as opaque cloud or cirrus in the QA60 band
+    return image.updateMask(image.select('QA60').bitwiseAnd(QA60_CLOUD_BITS).eq(0))
+
+
+def series_periods(start_date, end_date, interval_months=NDVI_INTERVAL_MONTHS):
+    """
+    Splits a date range into consecutive periods of `interval_months`, starting at the
+    first day of the start date's month. The last period is cut off at end_date.
+
+    Returns:
+    - list of (start, end) YYYY-MM-DD pairs, end exclusive
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d").date().replace(day=1)
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    periods = []
+    while start < end:
+        month = start.month - 1 + interval_months
+        period_end = date(start.year + month // 12, month % 12 + 1, 1)
+        periods.append((start.isoformat(), min(period_end, end).isoformat()))
+        start = period_end
+    return periods
+
+
+def ndvi_series_image(ee, region, periods):
+    """
+    Stacks one cloud-masked median NDVI composite per period into a single multi-band
+    image, with bands named NDVI_0, NDVI_1, ..., so all periods reduce in one request.
+    Periods without clear scenes come out fully masked rather than missing.
+
+    Returns:
+    - ee.Image with one NDVI band per period
+    """
+    scenes = ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED") \
+        .filterBounds(region) \
+        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', NDVI_SERIES_MAX_CLOUD))
+    # Keeps the NDVI band present in periods with no scenes left after filtering
+    empty = ee.ImageCollection([ee.Image.constant(0).rename('NDVI').toFloat().updateMask(0)])
+
+    def calculate_ndvi(image):
+        return mask_clouds(ee, image).normalizedDifference(['B8', 'B4']).rename('NDVI')
+
+    series = None
+    for i, (start_date, end_date) in enumerate(periods):
+        composite = scenes.filterDate(start_date, end_date).map(calculate_ndvi).merge(empty).median().rename(f'NDVI_{i}')
+        series = composite if series is None else series.addBands(composite)
+    return series
+
+
+def reduce_ndvi_series(ee, lat, lon, start_date, end_date, interval_months=NDVI_INTERVAL_MONTHS,
+                       buffer_m=NDVI_BUFFER_METERS, scale=NDVI_SCALE):
+    """
+    Mean NDVI and clear-pixel count for every period in a date range around a point,
+    computed with a single reduceRegion call over the stacked period composites.
+
+    Returns:
+    - dict with "periods" (list of start dates), "mean" and "count" lists in the same order
+    """
+    periods = series_periods(start_date, end_date, interval_months)
+    region = ee.Geometry.Point([lon, lat]).buffer(buffer_m)
+    reducer = ee.Reducer.mean().combine(ee.Reducer.count(), sharedInputs=True)
+    properties = ndvi_series_image(ee, region, periods).reduceRegion(
+        reducer=reducer, geometry=region, scale=scale, maxPixels=1e9
+    ).getInfo() or {}
+    record_call("earthengine")
+    return {
+        "periods": [start for start, _ in periods],
+        "mean": [properties.get(f"NDVI_{i}_mean") for i in range(len(periods))],
+        "count": [properties.get(f"NDVI_{i}_count") or 0 for i in range(len(periods))],
+    }
+
+
+def summarize_ndvi_series(series):
+    """
+    Trend, seasonality and anomaly statistics for an NDVI time series.
+
+    - trend: least-squares slope in NDVI per year over the periods with data
+    - seasonality: mean NDVI per calendar month across years, with its peak, trough and amplitude
+    - anomalies: periods more than NDVI_ANOMALY_Z standard deviations (and NDVI_ANOMALY_MIN) from their month's mean
+
+    Parameters:
+    - series: dict from reduce_ndvi_series
+
+    Returns:
+    - ndvi_summary: dict with the per-period values and the statistics. It also has the
+      mean/max/min fields of the single-composite summary, taken over the periods.
+    """
+    ndvi = np.array([np.nan if value is None else value for value in series["mean"]], dtype="float64")
+    valid = np.isfinite(ndvi)
+    if not valid.any():
+        return {
+            "summary": "No NDVI data available for analysis."
+        }
+
+    starts = np.array(series["periods"], dtype="datetime64[D]")
+    months = starts.astype("datetime64[M]").astype(int) % 12
+    years = (starts - starts[0]).astype("float64") / 365.25
+
+    # Linear trend over the periods with data
+    slope = 0.0
+    if valid.sum() >= 2:
+        slope = float(np.polyfit(years[valid], ndvi[valid], 1)[0])
+    direction = "stable"
+    if slope > 0.02:
+        direction = "increasing"
+    elif slope < -0.02:
+        direction = "decreasing"
+
+    # Mean NDVI per calendar month, then each period's departure from its month
+    month_counts = np.bincount(months[valid], minlength=12)
+    month_sums = np.bincount(months[valid], weights=ndvi[valid], minlength=12)
+    with np.errstate(invalid="ignore"):
+        climatology = month_sums / month_counts
+    departures = ndvi - climatology[months]
+    spread = np.nanstd(departures)
+    z_scores = departures / spread if spread > 0 else np.zeros_like(departures)
+    anomalous = np.flatnonzero(
+        (np.abs(np.nan_to_num(z_scores)) > NDVI_ANOMALY_Z) & (np.abs(np.nan_to_num(departures)) >= NDVI_ANOMALY_MIN)
+    )
+
+    observed = np.flatnonzero(month_counts)
+    peak = observed[np.argmax(climatology[observed])]
+    trough = observed[np.argmin(climatology[observed])]
+    values = ndvi[valid]
+
+    return {
+        "periods": list(series["periods"]),
+        "ndvi": [round(float(value), 3) if np.isfinite(value) else None for value in ndvi],
+        "clear_pixels": [int(count) for count in series["count"]],
+        "mean_ndvi": round(float(values.mean()), 2),
+        "max_ndvi": round(float(values.max()), 2),
+        "min_ndvi": round(float(values.min()), 2),
+        "trend": {"direction": direction, "ndvi_per_year": round(slope, 4)},
+        "seasonality": {
+            # January first; None for months never observed
+            "monthly_mean": [round(float(value), 3) if np.isfinite(value) else None for value in climatology],
+            "peak_month": int(peak) + 1,
+            "trough_month": int(trough) + 1,
+            "amplitude": round(float(climatology[peak] - climatology[trough]), 3),
+        },
+        "anomalies": [
+            {"period": series["periods"][i], "ndvi": round(float(ndvi[i]), 3), "z_score": round(float(z_scores[i]), 2)}
+            for i in anomalous
+        ],
+        "periods_with_data": int(valid.sum()),
+    }
+
+
+def ndvi_reducer(ee):
+    # Mean, min/max, percentiles and valid-pixel count in a single pass over the pixels
+    return ee.Reducer.mean() \
+        .combine(ee.Reducer.minMax(), sharedInputs=True) \
+        .combine(ee.Reducer.percentile(NDVI_PERCENTILES), sharedInputs=True) \
+        .combine(ee.Reducer.count(), sharedInputs=True)
+
+
+def parse_ndvi_stats(properties, prefix=""):
+    # reduceRegion prefixes outputs with the band name ("NDVI_mean"), reduceRegions does not ("mean")
+    def value(name):
+        return properties.get(f"{prefix}{name}")
+
+    return {
+        "mean": value("mean"),
+        "min": value("min"),
+        "max": value("max"),
+        "count": value("count") or 0,
+        "percentiles": {f"p{p}": value(f"p{p}") for p in NDVI_PERCENTILES},
+    }
+
+
+def reduce_ndvi_stats(ee, ndvi_image, lat, lon, buffer_m=NDVI_BUFFER_METERS, scale=NDVI_SCALE):
+    """
+    Computes NDVI statistics for a buffer around a point inside Earth Engine, so only
+    a small JSON payload comes back instead of a raster.
+
+    Returns:
+    - stats: dict with mean, min, max, count and percentiles
+    """
+    region = ee.Geometry.Point([lon, lat]).buffer(buffer_m)
+    properties = ndvi_image.reduceRegion(
+        reducer=ndvi_reducer(ee), geometry=region, scale=scale, maxPixels=1e9
+    ).getInfo()
+    record_call("earthengine")
+    return parse_ndvi_stats(properties or {}, prefix="NDVI_")
+
+
+def reduce_ndvi_stats_batch(ee, ndvi_image, points, buffer_m=NDVI_BUFFER_METERS, scale=NDVI_SCALE):
+    """
+    Computes NDVI statistics for many points with reduceRegions over a FeatureCollection,
+    one getInfo call per NDVI_BATCH_SIZE points.
+
+    Parameters:
+    - points: list of (lat, lon) tuples
+
+    Returns:
+    - list of stats dicts in the same order as points
+    """
+    results = [None] * len(points)
+    for offset in range(0, len(points), NDVI_BATCH_SIZE):
+        chunk = points[offset:offset + NDVI_BATCH_SIZE]
+        features = [
+            ee.Feature(ee.Geometry.Point([lon, lat]).buffer(buffer_m), {"index": offset + i})
+            for i, (lat, lon) in enumerate(chunk)
+        ]
+        reduced = ndvi_image.reduceRegions(
+            collection=ee.FeatureCollection(features), reducer=ndvi_reducer(ee), scale=scale
+        ).getInfo()
+        record_call("earthengine")
+        for feature in reduced["features"]:
+            properties = feature["properties"]
+            results[properties["index"]] = parse_ndvi_stats(properties)
+    return results
+
+
+def download_ndvi_geotiff(ndvi_image, region, scale=30):
+    """
+    Downloads a single-band Earth Engine image as GeoTIFF bytes, without touching the disk.
+
+    Parameters:
+    - ndvi_image: ee.Image, the NDVI image to export
+    - region: ee.Geometry, the area to export
+    - scale: int, pixel size in metres
+
+    Returns:
+    - bytes of the GeoTIFF
+    """
+    url = ndvi_image.getDownloadURL({"scale": scale, "region": region, "format": "GEO_TIFF"})
+    record_call("earthengine")
+    response = requests.get(url, timeout=DOWNLOAD_TIMEOUT)
+    record_call("earthengine_download", len(response.content), response.status_code)
+    response.raise_for_status()
+    return response.content
+
+
+def read_ndvi_band(source):
+    """
+    Reads the first band of an NDVI GeoTIFF as floats.
+
+    Parameters:
+    - source: str path to a GeoTIFF, or the GeoTIFF bytes (read through an in-memory MemoryFile)
+
+    Returns:
+    - ndvi_data: numpy masked array; nodata, masked and NaN pixels are masked out
+    """
+    # rasterio/GDAL is slow to import and only the raster mode needs it
+    import rasterio
+    from rasterio.io import MemoryFile
+
+    if isinstance(source, (bytes, bytearray)):
+        with MemoryFile(source) as memfile:
+            with memfile.open() as dataset:
+                band = dataset.read(1, masked=True)
+    else:
+        with rasterio.open(source) as dataset:
+            band = dataset.read(1, masked=True)
+    return np.ma.masked_invalid(band.astype("float64"))
+
+
+def summarize_ndvi_stats(stats):
+    """
+    Turns NDVI statistics into the summary report shared by the raster and reduce paths.
+
+    Parameters:
+    - stats: dict with mean, min, max, count and percentiles of the valid NDVI values
+
+    Returns:
+    - ndvi_summary: dict, a summary report of NDVI observations.
+    """
+    if not stats["count"] or stats["mean"] is None:
+        return {
+            "summary": "No NDVI data available for analysis."
+        }
+
+    ndvi_mean = stats["mean"]
+    ndvi_max = stats["max"]
+    ndvi_min = stats["min"]
+
+    # Determine the general trend in the NDVI values
+    ndvi_trend = "stable"
+    if ndvi_max - ndvi_min > 0.5:
+        ndvi_trend = "fluctuating"
+    elif ndvi_mean > 0.4:
+        ndvi_trend = "consistently high"
+
+    key_events = []
+    if ndvi_max > 0.6:
+        key_events.append(f"High vegetation density observed (Max NDVI: {ndvi_max:.2f})")
+    if ndvi_min < -0.2:
+        key_events.append(f"Low vegetation density or possibly barren land observed (Min NDVI: {ndvi_min:.2f})")
+
+    # Create a structured summary report
+    ndvi_summary = {
+        "mean_ndvi": round(float(ndvi_mean), 2),
+        "max_ndvi": round(float(ndvi_max), 2),
+        "min_ndvi": round(float(ndvi_min), 2),
+        "valid_pixels": int(stats["count"]),
+        "percentiles": {
+            name: round(float(value), 2) for name, value in stats["percentiles"].items() if value is not None
+        },
+        "trend": ndvi_trend,
+        "key_events": key_events if key_events else "No significant events observed."
+    }
+
+    return ndvi_summary
+
+
+def analyze_ndvi_data(ndvi_data):
+    """
+    Analyzes the NDVI data and returns a structured dictionary with key observations.
+
+    Parameters:
+    - ndvi_data: ndarray or masked array of NDVI values (-1 to 1). 8-bit arrays are treated
+      as grayscale renderings (0 to 255) and rescaled, as produced by the old PNG path.
+
+    Returns:
+    - ndvi_summary: dict, a summary report of NDVI observations.
+    """
+    if ndvi_data is None or ndvi_data.size == 0:
+        return {
+            "summary": "No NDVI data available for analysis."
+        }
+
+    # Only pixels that are not masked as nodata take part in the statistics
+    ndvi_values = np.ma.masked_invalid(ndvi_data).compressed()
+    if ndvi_values.size == 0:
+        return {
+            "summary": "No NDVI data available for analysis."
+        }
+
+    if ndvi_values.dtype == np.uint8:
+        # Normalize NDVI values back from grayscale
+        ndvi_values = (ndvi_values / 255.0) * 2 - 1  # Rescaling grayscale values (0 to 255) to NDVI range (-1 to 1)
+
+    percentiles = np.percentile(ndvi_values, NDVI_PERCENTILES)
+    return summarize_ndvi_stats({
+        "mean": ndvi_values.mean(),
+        "min": ndvi_values.min(),
+        "max": ndvi_values.max(),
+        "count": ndvi_values.size,
+        "percentiles": {f"p{p}": value for p, value in zip(NDVI_PERCENTILES, percentiles)},
+    })
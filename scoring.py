@@ -0,0 +1,251 @@
+import asyncio
+import csv
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Comparative scores for every assessed location, one row each, best first
+IMPACT_SCORES_PATH = os.getenv("IMPACT_SCORES_PATH", "impact_scores.csv")
+# Least seconds between rewrites of the table while results keep arriving
+SCORE_FLUSH_INTERVAL = float(os.getenv("SCORE_FLUSH_INTERVAL", "5"))
+# How long one country's economic data is reused before it is looked up again
+ECONOMICS_REFRESH_SECONDS = 3600
+
+# Metrics ranked across locations: name -> (weight in the composite score, True if higher is better)
+SCORE_METRICS = {
+    "ndvi": (1.0, True),
+    "precipitation": (1.0, True),
+    "soil_organic_carbon": (1.0, True),
+    "gdp": (1.0, True),
+    "poverty_rate": (1.0, False),
+}
+# Numeric columns kept for every location; the scored metrics plus context
+NUMERIC_COLUMNS = ["lat", "lon", "ndvi", "precipitation", "temperature_avg", "soil_organic_carbon",
+                   "gdp", "poverty_rate", "educational_expense"]
+TEXT_COLUMNS = ["location", "country"]
+
+
+def percentile_ranks(values):
+    """
+    Mid-rank percentile (0-100) of each value among the finite values, so tied values share
+    a percentile and a lone value sits at 50. NaN stays NaN.
+    """
+    values = np.asarray(values, dtype="float64")
+    ranks = np.full(values.shape, np.nan)
+    valid = np.isfinite(values)
+    if valid.any():
+        ordered = np.sort(values[valid])
+        below = np.searchsorted(ordered, values[valid], side="left")
+        up_to = np.searchsorted(ordered, values[valid], side="right")
+        ranks[valid] = (below + up_to) / (2 * ordered.size) * 100
+    return ranks
+
+
+def location_metrics(collected_data, economics):
+    """
+    The values one location is compared on, taken from its collected data and its country's
+    economic data. Anything missing is NaN and left out of that metric's ranking.
+
+    Parameters:
+    - collected_data: dict, as decoded from CollectedData
+    - economics: dict from IndicatorService.economic_data for the location's country, or None
+
+    Returns:
+    - dict of NUMERIC_COLUMNS name -> float
+    """
+    metrics = dict.fromkeys(NUMERIC_COLUMNS, math.nan)
+    location = collected_data.get("location") or {}
+    metrics["lat"] = location.get("lat", math.nan)
+    metrics["lon"] = location.get("lon", math.nan)
+
+    ndvi_data = collected_data.get("ndvi_data")
+    if isinstance(ndvi_data, dict) and ndvi_data.get("mean_ndvi") is not None:
+        metrics["ndvi"] = ndvi_data["mean_ndvi"]
+
+    weather_data = collected_data.get("weather_data")
+    if weather_data is not None:
+        metrics["precipitation"] = weather_data["total_precipitation"]
+        metrics["temperature_avg"] = weather_data["temperature"]["average"]
+
+    # Soil organic carbon of the top layer, in dg/kg
+    for layer in (collected_data.get("soil_report") or {}).get("layers", []):
+        if layer["name"] == "soc":
+            metrics["soil_organic_carbon"] = layer["mean"]
+
+    if economics:
+        gdp, _, _ = economics["GDP"]
+        poverty_rate, _ = economics["poverty_rate"]
+        metrics["gdp"] = math.nan if gdp is None else gdp
+        metrics["poverty_rate"] = math.nan if poverty_rate is None else poverty_rate
+        if economics.get("educational_expenditure") is not None:
+            metrics["educational_expense"] = economics["educational_expenditure"]
+    return {name: math.nan if value is None else float(value) for name, value in metrics.items()}
+
+
+class CountryEconomics:
+    """
+    Economic data looked up once per country and shared by every location in it, including
+    locations that arrive while the lookup is still running.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self._lookups = {}
+
+    async def get(self, country):
+        lookup = self._lookups.get(country)
+        if lookup is None or time.monotonic() - lookup[0] > ECONOMICS_REFRESH_SECONDS:
+            lookup = (time.monotonic(), asyncio.ensure_future(self.service.economic_data([country])))
+            self._lookups[country] = lookup
+            registry.inc("economics_lookups_total")
+        try:
+            economic_data = await asyncio.shield(lookup[1])
+        except Exception:
+            # Let the next location for this country try again
+            if self._lookups.get(country) is lookup:
+                del self._lookups[country]
+            raise
+        return economic_data[country]
+
+
+class ComparativeScorer:
+    """
+    Scores assessed locations against each other. Each location keeps one row of metrics
+    (a location assessed again replaces its row); percentiles, the composite score and the
+    rank are recomputed over all rows at once with NumPy whenever the table is written.
+
+    The composite score is the weighted mean of each metric's percentile, flipped for
+    metrics where lower is better, over the metrics the location has. Rank 1 is the
+    highest score and tied scores share a rank.
+    """
+
+    def __init__(self, path=IMPACT_SCORES_PATH, flush_interval=SCORE_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.rows = {}
+        self.columns = {name: [] for name in TEXT_COLUMNS + NUMERIC_COLUMNS}
+        self.dirty = False
+        self.last_flush = 0.0
+        # Pick up the rows written before a restart, so the first flush does not drop them
+        self.load()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def load(self):
+        """
+        Reads back the rows of a table written by flush, if the file exists. Rank, score and
+        percentiles are not read; they are recomputed from the metrics.
+
+        Returns:
+        - number of rows loaded
+        """
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, newline="") as scores_file:
+            for row in csv.DictReader(scores_file):
+                metrics = {name: float(row[name]) if row.get(name) else math.nan for name in NUMERIC_COLUMNS}
+                self.add(row["location"], row["country"], metrics)
+        # The file already holds these rows
+        self.dirty = False
+        logger.info(f"Loaded scores for {len(self.rows)} locations from {self.path}")
+        return len(self.rows)
+
+    def add(self, label, country, metrics):
+        """
+        Records or replaces the row for a location.
+
+        Parameters:
+        - label: location name, used with the coordinates to recognise the same location again
+        - metrics: dict from location_metrics
+        """
+        key = (label,)
+        if math.isfinite(metrics["lat"]) and math.isfinite(metrics["lon"]):
+            key = (label, round(metrics["lat"], 4), round(metrics["lon"], 4))
+        values = dict(metrics, location=label, country=country)
+        index = self.rows.get(key)
+        if index is None:
+            self.rows[key] = len(self.rows)
+            for name, column in self.columns.items():
+                column.append(values[name])
+        else:
+            for name, column in self.columns.items():
+                column[index] = values[name]
+        self.dirty = True
+
+    def scores(self):
+        """
+        Returns:
+        - dict of column name -> array over all rows: the metrics, a "<metric>_percentile"
+          for each of SCORE_METRICS, "score" and "rank" (NaN for rows with no metrics)
+        """
+        table = {name: np.asarray(column, dtype="float64") for name, column in self.columns.items() if name in NUMERIC_COLUMNS}
+        weighted = np.zeros(len(self.rows))
+        weights = np.zeros(len(self.rows))
+        for name, (weight, higher_is_better) in SCORE_METRICS.items():
+            percentile = percentile_ranks(table[name])
+            table[f"{name}_percentile"] = percentile
+            oriented = percentile if higher_is_better else 100 - percentile
+            present = np.isfinite(oriented)
+            weighted[present] += weight * oriented[present]
+            weights[present] += weight
+        with np.errstate(invalid="ignore"):
+            score = weighted / weights
+        table["score"] = score
+
+        # Competition ranking: one more than the number of strictly higher scores
+        scored = np.sort(score[np.isfinite(score)])
+        rank = np.full(score.shape, np.nan)
+        rank[np.isfinite(score)] = scored.size - np.searchsorted(scored, score[np.isfinite(score)], side="right") + 1
+        table["rank"] = rank
+        return table
+
+    def flush(self, force=False):
+        """
+        Rewrites the table if rows changed since the last write, at most once per
+        flush_interval unless forced. The file is replaced in one rename, so readers always
+        see a complete table.
+
+        Returns:
+        - True if the table was written
+        """
+        if not self.dirty or (not force and time.monotonic() - self.last_flush < self.flush_interval):
+            return False
+        started = time.perf_counter()
+        table = self.scores()
+        order = np.lexsort((np.arange(len(self.rows)), np.nan_to_num(table["rank"], nan=np.inf)))
+        header = ["rank", "score"] + TEXT_COLUMNS + NUMERIC_COLUMNS + [f"{name}_percentile" for name in SCORE_METRICS]
+        # Columns are put in rank order and formatted whole, then written out row by row
+        columns = []
+        for name in header:
+            if name in TEXT_COLUMNS:
+                columns.append([self.columns[name][i] for i in order])
+            else:
+                columns.append([_format(value) for value in table[name][order].tolist()])
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", newline="") as scores_file:
+            writer = csv.writer(scores_file)
+            writer.writerow(header)
+            writer.writerows(zip(*columns))
+        os.replace(tmp_path, self.path)
+
+        self.dirty = False
+        self.last_flush = time.monotonic()
+        registry.observe("score_flush_seconds", time.perf_counter() - started)
+        logger.info(f"Scores for {len(self.rows)} locations written to {self.path}")
+        return True
+
+
+def _format(value):
+    # Blank for missing values, whole numbers without a decimal point, the rest to 4 decimals
+    if not math.isfinite(value):
+        return ""
+    return str(int(value)) if value.is_integer() else str(round(value, 4))
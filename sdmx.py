@@ -0,0 +1,163 @@
+import logging
+import xml.etree.ElementTree as ET
+from array import array
+
+from metrics import record_call
+
+logger = logging.getLogger(__name__)
+
+GENERIC_NS = "{http://www.sdmx.org/resources/sdmxml/schemas/v2_1/data/generic}"
+MESSAGE_NS = "{http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message}"
+TIME_DIMENSION = "TIME_PERIOD"
+CHUNK_SIZE = 64 * 1024
+
+
+class SdmxTable:
+    """
+    Observations parsed from an SDMX message: one row of dimension values per observation
+    plus a parallel array of float values.
+
+    Parameters:
+    - dimensions: list of dimension ids, e.g. ["REF_AREA", ..., "TIME_PERIOD"]
+    """
+
+    def __init__(self, dimensions=None):
+        self.dimensions = list(dimensions or [])
+        self.keys = []
+        self.values = array("d")
+
+    def append(self, key, value):
+        self.keys.append(key)
+        self.values.append(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def column(self, dimension):
+        index = self.dimensions.index(dimension)
+        return [key[index] for key in self.keys]
+
+    def lookup(self, *dimensions):
+        """
+        Maps the chosen dimensions of each observation to its value, e.g.
+        lookup("REF_AREA", "TIME_PERIOD") -> {("FRA", "2021"): 1.2e11, ...}
+        """
+        if not self.keys:
+            # Nothing matched the query, so the message declared no dimensions either
+            return {}
+        indexes = [self.dimensions.index(dimension) for dimension in dimensions]
+        return {tuple(key[i] for i in indexes): value for key, value in zip(self.keys, self.values)}
+
+
+class SdmxGenericParser:
+    """
+    Incremental parser for SDMX-ML 2.1 generic data messages. Feed it the body in chunks;
+    each series is discarded as soon as its observations are read, so memory use does not
+    grow with the size of the message.
+
+    Parameters:
+    - wanted: optional set of (REF_AREA, TIME_PERIOD) pairs; `done` turns true once all were seen
+    """
+
+    def __init__(self, wanted=None):
+        self.table = SdmxTable()
+        self.wanted = set(wanted) if wanted else None
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._parents = []
+        self._series_key = []
+        self._obs_key = []
+        self._obs_time = None
+        self._obs_value = None
+        self._in_obs = False
+
+    @property
+    def done(self):
+        return self.wanted is not None and not self.wanted
+
+    def feed(self, chunk):
+        self._parser.feed(chunk)
+        for event, element in self._parser.read_events():
+            if event == "start":
+                self._start(element)
+            else:
+                self._end(element)
+            if self.done:
+                break
+
+    def close(self):
+        self._parser.close()
+        return self.table
+
+    def _start(self, element):
+        tag = element.tag
+        if tag == f"{GENERIC_NS}Series":
+            self._series_key = []
+        elif tag == f"{GENERIC_NS}Obs":
+            self._in_obs = True
+            self._obs_key = []
+            self._obs_time = None
+            self._obs_value = None
+        elif tag in (f"{MESSAGE_NS}DataSet", f"{GENERIC_NS}DataSet"):
+            self._parents.append(element)
+
+    def _end(self, element):
+        tag = element.tag
+        if tag == f"{GENERIC_NS}Value":
+            pair = (element.attrib.get("id"), element.attrib.get("value"))
+            # Values inside an Obs belong to its ObsKey (flat messages), otherwise to the SeriesKey
+            (self._obs_key if self._in_obs else self._series_key).append(pair)
+        elif tag == f"{GENERIC_NS}ObsDimension":
+            self._obs_time = element.attrib.get("value")
+        elif tag == f"{GENERIC_NS}ObsValue":
+            self._obs_value = element.attrib.get("value")
+        elif tag == f"{GENERIC_NS}Obs":
+            self._in_obs = False
+            self._emit()
+            element.clear()
+        elif tag == f"{GENERIC_NS}Series":
+            element.clear()
+            # Drop the finished series from the data set so nothing accumulates
+            if self._parents and len(self._parents[-1]) and self._parents[-1][0] is element:
+                self._parents[-1].remove(element)
+
+    def _emit(self):
+        if self._obs_value in (None, "", "NaN"):
+            return
+        pairs = self._series_key + self._obs_key
+        if self._obs_time is not None:
+            pairs = pairs + [(TIME_DIMENSION, self._obs_time)]
+        if not self.table.dimensions:
+            self.table.dimensions = [name for name, _ in pairs]
+        key = tuple(value for _, value in pairs)
+        self.table.append(key, float(self._obs_value))
+
+        if self.wanted is not None:
+            values = dict(pairs)
+            self.wanted.discard((values.get("REF_AREA"), values.get(TIME_DIMENSION)))
+
+
+async def fetch_sdmx_table(session, url, params=None, wanted=None, chunk_size=CHUNK_SIZE, source="oecd"):
+    """
+    Streams an SDMX generic data message and parses it as it arrives. When `wanted` is
+    given, the download stops as soon as every wanted (REF_AREA, TIME_PERIOD) was seen.
+
+    Returns:
+    - SdmxTable, or None if the request failed
+    """
+    parser = SdmxGenericParser(wanted)
+    headers = {"Accept": "application/vnd.sdmx.genericdata+xml;version=2.1"}
+    received = 0
+    async with session.get(url, params=params, headers=headers) as response:
+        if response.status != 200:
+            record_call(source, status=response.status)
+            logger.info(f"SDMX request to {url} failed with status {response.status}")
+            return None
+        async for chunk in response.content.iter_chunked(chunk_size):
+            received += len(chunk)
+            parser.feed(chunk)
+            if parser.done:
+                record_call(source, received, response.status)
+                logger.info("All requested observations found, stopping SDMX download early")
+                return parser.table
+    record_call(source, received, 200)
+    return parser.close()
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+
+import aiohttp
+
+from cache import get_cache
+from spatial_index import haversine_km
+from weather_fetch import REQUEST_TIMEOUT, TokenBucket, fetch_json
+
+logger = logging.getLogger(__name__)
+
+SOILGRIDS_URL = "https://rest.isric.org/soilgrids/v2.0/properties/query"
+SOIL_PROPERTIES = ["clay", "phh2o", "sand", "silt", "soc"]
+SOIL_DEPTHS = ["0-5cm", "0-30cm"]
+
+# Probe candidates sit on a grid of this spacing (~1.1 km), which is also the cache key grid
+SOIL_GRID_DEGREES = float(os.getenv("SOIL_GRID_DEGREES", "0.01"))
+# Rings searched outwards from the site before giving up. Ring k sits 2**(k-1) grid cells out,
+# so 6 rings reach ~35 km while probing at most 49 points.
+SOIL_MAX_RINGS = int(os.getenv("SOIL_MAX_RINGS", "6"))
+# SoilGrids asks for at most 5 calls per minute per user
+SOILGRIDS_CALLS_PER_MINUTE = float(os.getenv("SOILGRIDS_CALLS_PER_MINUTE", "5"))
+SOILGRIDS_BURST = int(os.getenv("SOILGRIDS_BURST", "5"))
+SOILGRIDS_MAX_IN_FLIGHT = 8
+
+# Shared by every lookup in the process so concurrent requests stay inside the quota
+soilgrids_limiter = TokenBucket(rate=SOILGRIDS_CALLS_PER_MINUTE / 60.0, capacity=SOILGRIDS_BURST)
+
+
+def snap(value):
+    return round(round(value / SOIL_GRID_DEGREES) * SOIL_GRID_DEGREES, 6)
+
+
+def ring_points(lat, lon, ring):
+    """
+    The eight compass grid points of ring `ring` around the snapped site, nearest first.
+    Ring 0 is the snapped site itself.
+    """
+    center_lat, center_lon = snap(lat), snap(lon)
+    if ring == 0:
+        return [(center_lat, center_lon)]
+    cells = 2 ** (ring - 1)
+    points = [
+        (snap(center_lat + dy * cells * SOIL_GRID_DEGREES), snap(center_lon + dx * cells * SOIL_GRID_DEGREES))
+        for dy in (-1, 0, 1)
+        for dx in (-1, 0, 1)
+        if dy or dx
+    ]
+    return sorted(points, key=lambda point: haversine_km(lat, lon, *point))
+
+
+def top_depth(layer):
+    # The shallowest depth of a property that has a mean value, or None
+    for depth in layer.get("depths") or []:
+        if depth.get("values", {}).get("mean") is not None:
+            return depth
+    return None
+
+
+def has_soil_values(soil_data):
+    # Valid when at least one property has a mean value at some depth, i.e. soil_report has a layer
+    return any(top_depth(layer) is not None for layer in soil_data.get("properties", {}).get("layers", []))
+
+
+async def probe(session, lat, lon, semaphore, limiter=None):
+    """
+    Fetches SoilGrids data for one grid point, consulting the cache first. Empty responses
+    are cached too, so later lookups skip points known to have no data.
+
+    Returns:
+    - the SoilGrids response, {"valid": False} for a point without data, or None if the call failed
+    """
+    cache_params = {"lat": lat, "lon": lon}
+    cached = get_cache().get("soil", cache_params)
+    if cached is not None:
+        return cached
+
+    params = [("lon", lon), ("lat", lat), ("value", "mean")]
+    params += [("property", name) for name in SOIL_PROPERTIES]
+    params += [("depth", depth) for depth in SOIL_DEPTHS]
+    soil_data = await fetch_json(session, SOILGRIDS_URL, params, limiter or soilgrids_limiter, semaphore, source="soilgrids")
+    if soil_data is None:
+        logger.error(f"Failed to fetch soil data for lat={lat}, lon={lon}")
+        return None
+
+    result = soil_data if has_soil_values(soil_data) else {"valid": False}
+    get_cache().set("soil", cache_params, result)
+    return result
+
+
+async def get_soil_data(lat, lon, max_rings=None, limiter=None, should_pause=None):
+    """
+    Finds the nearest grid point with valid SoilGrids data, searching rings of candidates
+    outwards. A ring's probes are started nearest first, so they take rate limit tokens in
+    distance order, and the rest of the ring is cancelled as soon as the nearest valid point
+    is known instead of spending the quota on farther points.
+
+    Parameters:
+    - limiter: rate limiter for the calls, soilgrids_limiter by default
+    - should_pause: for background lookups, a callable checked before each probe; the
+      probes then run one at a time and the search stops once it returns True
+
+    Returns:
+    - soil_data: dict, the SoilGrids response with a "probe" entry giving the point used
+      and its distance from the site, {"error": ...} if nothing was found, or None if
+      should_pause stopped the search
+    """
+    max_rings = SOIL_MAX_RINGS if max_rings is None else max_rings
+    semaphore = asyncio.Semaphore(SOILGRIDS_MAX_IN_FLIGHT)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+
+    async with aiohttp.ClientSession(timeout=timeout, headers={"accept": "application/json"}) as session:
+        for ring in range(max_rings + 1):
+            points = ring_points(lat, lon, ring)
+            probes = []
+            if should_pause is None:
+                probes = [asyncio.create_task(probe(session, p_lat, p_lon, semaphore, limiter)) for p_lat, p_lon in points]
+            try:
+                # Points are sorted by distance, so the first valid one is the nearest in this ring
+                for i, (p_lat, p_lon) in enumerate(points):
+                    if should_pause is None:
+                        soil_data = await probes[i]
+                    elif should_pause():
+                        return None
+                    else:
+                        soil_data = await probe(session, p_lat, p_lon, semaphore, limiter)
+                    if soil_data is not None and soil_data.get("valid", True):
+                        distance_km = haversine_km(lat, lon, p_lat, p_lon)
+                        logger.info(f"Using soil data from lat={p_lat}, lon={p_lon} ({distance_km:.2f} km away)")
+                        return dict(soil_data, probe={
+                            "lat": p_lat,
+                            "lon": p_lon,
+                            "ring": ring,
+                            "distance_km": round(distance_km, 3),
+                        })
+            finally:
+                for task in probes:
+                    task.cancel()
+                await asyncio.gather(*probes, return_exceptions=True)
+
+    # If all attempts fail, return an error message
+    return {"error": "No valid soil data found after retries"}
+
+
+def soil_report(soil_data):
+    """
+    Extracts the numeric soil properties from a SoilGrids response.
+
+    Parameters:
+    - soil_data: dict, the JSON response from SoilGrids API
+
+    Returns:
+    - report: dict with the queried "coordinates", the "probe_distance_km" of the sample used
+      (None when it is the site itself) and "layers", the shallowest depth of each property
+      that has a mean value as {"name", "depth", "mean", "unit"}
+    """
+    layers = []
+    for layer in soil_data.get("properties", {}).get("layers", []):
+        # Usually the top layer; a deeper one where SoilGrids has no value at the surface
+        depth = top_depth(layer)
+        if depth is not None:
+            depth_range = depth.get("range", {})
+            layers.append({
+                "name": layer.get("name"),
+                "depth": depth.get("label", f"{depth_range.get('top_depth', '?')} - {depth_range.get('bottom_depth', '?')} cm"),
+                "mean": depth["values"]["mean"],
+                "unit": layer["unit_measure"]["mapped_units"],
+            })
+    return {
+        "coordinates": soil_data.get("geometry", {}).get("coordinates"),
+        "probe_distance_km": soil_data["probe"]["distance_km"] if "probe" in soil_data else None,
+        "layers": layers,
+    }
+
+
+def format_soil_summary(report):
+    """
+    Renders a soil_report as the "; "-joined summary used in analysis texts.
+    """
+    analysis_results = [f"At coordinates:{report['coordinates']}"]
+    if report.get("probe_distance_km") is not None:
+        analysis_results.append(f"Nearest valid soil sample {report['probe_distance_km']} km from the site")
+    for layer in report["layers"]:
+        # Whole numbers print without a decimal point, however the value reached us
+        mean_value = int(layer["mean"]) if float(layer["mean"]).is_integer() else layer["mean"]
+        analysis_results.append(f"{layer['name'].upper()} content at {layer['depth']}: {mean_value} ({layer['unit']})")
+
+    # Check if all properties have null means
+    if not report["layers"]:
+        analysis_results.append("No valid soil data found for the provided coordinates.")
+    return "; ".join(analysis_results)
+
+
+def analyze_soil_data(soil_data):
+    """
+    Analyzes the soil data and returns a summary with key soil properties.
+
+    Parameters:
+    - soil_data: dict, the JSON response from SoilGrids API
+
+    Returns:
+    - soil_summary: str, a summary report of the soil properties
+    """
+    return format_soil_summary(soil_report(soil_data))
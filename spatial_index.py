@@ -0,0 +1,152 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from cache import CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# How far away an already collected location may be and still stand in for a new one, per
+# source. SoilGrids is a 250 m grid that the soil search snaps to ~1 km anyway, weather is
+# regional, and NDVI is averaged over a 500 m buffer so only very close sites can share it.
+# Set a radius to 0 to always collect that source for the exact site.
+REUSE_RADIUS_KM = {
+    source: float(os.getenv(f"REUSE_RADIUS_KM_{source.upper()}", default))
+    for source, default in {"weather": 2.0, "soil": 1.0, "ndvi": 0.1, "reverse_geocode": 5.0}.items()
+}
+# Seconds between checks for locations added by other processes sharing the database
+REFRESH_INTERVAL = 5.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """
+    Points bucketed into square cells of `cell_km` degrees of latitude. A radius query only
+    looks at the cells that can hold a point within the radius, so it stays fast however
+    many points are stored, as long as the cells are about as large as the query radius.
+    """
+
+    def __init__(self, cell_km):
+        self.cell_degrees = max(cell_km, 0.01) / KM_PER_DEGREE
+        self.columns = math.ceil(360 / self.cell_degrees)
+        self.cells = {}
+        self.size = 0
+
+    def _cell(self, lat, lon):
+        return math.floor((lat + 90) / self.cell_degrees), math.floor((lon + 180) / self.cell_degrees) % self.columns
+
+    def add(self, lat, lon):
+        points = self.cells.setdefault(self._cell(lat, lon), [])
+        if (lat, lon) not in points:
+            points.append((lat, lon))
+            self.size += 1
+
+    def nearest(self, lat, lon, radius_km):
+        """
+        Returns:
+        - (lat, lon, distance_km) of the nearest stored point within radius_km, or None
+        """
+        row, column = self._cell(lat, lon)
+        rows = math.ceil(radius_km / KM_PER_DEGREE / self.cell_degrees)
+        # Longitude cells narrow towards the poles, so more of them fit in the radius
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + rows * self.cell_degrees, 90))), 1e-6)
+        columns = min(math.ceil(rows / cos_lat), self.columns // 2)
+
+        best = None
+        for r in range(row - rows, row + rows + 1):
+            for c in range(column - columns, column + columns + 1):
+                for p_lat, p_lon in self.cells.get((r, c % self.columns), ()):
+                    distance = haversine_km(lat, lon, p_lat, p_lon)
+                    if distance <= radius_km and (best is None or distance < best[2]):
+                        best = (p_lat, p_lon, distance)
+        return best
+
+
+class LocationIndex:
+    """
+    The locations already collected for each source, kept in memory as one GridIndex per
+    source and persisted in a table next to the cache so they survive restarts and are
+    shared with the other workers on the machine.
+    """
+
+    def __init__(self, path=CACHE_PATH, radii=None):
+        self.path = path
+        self.radii = dict(REUSE_RADIUS_KM if radii is None else radii)
+        self.grids = {source: GridIndex(radius) for source, radius in self.radii.items()}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS locations ("
+            "id INTEGER PRIMARY KEY, source TEXT NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL, "
+            "created REAL NOT NULL, UNIQUE (source, lat, lon))"
+        )
+        self._conn.commit()
+        self._last_id = 0
+        self._refreshed = 0.0
+        self.refresh()
+        logger.info(f"Location index loaded: { {source: grid.size for source, grid in self.grids.items()} }")
+
+    def refresh(self):
+        # Loads locations added since the last refresh, including by other processes
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, source, lat, lon FROM locations WHERE id > ? ORDER BY id", (self._last_id,)
+            ).fetchall()
+            for row_id, source, lat, lon in rows:
+                if source in self.grids:
+                    self.grids[source].add(lat, lon)
+                self._last_id = row_id
+            self._refreshed = time.monotonic()
+
+    def nearest(self, source, lat, lon):
+        """
+        Finds the closest already collected location for a source within its reuse radius.
+
+        Returns:
+        - (lat, lon, distance_km), or None if nothing is close enough or reuse is off
+        """
+        radius = self.radii.get(source, 0)
+        if radius <= 0:
+            return None
+        if time.monotonic() - self._refreshed > REFRESH_INTERVAL:
+            self.refresh()
+        with self._lock:
+            return self.grids[source].nearest(lat, lon, radius)
+
+    def add(self, source, lat, lon):
+        if self.radii.get(source, 0) <= 0:
+            return
+        with self._lock:
+            self.grids[source].add(lat, lon)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO locations (source, lat, lon, created) VALUES (?, ?, ?, ?)",
+                (source, lat, lon, time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        return {source: {"locations": grid.size, "radius_km": self.radii[source]} for source, grid in self.grids.items()}
+
+
+_index = None
+
+
+def get_location_index():
+    # One index per process, loaded on first use
+    global _index
+    if _index is None:
+        _index = LocationIndex()
+    return _index
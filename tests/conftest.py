@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+
+
+@pytest.fixture
+def fresh_cache(tmp_path, monkeypatch):
+    # A private cache file per test, so cached responses never leak between tests
+    test_cache = cache.Cache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(cache, "_cache", test_cache)
+    return test_cache
+
+
+@pytest.fixture
+def stub_server():
+    from benchmarks.stub_server import StubServer
+
+    stub = StubServer()
+    stub.start()
+    yield stub
+    stub.stop()
@@ -0,0 +1,71 @@
+import copy
+
+import pytest
+
+import analysis
+from key_phrases import RakeKeyPhraseBackend
+
+COLLECTED = {
+    "location": {"city": "Nairobi", "lat": -1.29, "lon": 36.82},
+    "ndvi_data": {"mean_ndvi": 0.41, "max_ndvi": 0.77, "min_ndvi": 0.05},
+    "soil_data": "Soil organic carbon is high in the top layer",
+}
+ECONOMICS = (1.0e11, "2021", 36.1, "2021", 4.2e9, "Kenya")
+
+
+class CountingBackend(RakeKeyPhraseBackend):
+    def __init__(self):
+        super().__init__()
+        self.documents = 0
+
+    def extract(self, documents):
+        self.documents += len(documents)
+        return super().extract(documents)
+
+
+@pytest.fixture
+def counts(monkeypatch):
+    counts = {"hits": 0, "misses": 0, "stale": 0}
+    monkeypatch.setattr(analysis, "memo_counts", counts)
+    return counts
+
+
+def test_unchanged_inputs_reuse_the_stored_analysis(fresh_cache, counts):
+    backend = CountingBackend()
+    first = analysis.memoized_analysis(COLLECTED, *ECONOMICS, backend=backend)
+    # Same content in a different dict order still hits
+    reordered = dict(reversed(list(copy.deepcopy(COLLECTED).items())))
+    second = analysis.memoized_analysis(reordered, *ECONOMICS, backend=backend)
+
+    assert first == second == analysis.generate_analysis(COLLECTED, *ECONOMICS, backend=RakeKeyPhraseBackend())
+    assert backend.documents == 1
+    assert counts == {"hits": 1, "misses": 1, "stale": 0}
+    assert analysis.memo_stats()["entries"] == 1
+
+
+def test_changed_inputs_replace_the_stored_analysis(fresh_cache, counts):
+    backend = CountingBackend()
+    analysis.memoized_analysis(COLLECTED, *ECONOMICS, backend=backend)
+
+    changed = copy.deepcopy(COLLECTED)
+    changed["ndvi_data"]["mean_ndvi"] = 0.52
+    result = analysis.memoized_analysis(changed, *ECONOMICS, backend=backend)
+    assert "Mean: 0.52" in result["Summary"]
+    # A new poverty figure for the same location is a change as well
+    analysis.memoized_analysis(changed, 1.0e11, "2021", 35.0, "2022", 4.2e9, "Kenya", backend=backend)
+    analysis.memoized_analysis(changed, 1.0e11, "2021", 35.0, "2022", 4.2e9, "Kenya", backend=backend)
+
+    assert backend.documents == 3
+    assert counts == {"hits": 1, "misses": 1, "stale": 2}
+    # Still one entry per location
+    assert analysis.memo_stats()["entries"] == 1
+
+
+def test_backend_is_part_of_the_fingerprint(fresh_cache, counts):
+    analysis.memoized_analysis(COLLECTED, *ECONOMICS, backend=RakeKeyPhraseBackend())
+
+    class OtherBackend(RakeKeyPhraseBackend):
+        name = "other"
+
+    analysis.memoized_analysis(COLLECTED, *ECONOMICS, backend=OtherBackend())
+    assert counts["stale"] == 1
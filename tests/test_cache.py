@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import cache
+from cache import Cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Replaces the cache's view of time.time with a value the test moves forward
+    now = [1000.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_keys_are_normalized(tmp_path):
+    store = Cache(str(tmp_path / "cache.sqlite3"))
+    store.set("geocode", {"city": " London ", "country": "GB", "lat": 51.507321}, [1, 2])
+    assert store.get("geocode", {"country": "gb", "lat": 51.50732, "city": "london"}) == [1, 2]
+    assert store.get("geocode", {"city": "paris", "country": "gb", "lat": 51.50732}) is None
+    assert store.get("soil", {"city": "london", "country": "gb", "lat": 51.50732}) is None
+
+
+def test_entries_expire_after_their_source_ttl(tmp_path, clock):
+    store = Cache(str(tmp_path / "cache.sqlite3"), ttls={"geocode": 60, "warming": None})
+    store.set("geocode", {"city": "london"}, "fresh")
+    store.set("warming", {"item": "site:london"}, "kept")
+
+    clock[0] += 60
+    assert store.get("geocode", {"city": "london"}) == "fresh"
+    clock[0] += 1
+    assert store.get("geocode", {"city": "london"}) is None
+    clock[0] += 10 ** 9
+    assert store.get("warming", {"item": "site:london"}) == "kept"
+
+    stats = store.stats()["geocode"]
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (0, 1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    store = Cache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    for name in ("a", "b"):
+        clock[0] += 1
+        store.set("soil", {"name": name}, name)
+    clock[0] += 1
+    assert store.get("soil", {"name": "a"}) == "a"
+
+    clock[0] += 1
+    store.set("soil", {"name": "c"}, "c")
+    assert store.get("soil", {"name": "b"}) is None
+    assert store.get("soil", {"name": "a"}) == "a"
+    assert store.get("soil", {"name": "c"}) == "c"
+
+
+def test_invalidate(tmp_path):
+    store = Cache(str(tmp_path / "cache.sqlite3"))
+    store.set("soil", {"lat": 1, "lon": 2}, 1)
+    store.set("soil", {"lat": 3, "lon": 4}, 2)
+    store.set("oecd", {"country": "FRA"}, 3)
+    assert store.invalidate("soil", {"lat": 1, "lon": 2}) == 1
+    assert store.invalidate("soil") == 1
+    assert store.get("oecd", {"country": "FRA"}) == 3
+    assert store.invalidate() == 1
+
+
+def test_get_cache_opens_one_cache_across_threads(tmp_path, monkeypatch):
+    created = []
+
+    class SlowCache(Cache):
+        def __init__(self):
+            # Widen the window in which a second thread could also see no cache yet
+            time.sleep(0.05)
+            created.append(self)
+            super().__init__(str(tmp_path / "cache.sqlite3"))
+
+    monkeypatch.setattr(cache, "_cache", None)
+    monkeypatch.setattr(cache, "Cache", SlowCache)
+    start = threading.Barrier(8)
+
+    def first_use():
+        start.wait()
+        return cache.get_cache()
+
+    with ThreadPoolExecutor(8) as pool:
+        caches = list(pool.map(lambda _: first_use(), range(8)))
+    assert len(created) == 1 and all(found is created[0] for found in caches)
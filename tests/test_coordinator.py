@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from collections import Counter
+
+import pytest
+
+# coordinator builds a uagents Agent on import
+pytest.importorskip("uagents")
+
+import coordinator  # noqa: E402
+from coordinator import Dispatch, HashRing, WorkerState, shard_key  # noqa: E402
+
+WORKERS = [f"agent1worker{i}" for i in range(4)]
+KEYS = [shard_key(lat / 7, lon / 3) for lat in range(-300, 300, 13) for lon in range(-500, 500, 37)]
+
+
+class FakeContext:
+    def __init__(self):
+        self.logger = logging.getLogger("test_coordinator")
+        self.sent = []
+
+    async def send(self, destination, message):
+        self.sent.append((destination, message))
+
+
+def test_preference_lists_every_worker_once_deterministically():
+    ring = HashRing(WORKERS + [WORKERS[0]])
+    for key in KEYS[:50]:
+        order = ring.preference(key)
+        assert sorted(order) == sorted(WORKERS)
+        assert order == HashRing(list(reversed(WORKERS))).preference(key)
+
+
+def test_keys_spread_over_workers_and_few_move_when_one_is_added():
+    ring = HashRing(WORKERS)
+    owners = {key: ring.preference(key)[0] for key in KEYS}
+    counts = Counter(owners.values())
+    assert set(counts) == set(WORKERS)
+    assert max(counts.values()) < 2 * len(KEYS) / len(WORKERS)
+
+    grown = HashRing(WORKERS + ["agent1worker4"])
+    moved = [key for key in KEYS if grown.preference(key)[0] != owners[key]]
+    # Only keys taken over by the new worker move, about a fifth of them
+    assert all(grown.preference(key)[0] == "agent1worker4" for key in moved)
+    assert 0 < len(moved) < 0.35 * len(KEYS)
+
+
+def test_shard_key_rounds_nearby_coordinates_together():
+    assert shard_key(-1.28333, 36.81667) == shard_key(-1.2849, 36.8151) == "-1.28,36.82"
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    monkeypatch.setattr(coordinator, "ring", HashRing(WORKERS[:3]))
+    monkeypatch.setattr(coordinator, "workers", {address: WorkerState(address) for address in WORKERS[:3]})
+    monkeypatch.setattr(coordinator, "dispatches", {})
+    return coordinator
+
+
+def test_redispatch_moves_a_request_along_the_ring(cluster):
+    ctx = FakeContext()
+    cluster.dispatches["r1"] = Dispatch("request", "requester", "-1.28,36.82", "impact")
+    order = cluster.ring.preference("-1.28,36.82")
+
+    async def main():
+        await cluster.dispatch_request(ctx, "r1")
+        await cluster.redispatch(ctx, "r1", "timeout")
+
+    asyncio.run(main())
+    assert ctx.sent == [(order[0], "request"), (order[1], "request")]
+    assert cluster.dispatches["r1"].tried == order[:2]
+    # The first worker no longer counts the request as its own
+    assert not cluster.workers[order[0]].in_flight and cluster.workers[order[1]].in_flight == {"r1"}
+
+
+def test_redispatch_reports_failure_after_max_attempts(cluster):
+    ctx = FakeContext()
+    cluster.dispatches["r1"] = Dispatch("request", "requester", "0.00,0.00", "impact")
+
+    async def main():
+        await cluster.dispatch_request(ctx, "r1")
+        for _ in range(cluster.MAX_ATTEMPTS):
+            await cluster.redispatch(ctx, "r1", "unhealthy")
+
+    asyncio.run(main())
+    destination, message = ctx.sent[-1]
+    assert len(ctx.sent) == cluster.MAX_ATTEMPTS + 1
+    assert destination == "requester" and "failed on 3 workers" in message.data["error"]
+    assert "r1" not in cluster.dispatches
+    assert not any(worker.in_flight for worker in cluster.workers.values())
+
+
+def test_unhealthy_workers_are_skipped(cluster):
+    ctx = FakeContext()
+    order = cluster.ring.preference("0.00,0.00")
+    cluster.workers[order[0]].down_until = float("inf")
+    cluster.dispatches["r1"] = Dispatch("request", "requester", "0.00,0.00", "impact")
+
+    asyncio.run(cluster.dispatch_request(ctx, "r1"))
+    assert ctx.sent == [(order[1], "request")]
@@ -0,0 +1,94 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import indicators
+from indicators import GDP_INDICATOR, POVERTY_INDICATOR, latest_values
+
+
+def record(country, iso3, indicator, year, value):
+    return {
+        "indicator": {"id": indicator, "value": indicator},
+        "country": {"id": country, "value": f"{country} name"},
+        "countryiso3code": iso3,
+        "date": str(year),
+        "value": value,
+    }
+
+
+def test_latest_values_picks_the_most_recent_value_in_range():
+    records = [
+        record("FR", "FRA", GDP_INDICATOR, 2019, 2.7e12),
+        record("FR", "FRA", GDP_INDICATOR, 2021, 2.9e12),
+        record("FR", "FRA", GDP_INDICATOR, 2022, 3.0e12),  # after LATEST_YEAR
+        record("FR", "FRA", POVERTY_INDICATOR, 2021, None),
+        record("FR", "FRA", POVERTY_INDICATOR, 2018, 0.1),
+        record("KE", "KEN", GDP_INDICATOR, 2020, 1.0e11),
+    ]
+    latest = latest_values(records, latest_year=2021)
+    assert latest[("FR", GDP_INDICATOR)] == (2.9e12, "2021", "FRA", "FR name")
+    assert latest[("FR", POVERTY_INDICATOR)] == (0.1, "2018", "FRA", "FR name")
+    # Reachable by ISO3 as well
+    assert latest[("FRA", GDP_INDICATOR)] == latest[("FR", GDP_INDICATOR)]
+    assert latest[("KEN", GDP_INDICATOR)][0] == 1.0e11
+    assert ("KE", POVERTY_INDICATOR) not in latest
+
+
+def test_world_bank_query_reads_every_page(stub_server, fresh_cache, monkeypatch):
+    monkeypatch.setattr(indicators, "WORLD_BANK_URL", f"{stub_server.base_url}/v2/country")
+    monkeypatch.setattr(indicators, "WORLD_BANK_PER_PAGE", 7)
+
+    async def fetch():
+        service = indicators.IndicatorService()
+        try:
+            return await service.fetch_world_bank(["FR", "DE", "KE"])
+        finally:
+            await service.close()
+
+    records = asyncio.run(fetch())
+    years = indicators.LATEST_YEAR - indicators.FIRST_YEAR + 1
+    # Two indicators for each of the three countries, over pages of 7 records
+    assert len(records) == 3 * 2 * years
+    assert sum(stub_server.calls.values()) == -(-len(records) // 7)
+
+
+def test_world_bank_values_are_cached(stub_server, fresh_cache, monkeypatch):
+    monkeypatch.setattr(indicators, "WORLD_BANK_URL", f"{stub_server.base_url}/v2/country")
+
+    async def lookup():
+        service = indicators.IndicatorService()
+        try:
+            first = await service.world_bank_values(["FR", "GB"])
+            second = await service.world_bank_values(["FR", "GB"])
+            return first, second
+        finally:
+            await service.close()
+
+    first, second = asyncio.run(lookup())
+    assert first == second
+    assert first["FR"][GDP_INDICATOR][2:] == ("FRA", "France")
+    assert first["GB"][POVERTY_INDICATOR] == (None, None, None, None)
+    assert sum(stub_server.calls.values()) == 1
+
+
+def test_world_bank_error_body_gives_no_values_and_is_not_cached(fresh_cache, monkeypatch):
+    # The API reports bad parameters as a 200 with a message in place of the page header
+    async def error_body(request):
+        return web.json_response([{"message": [{"id": "120", "key": "Invalid value", "value": "The provided parameter value is not valid"}]}])
+
+    app = web.Application()
+    app.router.add_get("/v2/country/{countries}/indicator/{indicators}", error_body)
+
+    async def lookup():
+        async with TestServer(app) as server:
+            monkeypatch.setattr(indicators, "WORLD_BANK_URL", str(server.make_url("/v2/country")))
+            service = indicators.IndicatorService()
+            try:
+                return await service.world_bank_values(["FR"])
+            finally:
+                await service.close()
+
+    results = asyncio.run(lookup())
+    assert results == {"FR": dict.fromkeys(indicators.INDICATORS, (None, None, None, None))}
+    assert fresh_cache.get("worldbank", {"country": "FR", "indicator": GDP_INDICATOR}) is None
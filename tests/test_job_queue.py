@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from job_queue import JobCancelled, JobQueue, QueueFull
+
+
+def make_queue(tmp_path, run, **options):
+    return JobQueue(run, scratch_dir=str(tmp_path / "scratch"), **options)
+
+
+def test_same_key_is_coalesced(tmp_path):
+    calls = []
+
+    async def run(job):
+        calls.append(job.key)
+        await asyncio.sleep(0.01)
+        return job.payload * 2
+
+    async def main():
+        queue = make_queue(tmp_path, run)
+        first, coalesced_first = queue.submit("a", 21)
+        second, coalesced_second = queue.submit("a", 99)
+        assert first is second and (coalesced_first, coalesced_second) == (False, True)
+        assert await asyncio.gather(first.result(), second.result()) == [42, 42]
+        assert first.requesters == 2 and not queue.jobs
+
+        # Once finished, the same key starts a fresh job
+        third, coalesced = queue.submit("a", 1)
+        assert not coalesced and await third.result() == 2
+
+    asyncio.run(main())
+    assert calls == ["a", "a"]
+
+
+def test_full_queue_refuses_new_keys(tmp_path):
+    async def main():
+        release = asyncio.Event()
+
+        async def run(job):
+            await release.wait()
+            return job.key
+
+        queue = make_queue(tmp_path, run, concurrency=1, max_queued=1)
+        running, _ = queue.submit("a", None)
+        waiting, _ = queue.submit("b", None)
+        await asyncio.sleep(0)
+        assert queue.stats()["running"] == 1 and queue.queued == 1
+
+        with pytest.raises(QueueFull) as refused:
+            queue.submit("c", None)
+        assert refused.value.queued == 1 and refused.value.retry_after > 0
+        # Joining a job already in flight is still allowed
+        assert queue.submit("b", None)[1]
+
+        release.set()
+        assert [await running.result(), await waiting.result()] == ["a", "b"]
+
+    asyncio.run(main())
+
+
+def test_failure_reaches_every_requester_and_cleans_up(tmp_path):
+    scratch = []
+
+    async def run(job):
+        scratch.append(job.scratch_dir)
+        raise RuntimeError("boom")
+
+    async def main():
+        queue = make_queue(tmp_path, run)
+        job, _ = queue.submit("a", None)
+        queue.submit("a", None)
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="boom"):
+                await job.result()
+        assert not queue.jobs
+
+    asyncio.run(main())
+    assert scratch and not (tmp_path / "scratch" / scratch[0]).exists()
+
+
+def test_cancelled_job_resolves_its_future(tmp_path):
+    async def run(job):
+        await asyncio.sleep(60)
+
+    async def main():
+        queue = make_queue(tmp_path, run, concurrency=1)
+        running, _ = queue.submit("a", None)
+        waiting, _ = queue.submit("b", None)
+        await asyncio.sleep(0)
+        for task in list(queue._tasks):
+            task.cancel()
+        for job in (running, waiting):
+            with pytest.raises(JobCancelled):
+                await asyncio.wait_for(job.result(), timeout=1)
+        assert not queue.jobs and queue.running == 0
+
+    asyncio.run(main())
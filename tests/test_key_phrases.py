@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+import key_phrases
+from key_phrases import AzureKeyPhraseBackend, RakeKeyPhraseBackend
+
+SUMMARY = (
+    "Location: Nairobi, Kenya. Total precipitation 812.4 mm over the period. "
+    "Soil organic carbon is high in the top layer; soil pH is neutral. "
+    "Vegetation density remained moderate with seasonal vegetation growth."
+)
+
+
+class FakeTextAnalyticsClient:
+    """Answers like TextAnalyticsClient.extract_key_phrases, failing first with the given errors."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.batches = []
+
+    def extract_key_phrases(self, batch):
+        self.batches.append(list(batch))
+        if self.errors:
+            raise self.errors.pop(0)
+        return [SimpleNamespace(is_error=False, key_phrases=[document.split()[0]]) for document in batch]
+
+
+def test_rake_scores_phrases_by_word_degree_over_frequency():
+    phrases = RakeKeyPhraseBackend().extract_one(SUMMARY)
+    # "vegetation" appears twice with degree 4 + 3, so it adds 3.5 to both of its phrases;
+    # tied phrases ("Total precipitation", "top layer") keep their order in the text
+    assert phrases == [
+        "Vegetation density remained moderate", "seasonal vegetation growth", "Soil organic carbon", "soil pH",
+        "Total precipitation", "top layer", "Location", "Nairobi", "Kenya", "period", "high", "neutral",
+    ]
+    # Stopwords, numbers and units never appear
+    assert not any(word in ("the", "is", "mm", "812.4") for phrase in phrases for word in phrase.split())
+
+
+def test_rake_limits_and_deduplicates_phrases():
+    backend = RakeKeyPhraseBackend(max_phrases=2)
+    assert len(backend.extract_one(SUMMARY)) == 2
+    assert RakeKeyPhraseBackend().extract_one("Soil pH. soil pH. Soil PH.") == ["Soil pH"]
+    assert RakeKeyPhraseBackend().extract(["", "the and of"]) == [[], []]
+
+
+def test_azure_sends_documents_in_batches():
+    client = FakeTextAnalyticsClient()
+    documents = [f"doc{i} text" for i in range(23)]
+    results = AzureKeyPhraseBackend(client=client, batch_size=10).extract(documents)
+    assert [len(batch) for batch in client.batches] == [10, 10, 3]
+    assert results == [[f"doc{i}"] for i in range(23)]
+
+
+def status_error(status):
+    error = Exception(f"status {status}")
+    error.status_code = status
+    error.response = SimpleNamespace(headers={})
+    return error
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(key_phrases.time, "sleep", delays.append)
+    return delays
+
+
+def test_azure_retries_throttled_and_failing_calls(sleeps):
+    client = FakeTextAnalyticsClient([status_error(429), status_error(503)])
+    assert AzureKeyPhraseBackend(client=client).extract(["Nairobi rainfall"]) == [["Nairobi"]]
+    assert len(client.batches) == 3
+    assert len(sleeps) == 2
+
+
+def test_azure_does_not_retry_client_errors(sleeps):
+    client = FakeTextAnalyticsClient([status_error(400)])
+    with pytest.raises(Exception, match="status 400"):
+        AzureKeyPhraseBackend(client=client).extract(["Nairobi rainfall"])
+    assert len(client.batches) == 1 and not sleeps
+
+
+def test_azure_gives_up_after_max_retries(sleeps):
+    from weather_fetch import MAX_RETRIES
+
+    client = FakeTextAnalyticsClient([status_error(503)] * (MAX_RETRIES + 1))
+    with pytest.raises(Exception, match="status 503"):
+        AzureKeyPhraseBackend(client=client).extract(["Nairobi rainfall"])
+    assert len(client.batches) == MAX_RETRIES + 1
+    assert len(sleeps) == MAX_RETRIES
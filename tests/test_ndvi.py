@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import ndvi
+from benchmarks import fake_ee
+from ndvi import (
+    ndvi_composite, reduce_ndvi_series, reduce_ndvi_stats, reduce_ndvi_stats_batch, series_periods,
+    summarize_ndvi_series, summarize_ndvi_stats,
+)
+
+SITES = [(51.5, -0.12), (-1.29, 36.82), (48.85, 2.35), (40.71, -74.0), (35.68, 139.69)]
+
+
+def composite(lat, lon):
+    region = fake_ee.Geometry.Point([lon, lat]).buffer(ndvi.NDVI_BUFFER_METERS)
+    return ndvi_composite(fake_ee, region, "2022-10-01", "2022-10-31")
+
+
+def test_reduce_ndvi_stats_matches_the_pixels_in_the_buffer():
+    lat, lon = SITES[0]
+    image = composite(lat, lon)
+    stats = reduce_ndvi_stats(fake_ee, image, lat, lon)
+
+    # The same pixels the reduction sees, evaluated directly
+    sample = fake_ee.Geometry.Point([lon, lat]).buffer(ndvi.NDVI_BUFFER_METERS).sample(ndvi.NDVI_SCALE)
+    values = image.bands["NDVI"](*sample)
+    values = values[np.isfinite(values)]
+    assert stats["count"] == values.size > 0
+    assert stats["mean"] == pytest.approx(values.mean())
+    assert (stats["min"], stats["max"]) == pytest.approx((values.min(), values.max()))
+    for p in ndvi.NDVI_PERCENTILES:
+        assert stats["percentiles"][f"p{p}"] == pytest.approx(np.percentile(values, p))
+
+
+def test_batch_reduction_matches_single_points_in_few_calls(monkeypatch):
+    monkeypatch.setattr(ndvi, "NDVI_BATCH_SIZE", 2)
+    image = composite(*SITES[0])
+    calls = fake_ee.getinfo_calls
+    batch = reduce_ndvi_stats_batch(fake_ee, image, SITES)
+    # Five points in batches of two
+    assert fake_ee.getinfo_calls - calls == 3
+    for (lat, lon), stats in zip(SITES, batch):
+        single = reduce_ndvi_stats(fake_ee, image, lat, lon)
+        assert stats["count"] == single["count"]
+        assert stats["mean"] == pytest.approx(single["mean"])
+        assert stats["percentiles"] == pytest.approx(single["percentiles"])
+
+
+def test_summarize_ndvi_stats():
+    assert "summary" in summarize_ndvi_stats({"mean": None, "min": None, "max": None, "count": 0, "percentiles": {}})
+
+    summary = summarize_ndvi_stats({
+        "mean": 0.512, "min": 0.3, "max": 0.71, "count": 321,
+        "percentiles": {"p10": 0.351, "p50": 0.5, "p90": None},
+    })
+    assert (summary["mean_ndvi"], summary["max_ndvi"], summary["min_ndvi"]) == (0.51, 0.71, 0.3)
+    assert summary["valid_pixels"] == 321
+    assert summary["percentiles"] == {"p10": 0.35, "p50": 0.5}
+    assert summary["trend"] == "consistently high"
+    assert summary["key_events"] == ["High vegetation density observed (Max NDVI: 0.71)"]
+
+
+def test_series_periods():
+    assert series_periods("2021-01-15", "2021-04-10") == [
+        ("2021-01-01", "2021-02-01"), ("2021-02-01", "2021-03-01"), ("2021-03-01", "2021-04-01"), ("2021-04-01", "2021-04-10"),
+    ]
+    assert series_periods("2021-11-01", "2022-05-01", interval_months=3) == [
+        ("2021-11-01", "2022-02-01"), ("2022-02-01", "2022-05-01"),
+    ]
+
+
+def test_series_reduces_every_period_in_one_call():
+    lat, lon = SITES[2]
+    calls = fake_ee.getinfo_calls
+    series = reduce_ndvi_series(fake_ee, lat, lon, "2021-01-01", "2023-01-01")
+    assert fake_ee.getinfo_calls - calls == 1
+    assert len(series["periods"]) == len(series["mean"]) == len(series["count"]) == 24
+
+    summary = summarize_ndvi_series(series)
+    assert summary["periods_with_data"] == 24
+    # The synthetic scenes peak in early summer and bottom out in winter
+    assert summary["seasonality"]["peak_month"] in (6, 7, 8)
+    assert summary["seasonality"]["trough_month"] in (12, 1, 2, 3)
+
+
+def test_summarize_ndvi_series_trend_gaps_and_anomalies():
+    periods = [f"{2020 + i // 12}-{i % 12 + 1:02d}-01" for i in range(60)]
+    values = [0.3 + 0.2 * np.sin(2 * np.pi * (i % 12) / 12) + 0.1 * i / 12 for i in range(60)]
+    values[5] = None  # a month without clear scenes
+    values[20] -= 0.4  # a drought
+    summary = summarize_ndvi_series({"periods": periods, "mean": values, "count": [0 if v is None else 50 for v in values]})
+
+    assert summary["trend"]["direction"] == "increasing"
+    assert summary["ndvi"][5] is None and summary["periods_with_data"] == 59
+    assert [anomaly["period"] for anomaly in summary["anomalies"]] == ["2021-09-01"]
+    assert summary["seasonality"]["peak_month"] == 4
+
+    empty = summarize_ndvi_series({"periods": periods[:2], "mean": [None, None], "count": [0, 0]})
+    assert "summary" in empty
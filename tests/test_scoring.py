@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+
+from scoring import NUMERIC_COLUMNS, ComparativeScorer, percentile_ranks
+
+
+def metrics(**values):
+    return {name: float(values.get(name, math.nan)) for name in NUMERIC_COLUMNS}
+
+
+def test_percentile_ranks_share_ties_and_skip_nan():
+    ranks = percentile_ranks([1.0, 2.0, 2.0, np.nan, 4.0])
+    np.testing.assert_allclose(ranks[[0, 1, 2, 4]], [12.5, 50.0, 50.0, 87.5])
+    assert np.isnan(ranks[3])
+
+
+def test_percentile_ranks_lone_value_and_empty():
+    assert percentile_ranks([3.0]).tolist() == [50.0]
+    assert np.isnan(percentile_ranks([np.nan, np.inf])).all()
+    assert percentile_ranks([]).size == 0
+
+
+def test_scores_flip_lower_is_better_and_share_ranks(tmp_path):
+    scorer = ComparativeScorer(str(tmp_path / "impact_scores.csv"))
+    scorer.add("poor", "AA", metrics(poverty_rate=40.0))
+    scorer.add("rich", "BB", metrics(poverty_rate=5.0))
+    scorer.add("rich twin", "CC", metrics(poverty_rate=5.0))
+    scorer.add("unknown", "DD", metrics())
+    table = scorer.scores()
+    assert table["rank"][:3].tolist() == [3.0, 1.0, 1.0]
+    assert np.isnan(table["rank"][3]) and np.isnan(table["score"][3])
+
+
+def test_add_replaces_the_row_for_the_same_location(tmp_path):
+    scorer = ComparativeScorer(str(tmp_path / "impact_scores.csv"))
+    scorer.add("Plot 7", "KE", metrics(lat=-1.3, lon=36.8, ndvi=0.2))
+    scorer.add("Plot 7", "KE", metrics(lat=-1.30001, lon=36.8, ndvi=0.6))
+    assert len(scorer) == 1
+    assert scorer.columns["ndvi"] == [0.6]
+
+
+def test_flush_writes_rows_in_rank_order(tmp_path):
+    path = tmp_path / "impact_scores.csv"
+    scorer = ComparativeScorer(str(path), flush_interval=3600)
+    scorer.add("low", "AA", metrics(ndvi=0.1))
+    scorer.add("high", "BB", metrics(ndvi=0.9, lat=1.5, lon=2.25))
+    assert scorer.flush() and not scorer.flush()
+    header, first, second = path.read_text().splitlines()
+    assert header.startswith("rank,score,location,country,lat,lon,ndvi")
+    assert first.startswith("1,75,high,BB,1.5,2.25,0.9") and second.startswith("2,25,low,AA,,,0.1")
+    # Nothing changed, so even a forced flush leaves the file alone
+    assert not scorer.flush(force=True)
+
+
+def test_existing_table_is_loaded_and_kept_on_flush(tmp_path):
+    path = str(tmp_path / "impact_scores.csv")
+    scorer = ComparativeScorer(path)
+    scorer.add("Nairobi", "KE", metrics(lat=-1.2921, lon=36.8219, ndvi=0.5, gdp=1.0e11))
+    scorer.add("Paris", "FR", metrics(ndvi=0.3))
+    assert scorer.flush(force=True)
+
+    restarted = ComparativeScorer(path)
+    assert len(restarted) == 2 and not restarted.dirty
+    restarted.add("Nairobi", "KE", metrics(lat=-1.2921, lon=36.8219, ndvi=0.7))
+    restarted.add("Lima", "PE", metrics(ndvi=0.1))
+    assert restarted.flush(force=True)
+
+    reloaded = ComparativeScorer(path)
+    assert sorted(label for label, *_ in reloaded.rows) == ["Lima", "Nairobi", "Paris"]
+    assert reloaded.columns["ndvi"][reloaded.rows[("Nairobi", -1.2921, 36.8219)]] == 0.7
@@ -0,0 +1,94 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import indicators
+from sdmx import SdmxGenericParser
+
+HEADER = (
+    b'<?xml version="1.0" encoding="utf-8"?>'
+    b'<message:GenericData xmlns:message="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message" '
+    b'xmlns:generic="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/data/generic">'
+    b'<message:DataSet>'
+)
+FOOTER = b"</message:DataSet></message:GenericData>"
+
+
+def series(area, values):
+    observations = "".join(
+        f'<generic:Obs><generic:ObsDimension value="{year}"/><generic:ObsValue value="{value}"/></generic:Obs>'
+        for year, value in values.items()
+    )
+    return (
+        f'<generic:Series><generic:SeriesKey><generic:Value id="REF_AREA" value="{area}"/>'
+        f'<generic:Value id="MEASURE" value="EXP"/></generic:SeriesKey>{observations}</generic:Series>'
+    ).encode("utf-8")
+
+
+MESSAGE = HEADER + series("FRA", {2020: 1.5, 2021: "NaN"}) + series("DEU", {2020: 2.5, 2021: 3.0}) + series("ITA", {2021: 4.0}) + FOOTER
+
+
+def test_parser_reads_every_observation():
+    parser = SdmxGenericParser()
+    # Chunk boundaries fall anywhere, including inside tags
+    for start in range(0, len(MESSAGE), 7):
+        parser.feed(MESSAGE[start:start + 7])
+    table = parser.close()
+    assert table.dimensions == ["REF_AREA", "MEASURE", "TIME_PERIOD"]
+    # The NaN observation is left out
+    assert table.lookup("REF_AREA", "TIME_PERIOD") == {
+        ("FRA", "2020"): 1.5, ("DEU", "2020"): 2.5, ("DEU", "2021"): 3.0, ("ITA", "2021"): 4.0,
+    }
+
+
+def test_parser_stops_once_every_wanted_observation_was_seen():
+    parser = SdmxGenericParser(wanted={("DEU", "2021")})
+    parser.feed(MESSAGE)
+    assert parser.done
+    # Nothing after the wanted observation is parsed
+    assert parser.table.lookup("REF_AREA", "TIME_PERIOD") == {("FRA", "2020"): 1.5, ("DEU", "2020"): 2.5, ("DEU", "2021"): 3.0}
+
+
+def test_parser_without_matches_has_an_empty_lookup():
+    parser = SdmxGenericParser(wanted={("USA", "2021")})
+    parser.feed(HEADER + FOOTER)
+    assert not parser.done
+    assert parser.close().lookup("REF_AREA", "TIME_PERIOD") == {}
+
+
+def test_expenditure_from_the_stub_is_cached(stub_server, fresh_cache, monkeypatch):
+    monkeypatch.setattr(indicators, "OECD_EXPENDITURE_URL", f"{stub_server.base_url}/oecd/data")
+
+    async def lookup():
+        service = indicators.IndicatorService()
+        try:
+            return await service.expenditure_values(["FRA", "DEU"]), await service.expenditure_values(["FRA"])
+        finally:
+            await service.close()
+
+    first, second = asyncio.run(lookup())
+    assert first == {"FRA": 111320000000.0, "DEU": 152610000000.0}
+    assert second == {"FRA": 111320000000.0}
+    assert sum(stub_server.calls.values()) == 1
+
+
+def test_unparseable_expenditure_response_gives_no_value(fresh_cache, monkeypatch):
+    # An HTML error page served as a 200 in place of SDMX-ML
+    async def error_page(request):
+        return web.Response(text="<html><body>Service unavailable", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/oecd/data/{key}", error_page)
+
+    async def lookup():
+        async with TestServer(app) as server:
+            monkeypatch.setattr(indicators, "OECD_EXPENDITURE_URL", str(server.make_url("/oecd/data")))
+            service = indicators.IndicatorService()
+            try:
+                return await service.expenditure_values(["FRA"])
+            finally:
+                await service.close()
+
+    assert asyncio.run(lookup()) == {"FRA": None}
+    assert fresh_cache.get("oecd", {"country": "FRA", "year": indicators.EXPENDITURE_YEAR}) is None
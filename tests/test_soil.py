@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+import soil
+from soil import get_soil_data, has_soil_values, haversine_km, ring_points, soil_report
+from benchmarks.stub_server import load_fixture
+from weather_fetch import TokenBucket
+
+QUERY_PATH = "/soilgrids/v2.0/properties/query"
+
+
+def test_ring_points_are_nearest_first():
+    assert ring_points(51.5012, -0.1234, 0) == [(51.5, -0.12)]
+    points = ring_points(51.5012, -0.1234, 1)
+    distances = [haversine_km(51.5012, -0.1234, *point) for point in points]
+    assert len(points) == 8 and distances == sorted(distances)
+
+
+@pytest.fixture
+def soilgrids(stub_server, fresh_cache, monkeypatch):
+    monkeypatch.setattr(soil, "SOILGRIDS_URL", stub_server.base_url + QUERY_PATH)
+    return stub_server
+
+
+def empty_within(stub, lat, lon, km):
+    # Points within `km` of the site report no data, as over water
+    make = stub.make_soilgrids
+
+    def make_soilgrids(p_lat, p_lon):
+        response = make(p_lat, p_lon)
+        if haversine_km(lat, lon, p_lat, p_lon) < km:
+            for layer in response["properties"]["layers"]:
+                for depth in layer["depths"]:
+                    depth["values"]["mean"] = None
+        return response
+
+    stub.make_soilgrids = make_soilgrids
+
+
+def search(*args, **kwargs):
+    # A generous budget so the quota does not slow the tests down
+    return asyncio.run(get_soil_data(*args, limiter=TokenBucket(rate=1000, capacity=100), **kwargs))
+
+
+def test_site_with_data_uses_one_call(soilgrids):
+    empty_within(soilgrids, 51.5, -0.12, 0)
+    soil_data = search(51.5, -0.12)
+    assert soil_data["probe"]["ring"] == 0
+    assert soilgrids.calls[QUERY_PATH] == 1
+
+    # The point is cached now
+    assert search(51.5, -0.12)["probe"] == soil_data["probe"]
+    assert soilgrids.calls[QUERY_PATH] == 1
+
+
+def test_search_stops_at_the_nearest_valid_point(soilgrids):
+    empty_within(soilgrids, 48.85, 2.35, 1.2)
+    soil_data = search(48.85, 2.35)
+    probe = soil_data["probe"]
+    assert probe["ring"] == 1 and probe["distance_km"] >= 1.2
+    nearest_valid = min(
+        haversine_km(48.85, 2.35, *point) for point in ring_points(48.85, 2.35, 1)
+        if haversine_km(48.85, 2.35, *point) >= 1.2
+    )
+    assert probe["distance_km"] == round(nearest_valid, 3)
+
+
+def test_nothing_found_is_an_error(soilgrids):
+    empty_within(soilgrids, 10.0, 10.0, 1000)
+    assert "error" in search(10.0, 10.0, max_rings=1)
+    assert soilgrids.calls[QUERY_PATH] == 9
+
+
+def test_should_pause_stops_the_search(soilgrids):
+    empty_within(soilgrids, 10.0, 10.0, 1000)
+    assert search(10.0, 10.0, should_pause=lambda: soilgrids.calls.get(QUERY_PATH, 0) >= 3) is None
+    assert soilgrids.calls[QUERY_PATH] == 3
+
+
+def test_values_only_below_the_surface_are_valid_and_reported():
+    # Only the second depth of each property has a value, as SoilGrids returns for some sites
+    deeper = load_fixture("soilgrids.json")
+    for layer in deeper["properties"]["layers"]:
+        layer["depths"][0]["values"]["mean"] = None
+    assert has_soil_values(deeper)
+    report = soil_report(deeper)
+    assert len(report["layers"]) == len(deeper["properties"]["layers"])
+    assert {layer["depth"] for layer in report["layers"]} == {"0-30cm"}
+
+    for layer in deeper["properties"]["layers"]:
+        for depth in layer["depths"]:
+            depth["values"]["mean"] = None
+    assert not has_soil_values(deeper) and soil_report(deeper)["layers"] == []
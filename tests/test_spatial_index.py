@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+import spatial_index
+from spatial_index import GridIndex, LocationIndex, haversine_km
+
+
+def brute_force(points, lat, lon, radius_km):
+    within = [(haversine_km(lat, lon, p_lat, p_lon), p_lat, p_lon) for p_lat, p_lon in points]
+    within = [item for item in within if item[0] <= radius_km]
+    return min(within, default=None)
+
+
+@pytest.mark.parametrize("radius_km", [0.1, 2.0, 50.0])
+def test_nearest_matches_a_full_scan(radius_km):
+    rng = random.Random(radius_km)
+    grid = GridIndex(radius_km)
+    points = [(rng.uniform(-89, 89), rng.uniform(-180, 180)) for _ in range(2000)]
+    # Clusters, so small radii find something too
+    points += [(lat + rng.gauss(0, 0.01), lon + rng.gauss(0, 0.01)) for lat, lon in points[:200]]
+    for lat, lon in points:
+        grid.add(lat, lon)
+
+    for lat, lon in points[:300:3] + [(rng.uniform(-89, 89), rng.uniform(-180, 180)) for _ in range(100)]:
+        lat, lon = lat + rng.gauss(0, 0.005), lon + rng.gauss(0, 0.005)
+        expected = brute_force(points, lat, lon, radius_km)
+        found = grid.nearest(lat, lon, radius_km)
+        if expected is None:
+            assert found is None
+        else:
+            assert found == (expected[1], expected[2], pytest.approx(expected[0]))
+
+
+def test_nearest_across_the_antimeridian_and_near_the_poles():
+    grid = GridIndex(5.0)
+    grid.add(10.0, 179.99)
+    grid.add(89.99, 0.0)
+    assert grid.nearest(10.0, -179.99, 5.0)[:2] == (10.0, 179.99)
+    # Near the pole a few km spans many degrees of longitude
+    assert grid.nearest(89.98, 120.0, 5.0)[:2] == (89.99, 0.0)
+    assert grid.nearest(10.0, -179.9, 5.0) is None
+
+
+def test_duplicate_points_are_stored_once():
+    grid = GridIndex(1.0)
+    grid.add(1.0, 2.0)
+    grid.add(1.0, 2.0)
+    assert grid.size == 1
+
+
+def test_location_index_persists_and_sees_other_processes(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    index = LocationIndex(path, radii={"weather": 2.0, "ndvi": 0.0})
+    index.add("weather", -1.29, 36.82)
+    index.add("ndvi", -1.29, 36.82)
+    assert index.nearest("weather", -1.30, 36.82)[:2] == (-1.29, 36.82)
+    assert index.nearest("weather", -1.40, 36.82) is None
+    # A radius of 0 turns reuse off for that source
+    assert index.nearest("ndvi", -1.29, 36.82) is None
+
+    other = LocationIndex(path, radii={"weather": 2.0, "ndvi": 0.0})
+    assert other.stats() == {"weather": {"locations": 1, "radius_km": 2.0}, "ndvi": {"locations": 0, "radius_km": 0.0}}
+
+    # Locations another process adds show up after the refresh interval
+    index.add("weather", 51.5, -0.12)
+    monkeypatch.setattr(spatial_index, "REFRESH_INTERVAL", 0.0)
+    assert other.nearest("weather", 51.5, -0.12)[:2] == (51.5, -0.12)
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import warming
+from warming import WARMING_SOURCE, WarmItem, Warmer, within_hours
+
+HOUR = 3600
+
+
+def site(name, priority=1):
+    return WarmItem("site", f"site:{name}", {"city": name}, priority)
+
+
+def country(code, priority=1):
+    return WarmItem("country", f"country:{code}", {"country": code}, priority)
+
+
+def make_warmer(items, warm_site=None, warm_countries=None, is_busy=lambda: False):
+    async def nothing(*args):
+        return {}
+
+    warmer = Warmer(items, warm_site or nothing, warm_countries or nothing, is_busy)
+    # No live request for longer than the quiet period
+    warmer.last_live = time.monotonic() - warming.WARM_QUIET_SECONDS - 1
+    return warmer
+
+
+def warmed_ago(cache, item, seconds, now):
+    cache.set(WARMING_SOURCE, {"item": item.key}, {"warmed": now - seconds})
+
+
+def test_due_orders_by_priority_times_overdue(fresh_cache):
+    now = time.time()
+    never, important, slightly, fresh, stale_country = (
+        site("never"), site("important", priority=3), site("slightly"), country("KE", priority=2), country("FR"),
+    )
+    warmed_ago(fresh_cache, important, 48 * HOUR, now)  # 3 x 2 intervals
+    warmed_ago(fresh_cache, slightly, 30 * HOUR, now)  # 1 x 1.25 intervals
+    warmed_ago(fresh_cache, fresh, 24 * HOUR, now)  # countries refresh every 6 days
+    warmed_ago(fresh_cache, stale_country, 7 * 24 * HOUR, now)  # 1 x 1.17 intervals
+
+    warmer = make_warmer([slightly, fresh, stale_country, important, never])
+    # Never warmed counts as ten intervals overdue
+    assert [item.key for item in warmer.due(now)] == ["site:never", "site:important", "site:slightly", "country:FR"]
+
+    warmer.mark_warmed(never)
+    assert "site:never" not in [item.key for item in warmer.due()]
+
+
+def test_pass_warms_sites_then_countries_and_adds_site_countries(fresh_cache):
+    warmed_sites, warmed_countries = [], []
+
+    async def warm_site(spec, should_pause):
+        warmed_sites.append(spec["city"])
+        return {"country_code": "ke"}
+
+    async def warm_countries(codes):
+        warmed_countries.append(codes)
+
+    warmer = make_warmer([country("FR"), site("Nairobi", priority=2), site("Mombasa")], warm_site, warm_countries)
+    asyncio.run(warmer.run_once())
+    assert warmed_sites == ["Nairobi", "Mombasa"]
+    assert warmed_countries == [["FR"]]
+    # The sites' country is warmed on the next pass
+    assert [item.key for item in warmer.due()] == ["country:KE"]
+
+
+def test_live_traffic_pauses_the_pass(fresh_cache):
+    warmed_sites = []
+    busy = [False]
+
+    async def warm_site(spec, should_pause):
+        warmed_sites.append(spec["city"])
+        busy[0] = True
+        return {}
+
+    warmer = make_warmer([site("a", priority=3), site("b", priority=2), country("FR")], warm_site, is_busy=lambda: busy[0])
+    asyncio.run(warmer.run_once())
+    assert warmed_sites == ["a"]
+    assert [item.key for item in warmer.due()] == ["site:b", "country:FR"]
+
+    # A request arriving starts the quiet period again
+    busy[0] = False
+    warmer.note_live_request()
+    assert warmer.should_pause()
+
+
+def test_site_stopped_part_way_stays_due(fresh_cache):
+    async def warm_site(spec, should_pause):
+        return None
+
+    warmer = make_warmer([site("a"), site("b")], warm_site)
+    asyncio.run(warmer.run_once())
+    assert len(warmer.due()) == 2
+
+
+def test_failed_site_does_not_stop_the_pass(fresh_cache):
+    async def warm_site(spec, should_pause):
+        if spec["city"] == "a":
+            raise RuntimeError("boom")
+        return {}
+
+    warmer = make_warmer([site("a", priority=2), site("b")], warm_site)
+    asyncio.run(warmer.run_once())
+    assert [item.key for item in warmer.due()] == ["site:a"]
+
+
+def test_within_hours():
+    def at(hour):
+        return datetime(2024, 1, 1, hour, tzinfo=timezone.utc)
+
+    assert within_hours("", at(12))
+    assert within_hours("9-17", at(9)) and not within_hours("9-17", at(17))
+    # Ranges may wrap past midnight
+    assert within_hours("22-6", at(23)) and within_hours("22-6", at(0)) and not within_hours("22-6", at(12))
+
+
+class FakeIndicatorService:
+    def __init__(self, table):
+        self.table = table
+        self.cached = []
+
+    async def refresh_world_bank(self, countries):
+        return {country: {"NY.GDP.MKTP.CD": (1.0, "2021", f"{country}X", country)} for country in countries}
+
+    async def fetch_expenditure(self, iso3_codes):
+        return self.table
+
+    def cache_expenditure(self, table):
+        self.cached.append(table)
+
+
+def test_refresh_economic_data_caches_what_arrived():
+    service = FakeIndicatorService(table="table")
+    asyncio.run(warming.refresh_economic_data(service, ["KE", "FR"]))
+    assert service.cached == ["table"]
+
+
+def test_failed_oecd_refresh_keeps_countries_due():
+    service = FakeIndicatorService(table=None)
+    with pytest.raises(RuntimeError, match="OECD request"):
+        asyncio.run(warming.refresh_economic_data(service, ["KE"]))
+    assert service.cached == []
@@ -0,0 +1,144 @@
+import json
+import math
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from weather_series import WeatherSeries, aggregate_weather_data
+from weather_store import day_records, to_series
+
+
+def baseline_aggregate(weather_data):
+    # aggregate_weather_data as it was before the columnar rewrite, kept as the reference
+    temp_min = min([day['temperature']['min'] for day in weather_data])
+    temp_max = max([day['temperature']['max'] for day in weather_data])
+    temp_avg = sum([day['temperature']['afternoon'] for day in weather_data]) / len(weather_data)
+    humidity_avg = sum([day['humidity']['afternoon'] for day in weather_data]) / len(weather_data)
+    total_precipitation = sum([day['precipitation']['total'] for day in weather_data])
+
+    key_events = []
+    for day in weather_data:
+        if day['temperature']['max'] == temp_max:
+            key_events.append(f"Highest temperature recorded on {day['date']} with {temp_max}K")
+        if day['precipitation']['total'] > 10:  # Arbitrary threshold for notable rainfall
+            key_events.append(f"Notable rainfall of {day['precipitation']['total']}mm on {day['date']}")
+
+    return {
+        "temperature": {
+            "min": temp_min,
+            "max": temp_max,
+            "average": temp_avg
+        },
+        "humidity": {
+            "average": humidity_avg
+        },
+        "total_precipitation": total_precipitation,
+        "key_events": key_events
+    }
+
+
+def day_summaries(days, seed=0, start=date(2023, 1, 1)):
+    # Date-ordered documents in the day_summary shape, values with the API's two decimals
+    rng = random.Random(seed)
+    documents = []
+    for i in range(days):
+        high = round(rng.uniform(270, 306), 2)
+        documents.append({
+            "date": (start + timedelta(days=i)).isoformat(),
+            "temperature": {"min": round(high - rng.uniform(2, 12), 2), "max": high, "afternoon": round(high - 1.5, 2)},
+            # Whole numbers, as the API sends humidity
+            "humidity": {"afternoon": rng.randint(20, 100)},
+            "precipitation": {"total": round(rng.expovariate(0.4), 2) if rng.random() < 0.4 else 0},
+        })
+    # A tie for the hottest day, which must be reported twice
+    documents[-1]["temperature"]["max"] = max(day["temperature"]["max"] for day in documents)
+    return documents
+
+
+@pytest.mark.parametrize("days, seed", [(1, 0), (31, 1), (400, 2), (1100, 3)])
+def test_results_match_the_baseline_aggregation(days, seed):
+    documents = day_summaries(days, seed)
+    expected = baseline_aggregate(documents)
+    for weather_data in (documents, WeatherSeries.from_day_summaries(documents)):
+        result = aggregate_weather_data(weather_data)
+        assert result["temperature"] == expected["temperature"]
+        assert result["humidity"] == expected["humidity"]
+        assert result["total_precipitation"] == expected["total_precipitation"]
+        assert result["key_events"] == expected["key_events"]
+
+
+def test_statistics_cover_months_seasons_and_runs():
+    documents = day_summaries(365, seed=4)
+    statistics = aggregate_weather_data(documents)["statistics"]
+    assert [month["period"] for month in statistics["monthly"]][:2] == ["2023-01", "2023-02"]
+    assert sum(month["days"] for month in statistics["monthly"]) == 365
+    # December 2023 belongs to the 2024 winter
+    assert sorted(season["period"] for season in statistics["seasonal"]) == [
+        "2023-DJF", "2023-JJA", "2023-MAM", "2023-SON", "2024-DJF",
+    ]
+    precipitation = [day["precipitation"]["total"] for day in documents]
+    best_week = max(sum(precipitation[i:i + 7]) for i in range(len(precipitation) - 6))
+    assert statistics["rolling"]["7_day"]["max_precipitation"]["value"] == round(best_week, 2)
+    assert statistics["dry_spell"]["days"] >= 1
+
+
+def test_empty_series_is_an_error():
+    with pytest.raises(ValueError):
+        aggregate_weather_data([])
+
+
+def stored_series(documents, missing):
+    # The series as read back from the weather store, with `missing` fields blanked per day index
+    records = day_records(documents)
+    for i, name in missing:
+        records[name][i] = np.nan
+    return to_series(records)
+
+
+def test_missing_values_are_left_out_of_the_aggregates():
+    documents = day_summaries(60, seed=5)
+    gaps = [(3, "humidity"), (4, "humidity"), (10, "precipitation"), (20, "temp_max"), (21, "temp_afternoon")]
+    result = aggregate_weather_data(stored_series(documents, gaps))
+
+    def kept(path, name):
+        return [value for i, value in enumerate(day[path[0]][path[1]] for day in documents) if (i, name) not in gaps]
+
+    assert result["humidity"]["average"] == pytest.approx(np.mean(kept(("humidity", "afternoon"), "humidity")))
+    assert result["temperature"]["average"] == pytest.approx(np.mean(kept(("temperature", "afternoon"), "temp_afternoon")))
+    assert result["temperature"]["max"] == max(kept(("temperature", "max"), "temp_max"))
+    assert result["total_precipitation"] == pytest.approx(sum(kept(("precipitation", "total"), "precipitation")))
+
+    statistics = result["statistics"]
+    # Nothing NaN is left for JSON
+    json.dumps(result, allow_nan=False)
+    assert statistics["monthly"][0]["humidity_avg"] == round(np.mean(kept(("humidity", "afternoon"), "humidity")[:29]), 2)
+
+
+def test_windows_with_a_missing_day_are_skipped():
+    documents = day_summaries(10, seed=6)
+    for i, day in enumerate(documents):
+        day["precipitation"]["total"] = 50.0 if i == 2 else 1.0
+    rolling = aggregate_weather_data(stored_series(documents, [(5, "precipitation")]))["statistics"]["rolling"]
+    # Every 7-day window over 10 days includes day 5, so none is complete
+    assert rolling["7_day"]["max_precipitation"] is None
+    assert rolling["30_day"]["max_precipitation"] is None
+
+    rolling = aggregate_weather_data(stored_series(day_summaries(20, seed=7), [(0, "precipitation")]))["statistics"]["rolling"]
+    assert rolling["7_day"]["max_precipitation"]["end"] >= "2023-01-08"
+
+
+def test_a_period_without_values_reports_none():
+    documents = day_summaries(45, seed=8)
+    january = [(i, "humidity") for i in range(31)]
+    statistics = aggregate_weather_data(stored_series(documents, january))["statistics"]
+    assert statistics["monthly"][0]["humidity_avg"] is None
+    assert statistics["monthly"][1]["humidity_avg"] is not None
+    assert not math.isnan(statistics["percentiles"]["precipitation"]["p50"])
+
+
+def test_a_field_missing_on_every_day_is_an_error():
+    documents = day_summaries(5, seed=9)
+    with pytest.raises(ValueError, match="humidity"):
+        aggregate_weather_data(stored_series(documents, [(i, "humidity") for i in range(5)]))
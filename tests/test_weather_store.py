@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from weather_store import (
+    DAY_DTYPE, append_days, day_records, load_days, missing_dates, select_range, to_day_summaries,
+)
+
+
+def records_for(days, temp_max=300.0):
+    return day_records([
+        {"date": day, "temperature": {"min": 280.0, "max": temp_max, "afternoon": 290.0}, "precipitation": {"total": 1.5}}
+        for day in days
+    ])
+
+
+def test_day_records_store_missing_fields_as_nan():
+    records = records_for(["2024-01-01"])
+    assert records.dtype == DAY_DTYPE
+    assert records["temp_max"][0] == 300.0
+    assert np.isnan(records["humidity"][0]) and np.isnan(records["wind_speed"][0])
+
+
+def test_day_summaries_round_trip():
+    documents = [{
+        "date": "2024-01-01",
+        "temperature": {"min": 280.15, "max": 290.5, "afternoon": 288.0, "morning": 282.3},
+        "humidity": {"afternoon": 71},
+        "precipitation": {"total": 0.25},
+        "pressure": {"afternoon": 1013.2},
+        "wind": {"max": {"speed": 7.7, "direction": 250}},
+    }]
+    (day,) = to_day_summaries(day_records(documents), 1.0, 2.0)
+    assert (day["lat"], day["lon"], day["date"]) == (1.0, 2.0, "2024-01-01")
+    for key in ("temperature", "humidity", "precipitation", "pressure", "wind"):
+        assert day[key] == documents[0][key]
+    # Fields the document did not have stay out
+    assert "cloud_cover" not in day and "evening" not in day["temperature"]
+
+
+def test_append_days_merges_sorted_and_prefers_new_records(tmp_path):
+    store_dir = str(tmp_path)
+    assert load_days(1.0, 2.0, store_dir).size == 0
+
+    append_days(1.0, 2.0, records_for(["2024-01-03", "2024-01-01"]), store_dir)
+    merged = append_days(1.0, 2.0, records_for(["2024-01-02", "2024-01-03"], temp_max=310.0), store_dir)
+
+    stored = load_days(1.0, 2.0, store_dir)
+    assert isinstance(stored, np.memmap)
+    assert stored.tobytes() == merged.tobytes()
+    assert stored["date"].astype(str).tolist() == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert stored["temp_max"].tolist() == [300.0, 310.0, 310.0]
+    assert select_range(stored, date(2024, 1, 2), date(2024, 1, 3)).size == 2
+    assert select_range(stored, date(2024, 1, 4), date(2024, 1, 9)).size == 0
+    assert not [name for name in tmp_path.iterdir() if name.suffix == ".tmp"]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_load_days_mmap_flag(tmp_path, mmap):
+    append_days(1.0, 2.0, records_for(["2024-01-01"]), str(tmp_path))
+    assert isinstance(load_days(1.0, 2.0, str(tmp_path), mmap=mmap), np.memmap) is mmap
+
+
+def test_missing_dates_lists_gaps_inclusive():
+    records = records_for(["2024-01-01", "2024-01-03"])
+    missing = missing_dates(records, date(2024, 1, 1), date(2024, 1, 4))
+    assert missing.tolist() == [date(2024, 1, 2), date(2024, 1, 4)]
+    assert missing_dates(np.empty(0, dtype=DAY_DTYPE), date(2024, 1, 1), date(2024, 1, 1)).size == 1
+    assert missing_dates(records, date(2024, 1, 3), date(2024, 1, 3)).size == 0
+
+
+def test_concurrent_appends_keep_every_day(tmp_path):
+    # Worker threads merging into the same file at once must not lose each other's days
+    start = date(2024, 1, 1)
+    chunks = [[(start + timedelta(days=10 * i + d)).isoformat() for d in range(10)] for i in range(8)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda days: append_days(1.0, 2.0, records_for(days), str(tmp_path)), chunks))
+    assert load_days(1.0, 2.0, str(tmp_path)).size == 80
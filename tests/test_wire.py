@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+# wire builds uagents messages, so it needs the agent dependencies installed
+pytest.importorskip("uagents")
+
+from wire import WIRE_SCALE, negotiate, pack_array, unpack_array  # noqa: E402
+
+
+@pytest.mark.parametrize("values, encoding", [
+    (np.arange("2024-01-01", "2024-03-01", dtype="datetime64[D]"), "delta-int16"),
+    (np.array([3, -7, 2 ** 40, 0], dtype="int64"), "delta-int64"),
+    (np.array([True, False, True]), "delta-int16"),
+    (np.array([281.15, 282.4, -3.05, 0.0]), "delta-int16"),
+    (np.array([[1.25, 2.5], [3.75, 5.0]], dtype="float32"), "delta-int16"),
+    (np.array([], dtype="float64"), "delta-int16"),
+])
+def test_round_trip_delta_encoded(values, encoding):
+    packed = pack_array(values)
+    assert packed.encoding == encoding
+    unpacked = unpack_array(packed)
+    assert unpacked.dtype == values.dtype and unpacked.shape == values.shape
+    np.testing.assert_array_equal(unpacked, values)
+
+
+@pytest.mark.parametrize("values", [
+    np.array([1.0, np.nan, np.inf]),
+    np.array([0.123456789, 2.0]),
+    np.array([1.0e16, 2.0]),
+])
+def test_round_trip_raw_floats(values):
+    packed = pack_array(values)
+    assert packed.encoding == "raw"
+    np.testing.assert_array_equal(unpack_array(packed), values)
+
+
+def test_custom_scale():
+    values = np.array([0.123, 0.456, 0.789])
+    packed = pack_array(values, scale=1000)
+    assert packed.encoding.startswith("delta-") and packed.scale == 1000
+    np.testing.assert_array_equal(unpack_array(packed), values)
+    assert pack_array(values, scale=WIRE_SCALE).encoding == "raw"
+
+
+def test_unknown_encoding_is_refused():
+    packed = pack_array(np.arange(3))
+    packed.encoding = "delta-int8"
+    with pytest.raises(ValueError):
+        unpack_array(packed)
+
+
+def test_negotiate_falls_back_to_version_1():
+    assert negotiate([1, 2]) == 2
+    assert negotiate([7]) == 1
+    assert negotiate(None) == 1
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from cache import get_cache
+from metrics import registry, stage
+from weather_fetch import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# JSON file listing the sites and countries to keep warm; empty turns warming off.
+# {"sites": [{"city": "Nairobi", "country": "KE", "priority": 3}, {"lat": -1.3, "lon": 36.8, "label": "Plot 7"}],
+#  "countries": [{"country": "KE", "priority": 2}]}
+WARM_CATALOGUE = os.getenv("WARM_CATALOGUE", "")
+# Seconds between scheduler ticks
+WARM_INTERVAL = float(os.getenv("WARM_INTERVAL", "60"))
+# Warming waits until no live request has arrived for this long
+WARM_QUIET_SECONDS = float(os.getenv("WARM_QUIET_SECONDS", "120"))
+# UTC hours warming may run in, e.g. "22-6"; empty means any time the agent is idle
+WARM_HOURS = os.getenv("WARM_HOURS", "")
+# How often each kind of entry is refreshed. Sites gain a day of weather daily; World Bank
+# and OECD entries are cached for a week.
+WARM_SITE_REFRESH_SECONDS = float(os.getenv("WARM_SITE_REFRESH_HOURS", "24")) * 3600
+WARM_COUNTRY_REFRESH_SECONDS = float(os.getenv("WARM_COUNTRY_REFRESH_DAYS", "6")) * 86400
+# OpenWeather calls per minute warming may use, on top of staying inside the shared quota,
+# so live requests always have headroom
+WARM_OPEN_WEATHER_CALLS_PER_MINUTE = float(os.getenv("WARM_OPEN_WEATHER_CALLS_PER_MINUTE", "120"))
+# SoilGrids calls per minute warming may use, likewise inside the shared 5 calls/min
+WARM_SOILGRIDS_CALLS_PER_MINUTE = float(os.getenv("WARM_SOILGRIDS_CALLS_PER_MINUTE", "1"))
+# Earth Engine requests per minute warming may start; live requests are not throttled here
+WARM_EARTH_ENGINE_CALLS_PER_MINUTE = float(os.getenv("WARM_EARTH_ENGINE_CALLS_PER_MINUTE", "6"))
+
+# Cache source holding when each catalogue entry was last warmed
+WARMING_SOURCE = "warming"
+
+warm_weather_limiter = TokenBucket(rate=WARM_OPEN_WEATHER_CALLS_PER_MINUTE / 60.0, capacity=1)
+warm_soilgrids_limiter = TokenBucket(rate=WARM_SOILGRIDS_CALLS_PER_MINUTE / 60.0, capacity=1)
+warm_earth_engine_limiter = TokenBucket(rate=WARM_EARTH_ENGINE_CALLS_PER_MINUTE / 60.0, capacity=1)
+
+
+class WarmingPaused(Exception):
+    """
+    Raised by a warming stage that stopped part way because live traffic arrived.
+    """
+
+
+class WarmItem:
+    def __init__(self, kind, key, spec, priority=1.0):
+        self.kind = kind
+        self.key = key
+        self.spec = spec
+        self.priority = float(priority)
+
+    @property
+    def refresh_seconds(self):
+        return WARM_SITE_REFRESH_SECONDS if self.kind == "site" else WARM_COUNTRY_REFRESH_SECONDS
+
+
+def load_catalogue(path=WARM_CATALOGUE):
+    """
+    Reads the warming catalogue.
+
+    Returns:
+    - list of WarmItem; empty if no catalogue is configured
+    """
+    if not path:
+        return []
+    with open(path) as catalogue_file:
+        catalogue = json.load(catalogue_file)
+
+    items = []
+    for site in catalogue.get("sites", []):
+        if site.get("lat") is not None:
+            key = f"site:{site['lat']},{site['lon']}"
+        else:
+            key = "site:" + ",".join(site.get(part, "").strip().lower() for part in ("city", "state", "country"))
+        items.append(WarmItem("site", key, site, site.get("priority", 1)))
+    for country in catalogue.get("countries", []):
+        code = country["country"].strip().upper()
+        items.append(WarmItem("country", f"country:{code}", dict(country, country=code), country.get("priority", 1)))
+    logger.info(f"Warming catalogue {path}: {len(items)} entries")
+    return items
+
+
+def within_hours(hours, now=None):
+    # True when `now` (UTC) falls in a "start-end" hour range; the range may wrap past midnight
+    if not hours:
+        return True
+    start, end = (int(part) for part in hours.split("-"))
+    hour = (now or datetime.now(timezone.utc)).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+class Warmer:
+    """
+    Keeps the catalogue's sites and countries fresh in the caches and the weather store.
+
+    Each tick picks the entries that are due, most overdue (weighted by priority) first,
+    and warms them one at a time in the background. Warming only starts when no live
+    request is running or has arrived within WARM_QUIET_SECONDS, and a running pass stops
+    between steps as soon as one does.
+
+    Parameters:
+    - warm_site: async callable (spec, should_pause) returning the collected data, or None
+      if it stopped early
+    - warm_countries: async callable taking a list of country codes
+    - is_busy: callable returning True while live requests are in progress
+    """
+
+    def __init__(self, items, warm_site, warm_countries, is_busy):
+        self.items = {item.key: item for item in items}
+        self.warm_site = warm_site
+        self.warm_countries = warm_countries
+        self.is_busy = is_busy
+        self.last_live = 0.0
+        self._task = None
+
+    def note_live_request(self):
+        self.last_live = time.monotonic()
+
+    def should_pause(self):
+        return (
+            self.is_busy()
+            or time.monotonic() - self.last_live < WARM_QUIET_SECONDS
+            or not within_hours(WARM_HOURS)
+        )
+
+    @staticmethod
+    def last_warmed(item):
+        state = get_cache().get(WARMING_SOURCE, {"item": item.key})
+        return state["warmed"] if state else None
+
+    def mark_warmed(self, item):
+        get_cache().set(WARMING_SOURCE, {"item": item.key}, {"warmed": time.time()})
+
+    def due(self, now=None):
+        """
+        Returns:
+        - the entries past their refresh interval, highest priority times overdue ratio first.
+          Entries never warmed count as ten intervals overdue.
+        """
+        now = now or time.time()
+        scored = []
+        for item in self.items.values():
+            warmed = self.last_warmed(item)
+            overdue = 10.0 if warmed is None else (now - warmed) / item.refresh_seconds
+            if overdue >= 1:
+                scored.append((item.priority * overdue, item))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [item for _, item in scored]
+
+    def tick(self):
+        # Called on every interval; starts a pass unless one is running or the agent is busy
+        if not self.items or (self._task is not None and not self._task.done()) or self.should_pause():
+            return
+        self._task = asyncio.create_task(self.run_once())
+
+    async def run_once(self):
+        due = self.due()
+        if not due:
+            return
+        logger.info(f"Warming {len(due)} catalogue entries")
+        countries = [item for item in due if item.kind == "country"]
+        for item in due:
+            if self.should_pause():
+                logger.info("Live traffic; pausing cache warming")
+                registry.inc("warm_pauses_total")
+                return
+            if item.kind != "site":
+                continue
+            try:
+                with stage("warm_site"):
+                    collected = await self.warm_site(item.spec, self.should_pause)
+            except Exception as e:
+                logger.error(f"Warming {item.key} failed: {e!r}")
+                registry.inc("warm_items_total", kind="site", outcome="error")
+                continue
+            if collected is None:
+                # Stopped for live traffic; the entry stays due and resumes where it left off
+                registry.inc("warm_pauses_total")
+                return
+            self.mark_warmed(item)
+            registry.inc("warm_items_total", kind="site", outcome="ok")
+            # Economic data for the site's country is warmed along with the listed countries
+            country_code = collected.get("country_code")
+            if country_code and f"country:{country_code.upper()}" not in self.items:
+                self.items[f"country:{country_code.upper()}"] = WarmItem("country", f"country:{country_code.upper()}",
+                                                                         {"country": country_code.upper()}, item.priority)
+
+        if countries and not self.should_pause():
+            # One World Bank query and one OECD query cover every due country
+            try:
+                with stage("warm_countries"):
+                    await self.warm_countries([item.spec["country"] for item in countries])
+            except Exception as e:
+                logger.error(f"Warming economic data failed: {e!r}")
+                registry.inc("warm_items_total", len(countries), kind="country", outcome="error")
+                return
+            for item in countries:
+                self.mark_warmed(item)
+            registry.inc("warm_items_total", len(countries), kind="country", outcome="ok")
+
+
+async def refresh_economic_data(service, countries):
+    """
+    Fetches the World Bank and OECD values for the given countries again, for Warmer.
+    Cached entries are only replaced by values that arrived, so a failed refresh leaves
+    the previous ones for live requests.
+
+    Raises:
+    - the World Bank request's error, or RuntimeError if the OECD request failed, so the
+      countries stay due
+    """
+    from indicators import GDP_INDICATOR
+
+    world_bank = await service.refresh_world_bank(countries)
+    iso3_codes = sorted({values[GDP_INDICATOR][2] for values in world_bank.values() if values[GDP_INDICATOR][2]})
+    if iso3_codes:
+        table = await service.fetch_expenditure(iso3_codes)
+        if table is None:
+            raise RuntimeError(f"OECD request for {iso3_codes} failed")
+        service.cache_expenditure(table)
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+from metrics import record_call, record_retry
+
+logger = logging.getLogger(__name__)
+
+# OpenWeather quota. Set these to match the subscription the API key belongs to.
+OPEN_WEATHER_CALLS_PER_MINUTE = float(os.getenv("OPEN_WEATHER_CALLS_PER_MINUTE", "600"))
+OPEN_WEATHER_BURST = int(os.getenv("OPEN_WEATHER_BURST", "10"))
+OPEN_WEATHER_MAX_IN_FLIGHT = int(os.getenv("OPEN_WEATHER_MAX_IN_FLIGHT", "8"))
+
+# Retry policy for throttled or failing calls
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_CAP = 30.0  # seconds
+REQUEST_TIMEOUT = 30  # seconds
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket. Tokens refill continuously at `rate` per second up to `capacity`,
+    so short bursts are allowed while the long-run call rate stays at the quota.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens=1):
+        # Waiters queue on the lock so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class CombinedLimiter:
+    """
+    Takes a token from each limiter in turn, e.g. a shared quota and a smaller budget
+    for background work, so calls stay inside both.
+    """
+
+    def __init__(self, *limiters):
+        self.limiters = limiters
+
+    async def acquire(self, tokens=1):
+        for limiter in self.limiters:
+            await limiter.acquire(tokens)
+
+
+def open_weather_limiter():
+    return TokenBucket(rate=OPEN_WEATHER_CALLS_PER_MINUTE / 60.0, capacity=OPEN_WEATHER_BURST)
+
+
+def backoff_delay(attempt, retry_after=None):
+    # Honour the server's Retry-After when it sends one, otherwise use full jitter
+    if retry_after is not None:
+        try:
+            return min(BACKOFF_CAP, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+async def fetch_json(session, url, params, limiter, semaphore, source=None):
+    """
+    Fetches one JSON document, retrying 429/5xx responses and connection errors with jittered backoff.
+    Calls, bytes and retries are recorded under `source` (the URL's host by default).
+
+    Returns:
+    - the decoded JSON body, or None if the call failed for good
+    """
+    source = source or urlparse(url).netloc
+    for attempt in range(MAX_RETRIES + 1):
+        retry_after = None
+        await limiter.acquire()
+        if attempt:
+            record_retry(source)
+        async with semaphore:
+            try:
+                async with session.get(url, params=params) as response:
+                    body = await response.read()
+                    record_call(source, len(body), response.status)
+                    if response.status == 200:
+                        return json.loads(body)
+                    if response.status not in RETRY_STATUSES:
+                        logger.error(f"Request to {url} failed with status {response.status}")
+                        return None
+                    retry_after = response.headers.get("Retry-After")
+                    logger.warning(f"Request to {url} returned {response.status} (attempt {attempt + 1})")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                record_call(source, status=type(e).__name__)
+                logger.warning(f"Request to {url} raised {e!r} (attempt {attempt + 1})")
+            except ValueError as e:
+                # A 200 whose body is not JSON, e.g. an HTML error page from a proxy
+                logger.warning(f"Request to {url} raised {e!r} (attempt {attempt + 1})")
+
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+    logger.error(f"Giving up on {url} after {MAX_RETRIES + 1} attempts")
+    return None
+
+
+async def fetch_day_summaries(url, lat, lon, dates, api_key, limiter=None, max_in_flight=None, session=None,
+                              source="openweather"):
+    """
+    Fetches OpenWeather day_summary documents for many dates concurrently.
+
+    Parameters:
+    - url: str, the day_summary endpoint
+    - lat, lon: float, coordinates of the location
+    - dates: list of date/datetime, the days to fetch
+    - api_key: str, OpenWeather API key
+    - limiter: TokenBucket, shared rate limiter (one is created from the quota settings if omitted)
+    - max_in_flight: int, upper bound on concurrent requests
+    - session: aiohttp.ClientSession to reuse (a pooled one is created if omitted)
+
+    Returns:
+    - list with one entry per date, in the same order; failed days are None
+    """
+    limiter = limiter or open_weather_limiter()
+    max_in_flight = max_in_flight or OPEN_WEATHER_MAX_IN_FLIGHT
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def fetch_all(session):
+        tasks = [
+            fetch_json(
+                session,
+                url,
+                {"lat": lat, "lon": lon, "date": day.strftime("%Y-%m-%d"), "appid": api_key},
+                limiter,
+                semaphore,
+                source,
+            )
+            for day in dates
+        ]
+        # gather keeps results in submission order, so days come back reassembled
+        return await asyncio.gather(*tasks)
+
+    if session is not None:
+        return await fetch_all(session)
+
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        return await fetch_all(session)
@@ -0,0 +1,263 @@
+import numpy as np
+
+# Columns kept from each OpenWeather day_summary document, and where they live in it
+FIELDS = {
+    "temp_min": ("temperature", "min"),
+    "temp_max": ("temperature", "max"),
+    "temp_afternoon": ("temperature", "afternoon"),
+    "humidity": ("humidity", "afternoon"),
+    "precipitation": ("precipitation", "total"),
+}
+
+NOTABLE_RAINFALL_MM = 10  # Arbitrary threshold for notable rainfall
+HEAT_THRESHOLD_K = 303.15  # 30 °C daily maximum
+DRY_DAY_MM = 1.0  # days with less precipitation than this count towards a dry spell
+ROLLING_WINDOWS = [7, 30]
+PERCENTILES = [10, 50, 90]
+SEASONS = ["DJF", "MAM", "JJA", "SON"]
+
+
+class WeatherSeries:
+    """
+    Daily weather for one location held as one NumPy array per field, sorted by date.
+
+    Parameters:
+    - dates: array-like of dates (datetime64[D] or YYYY-MM-DD strings)
+    - columns: dict of field name -> array-like of floats, aligned with dates
+    """
+
+    def __init__(self, dates, columns):
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        order = np.argsort(dates, kind="stable")
+        self.dates = dates[order]
+        self.columns = {name: np.asarray(values, dtype="float64")[order] for name, values in columns.items()}
+
+    @classmethod
+    def from_day_summaries(cls, weather_data):
+        # Single pass over the documents; everything after this works on whole arrays
+        rows = [
+            (day["date"], *(day[group][key] for group, key in FIELDS.values()))
+            for day in weather_data
+        ]
+        if not rows:
+            return cls(np.array([], dtype="datetime64[D]"), {name: [] for name in FIELDS})
+        dates, *values = zip(*rows)
+        return cls(dates, dict(zip(FIELDS, values)))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+
+def present(values):
+    # Days without a value for a field (NaN, e.g. left out of the API response) are skipped
+    return values[~np.isnan(values)]
+
+
+def rounded(value):
+    # None where a group or window had no values at all
+    return None if np.isnan(value) else round(value.item(), 2)
+
+
+def sequential_sum(values):
+    # cumsum adds left to right like the built-in sum(), so totals match the old code to the last bit
+    return np.cumsum(values)[-1].item() if len(values) else 0
+
+
+def longest_run(mask, dates):
+    """
+    Finds the longest run of consecutive days where `mask` holds. A gap in the dates ends a run.
+
+    Returns:
+    - dict with the run length in days and its first and last date, or length 0
+    """
+    consecutive = np.concatenate([[False], np.diff(dates).astype(int) == 1])
+    # A run starts wherever the mask holds but did not hold on the previous consecutive day
+    starts = mask & ~(np.concatenate([[False], mask[:-1]]) & consecutive)
+    run_ids = np.cumsum(starts)
+    lengths = np.bincount(run_ids[mask], minlength=run_ids[-1] + 1 if len(run_ids) else 1)
+    if lengths.max(initial=0) == 0:
+        return {"days": 0}
+    best = int(lengths.argmax())
+    indices = np.flatnonzero(mask & (run_ids == best))
+    return {
+        "days": int(lengths[best]),
+        "start": str(dates[indices[0]]),
+        "end": str(dates[indices[-1]]),
+    }
+
+
+def rolling_extreme(values, dates, window, reduce="sum"):
+    # Window sums from the difference of two cumulative sums; no per-day Python work
+    if len(values) < window:
+        return None
+    missing = np.isnan(values)
+    cumulative = np.concatenate([[0.0], np.cumsum(np.where(missing, 0.0, values))])
+    sums = cumulative[window:] - cumulative[:-window]
+    totals = sums if reduce == "sum" else sums / window
+    # Windows with a missing day are left out rather than counted as if it had been zero
+    gaps = np.concatenate([[0], np.cumsum(missing)])
+    complete = gaps[window:] == gaps[:-window]
+    if not complete.any():
+        return None
+    best = int(np.where(complete, totals, -np.inf).argmax())
+    return {"value": round(totals[best].item(), 2), "end": str(dates[best + window - 1])}
+
+
+def grouped_statistics(series, group_keys):
+    """
+    Min/max/mean temperature, mean humidity and total precipitation per group, each over
+    the days of the group that have a value for it.
+
+    Parameters:
+    - series: WeatherSeries
+    - group_keys: array of group labels, one per day
+
+    Returns:
+    - list of dicts, one per group in sorted label order
+    """
+    labels, inverse = np.unique(group_keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(labels))
+
+    def sums(values):
+        # Per-group total and number of days with a value
+        known = ~np.isnan(values)
+        return (
+            np.bincount(inverse[known], weights=values[known], minlength=len(labels)),
+            np.bincount(inverse[known], minlength=len(labels)),
+        )
+
+    # fmin/fmax skip NaN, so a group stays NaN only if it has no value at all
+    temp_min = np.full(len(labels), np.nan)
+    temp_max = np.full(len(labels), np.nan)
+    np.fmin.at(temp_min, inverse, series["temp_min"])
+    np.fmax.at(temp_max, inverse, series["temp_max"])
+    afternoon_total, afternoon_days = sums(series["temp_afternoon"])
+    humidity_total, humidity_days = sums(series["humidity"])
+    precipitation, precipitation_days = sums(series["precipitation"])
+    with np.errstate(invalid="ignore"):
+        temp_avg = afternoon_total / afternoon_days
+        humidity_avg = humidity_total / humidity_days
+    precipitation[precipitation_days == 0] = np.nan
+
+    return [
+        {
+            "period": str(label),
+            "days": int(count),
+            "temp_min": rounded(low),
+            "temp_max": rounded(high),
+            "temp_avg": rounded(avg),
+            "humidity_avg": rounded(humidity),
+            "precipitation": rounded(total),
+        }
+        for label, count, low, high, avg, humidity, total in zip(
+            labels, counts, temp_min, temp_max, temp_avg, humidity_avg, precipitation
+        )
+    ]
+
+
+def weather_statistics(series):
+    """
+    Multi-period statistics for a daily series: monthly and seasonal breakdowns, rolling
+    window extremes, percentiles, and heat streaks and dry spells.
+    """
+    dates = series.dates
+    months = dates.astype("datetime64[M]")
+    month_numbers = months.astype(int) % 12 + 1
+    years = dates.astype("datetime64[Y]").astype(int) + 1970
+
+    # Meteorological seasons; December belongs to the following year's winter
+    season_years = years + (month_numbers == 12)
+    season_labels = np.char.add(
+        np.char.add(season_years.astype(str), "-"),
+        np.array(SEASONS)[(month_numbers % 12) // 3],
+    )
+
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        rolling[f"{window}_day"] = {
+            "max_precipitation": rolling_extreme(series["precipitation"], dates, window, "sum"),
+            "warmest_temp_avg": rolling_extreme(series["temp_afternoon"], dates, window, "mean"),
+        }
+
+    percentiles = {}
+    for name in ("temp_min", "temp_max", "precipitation"):
+        values = present(series[name])
+        values = np.percentile(values, PERCENTILES) if values.size else np.full(len(PERCENTILES), np.nan)
+        percentiles[name] = {f"p{p}": rounded(value) for p, value in zip(PERCENTILES, values)}
+
+    return {
+        "monthly": grouped_statistics(series, months.astype(str)),
+        "seasonal": grouped_statistics(series, season_labels),
+        "rolling": rolling,
+        "percentiles": percentiles,
+        "heat_streak": longest_run(series["temp_max"] > HEAT_THRESHOLD_K, dates),
+        "dry_spell": longest_run(series["precipitation"] < DRY_DAY_MM, dates),
+    }
+
+
+def aggregate_weather_data(weather_data):
+    """
+    Aggregates daily weather into yearly totals, key events and multi-period statistics.
+    A value missing on some days (NaN in the series) is left out of that field's figures,
+    so averages are over the days that have it.
+
+    Parameters:
+    - weather_data: list of OpenWeather day_summary dicts, or a WeatherSeries
+
+    Returns:
+    - dict with temperature, humidity, total_precipitation, key_events and statistics
+
+    Raises:
+    - ValueError if there are no days, or a field has no value on any day
+    """
+    if isinstance(weather_data, WeatherSeries):
+        series, days = weather_data, None
+    else:
+        series, days = WeatherSeries.from_day_summaries(weather_data), weather_data
+    if len(series) == 0:
+        raise ValueError("No weather data to aggregate")
+    known = {name: present(series[name]) for name in FIELDS}
+    empty = [name for name, values in known.items() if values.size == 0]
+    if empty:
+        raise ValueError(f"No values for {', '.join(empty)} on any of {len(series)} days")
+
+    # Aggregating temperature, humidity, cloud cover, etc.
+    temp_min = known["temp_min"].min().item()
+    temp_max = known["temp_max"].max().item()
+    temp_avg = sequential_sum(known["temp_afternoon"]) / known["temp_afternoon"].size
+    humidity_avg = sequential_sum(known["humidity"]) / known["humidity"].size
+    total_precipitation = sequential_sum(known["precipitation"])
+
+    hottest = series["temp_max"] == temp_max
+    rainy = series["precipitation"] > NOTABLE_RAINFALL_MM
+    if days is not None:
+        # Report the values exactly as the API sent them
+        by_date = sorted(days, key=lambda day: day["date"])
+        temp_min = by_date[int(np.nanargmin(series["temp_min"]))]["temperature"]["min"]
+        temp_max = by_date[int(np.nanargmax(series["temp_max"]))]["temperature"]["max"]
+
+    key_events = []
+    for i in np.flatnonzero(hottest | rainy):
+        date = by_date[i]["date"] if days is not None else str(series.dates[i])
+        precipitation = by_date[i]["precipitation"]["total"] if days is not None else series["precipitation"][i].item()
+        if hottest[i]:
+            key_events.append(f"Highest temperature recorded on {date} with {temp_max}K")
+        if rainy[i]:
+            key_events.append(f"Notable rainfall of {precipitation}mm on {date}")
+
+    return {
+        "temperature": {
+            "min": temp_min,
+            "max": temp_max,
+            "average": temp_avg
+        },
+        "humidity": {
+            "average": humidity_avg
+        },
+        "total_precipitation": total_precipitation,
+        "key_events": key_events,
+        "statistics": weather_statistics(series),
+    }
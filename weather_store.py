@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from cache import COORDINATE_PRECISION
+from weather_series import WeatherSeries
+
+logger = logging.getLogger(__name__)
+
+WEATHER_STORE_DIR = os.getenv("WEATHER_STORE_DIR", "weather_store")
+
+# Merges run in worker threads; one at a time so no thread's new days are lost to another's rewrite
+_append_lock = threading.Lock()
+
+# One fixed-size record per day. The fields used by aggregate_weather_data stay float64 so
+# results are unchanged; the extra fields are kept at float32 to save space.
+DAY_DTYPE = np.dtype([
+    ("date", "datetime64[D]"),
+    ("temp_min", "f8"),
+    ("temp_max", "f8"),
+    ("temp_afternoon", "f8"),
+    ("humidity", "f8"),
+    ("precipitation", "f8"),
+    ("temp_morning", "f4"),
+    ("temp_evening", "f4"),
+    ("temp_night", "f4"),
+    ("pressure", "f4"),
+    ("cloud_cover", "f4"),
+    ("wind_speed", "f4"),
+    ("wind_direction", "f4"),
+])
+
+# Where each field lives in an OpenWeather day_summary document
+DAY_SUMMARY_PATHS = {
+    "temp_min": ("temperature", "min"),
+    "temp_max": ("temperature", "max"),
+    "temp_afternoon": ("temperature", "afternoon"),
+    "humidity": ("humidity", "afternoon"),
+    "precipitation": ("precipitation", "total"),
+    "temp_morning": ("temperature", "morning"),
+    "temp_evening": ("temperature", "evening"),
+    "temp_night": ("temperature", "night"),
+    "pressure": ("pressure", "afternoon"),
+    "cloud_cover": ("cloud_cover", "afternoon"),
+    "wind_speed": ("wind", "max", "speed"),
+    "wind_direction": ("wind", "max", "direction"),
+}
+
+
+def _lookup(document, path):
+    for key in path:
+        if not isinstance(document, dict) or key not in document:
+            return np.nan
+        document = document[key]
+    return np.nan if document is None else document
+
+
+def day_records(day_summaries):
+    """
+    Converts OpenWeather day_summary documents into a structured array of DAY_DTYPE records.
+    Fields missing from a document are stored as NaN.
+    """
+    records = np.empty(len(day_summaries), dtype=DAY_DTYPE)
+    records["date"] = [day["date"] for day in day_summaries]
+    for name, path in DAY_SUMMARY_PATHS.items():
+        records[name] = [_lookup(day, path) for day in day_summaries]
+    return records
+
+
+def to_day_summaries(records, lat=None, lon=None):
+    """
+    Exports records back to the day_summary JSON shape, for code and files that expect it.
+    """
+    days = []
+    for record in records.tolist():
+        values = dict(zip(DAY_DTYPE.names, record))
+        day = {"lat": lat, "lon": lon, "date": str(values.pop("date")), "units": "standard"}
+        for name, path in DAY_SUMMARY_PATHS.items():
+            value = values[name]
+            if value != value:  # NaN: the field was missing
+                continue
+            if DAY_DTYPE[name] == np.float32:
+                value = float(f"{value:.7g}")  # drop float32 noise, e.g. 1013.2 rather than 1013.2000122
+            target = day
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+        days.append(day)
+    return days
+
+
+def to_series(records):
+    return WeatherSeries(
+        records["date"],
+        {name: records[name] for name in ("temp_min", "temp_max", "temp_afternoon", "humidity", "precipitation")},
+    )
+
+
+def select_range(records, start_date, end_date):
+    start = np.datetime64(start_date.strftime("%Y-%m-%d"), "D")
+    end = np.datetime64(end_date.strftime("%Y-%m-%d"), "D")
+    # Records are kept sorted by date, so the range is a contiguous slice
+    lo, hi = np.searchsorted(records["date"], [start, end], side="left")
+    if hi < len(records) and records["date"][hi] == end:
+        hi += 1
+    return records[lo:hi]
+
+
+def missing_dates(records, start_date, end_date):
+    """
+    Lists the days in a range that have no stored record, i.e. were never fetched or failed.
+
+    Returns:
+    - array of datetime64[D]
+    """
+    start = np.datetime64(start_date.strftime("%Y-%m-%d"), "D")
+    end = np.datetime64(end_date.strftime("%Y-%m-%d"), "D")
+    wanted = np.arange(start, end + 1, dtype="datetime64[D]")
+    return wanted[~np.isin(wanted, records["date"])]
+
+
+def location_path(lat, lon, store_dir=None):
+    store_dir = store_dir or WEATHER_STORE_DIR
+    return os.path.join(store_dir, f"{lat:.{COORDINATE_PRECISION}f}_{lon:.{COORDINATE_PRECISION}f}.npy")
+
+
+def load_days(lat, lon, store_dir=None, mmap=True):
+    """
+    Loads the stored daily records for a location. The file is memory-mapped by default,
+    so opening it costs almost nothing and only the pages that are used get read. Pass
+    mmap=False where the file may be replaced while the records are in use: Windows will not
+    replace a file that is still mapped.
+
+    Returns:
+    - structured array of DAY_DTYPE sorted by date (empty if nothing is stored yet)
+    """
+    path = location_path(lat, lon, store_dir)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=DAY_DTYPE)
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def append_days(lat, lon, records, store_dir=None):
+    """
+    Merges new daily records into a location's file. Newer records replace stored ones for
+    the same date, and the file is rewritten atomically so readers never see a partial write.
+
+    Returns:
+    - the merged records
+    """
+    path = location_path(lat, lon, store_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with _append_lock:
+        merged = np.concatenate([records, load_days(lat, lon, store_dir, mmap=False)])
+        # np.unique keeps the first occurrence of each date, i.e. the new record
+        _, first = np.unique(merged["date"], return_index=True)
+        merged = merged[first]
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as tmp_file:
+            np.save(tmp_file, merged)
+        os.replace(tmp_path, path)
+    return merged
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a stored weather series to day_summary JSON")
+    parser.add_argument("lat", type=float)
+    parser.add_argument("lon", type=float)
+    parser.add_argument("--output", help="file to write, defaults to stdout")
+    args = parser.parse_args()
+
+    days = to_day_summaries(load_days(args.lat, args.lon), args.lat, args.lon)
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump(days, json_file, indent=4)
+    else:
+        print(json.dumps(days, indent=4))
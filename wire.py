@@ -0,0 +1,231 @@
+import base64
+import os
+import zlib
+
+import numpy as np
+
+from data_sharing import (
+    CollectedData, CollectedDataV2, NdviSummary, PackedArray, SoilLayer, SoilSummary, SourcePoint, WeatherSummary,
+)
+from soil import format_soil_summary
+from weather_series import WeatherSeries, weather_statistics
+
+# Highest CollectedData version this agent sends; 1 pins it to the plain dict
+WIRE_VERSION = int(os.getenv("WIRE_VERSION", "2"))
+# Every version this agent can read
+SUPPORTED_VERSIONS = [1, 2]
+# Decimal places kept exactly when packing float arrays as integers (weather values have two)
+WIRE_SCALE = 100
+NDVI_SCALE = 1000
+ZLIB_LEVEL = 6
+# Integer widths in bits that delta-encoded arrays are stored at
+DELTA_WIDTHS = [16, 32, 64]
+
+# NDVI summary fields carried as typed fields or packed series rather than in "details"
+NDVI_FIELDS = {"mean_ndvi", "max_ndvi", "min_ndvi", "valid_pixels", "periods", "ndvi", "clear_pixels"}
+
+
+def negotiate(accept_versions):
+    """
+    Picks the CollectedData version for a requester.
+
+    Parameters:
+    - accept_versions: the versions listed in its request
+
+    Returns:
+    - the highest version both sides support; 1 when there is none, since every agent reads 1
+    """
+    common = [version for version in accept_versions or [] if version in SUPPORTED_VERSIONS and version <= WIRE_VERSION]
+    return max(common, default=1)
+
+
+def pack_array(values, scale=WIRE_SCALE):
+    """
+    Packs a NumPy array into a PackedArray. Dates, integers and floats that are exact
+    multiples of 1/scale are stored as first differences of integers, which zlib shrinks
+    to a few bytes for regular series; anything else is stored as raw bytes.
+    """
+    values = np.ascontiguousarray(values)
+    stored = None
+    if values.dtype.kind == "M":
+        stored, scale = values.view("int64"), 1
+    elif values.dtype.kind in "iub":
+        stored, scale = values.astype("int64"), 1
+    elif values.dtype.kind == "f" and np.isfinite(values).all():
+        quantized = np.round(values * scale)
+        if np.array_equal(quantized / scale, values) and (np.abs(quantized) < 2 ** 53).all():
+            stored = quantized.astype("int64")
+
+    if stored is None:
+        return PackedArray(dtype=values.dtype.str, shape=list(values.shape), data=_compress(values.tobytes()))
+
+    # The narrowest integer type that holds every difference
+    deltas = np.diff(stored.ravel(), prepend=0)
+    largest = int(np.abs(deltas).max()) if deltas.size else 0
+    width = next(width for width in DELTA_WIDTHS if largest < 2 ** (width - 1))
+    return PackedArray(
+        dtype=values.dtype.str,
+        shape=list(values.shape),
+        encoding=f"delta-int{width}",
+        scale=scale,
+        data=_compress(deltas.astype(f"<i{width // 8}").tobytes()),
+    )
+
+
+def unpack_array(packed):
+    raw = zlib.decompress(base64.b64decode(packed.data))
+    dtype = np.dtype(packed.dtype)
+    if packed.encoding == "raw":
+        return np.frombuffer(raw, dtype=dtype).reshape(packed.shape)
+    if packed.encoding not in {f"delta-int{width}" for width in DELTA_WIDTHS}:
+        raise ValueError(f"Unknown array encoding: {packed.encoding}")
+
+    width = int(packed.encoding[len("delta-int"):])
+    values = np.cumsum(np.frombuffer(raw, dtype=f"<i{width // 8}"), dtype="int64")
+    if dtype.kind == "M":
+        values = values.view(dtype)
+    elif dtype.kind == "f":
+        values = (values / packed.scale).astype(dtype)
+    else:
+        values = values.astype(dtype)
+    return values.reshape(packed.shape)
+
+
+def _compress(data):
+    return base64.b64encode(zlib.compress(data, ZLIB_LEVEL)).decode("ascii")
+
+
+def encode_collected_data(data, version=1, correlation_id="", daily=None):
+    """
+    Builds the CollectedData message for a negotiated version.
+
+    Parameters:
+    - data: dict, the collected data as built by the data collection agent
+    - version: from negotiate()
+    - daily: optional WeatherSeries the weather summary was computed from; version 2 sends
+      it as packed arrays in place of the precomputed statistics
+
+    Returns:
+    - CollectedData (version 1) or CollectedDataV2
+    """
+    if version < 2:
+        return CollectedData(data=data, correlation_id=correlation_id)
+    if "error" in data:
+        return CollectedDataV2(error=str(data["error"]), correlation_id=correlation_id)
+
+    weather = data.get("weather_data")
+    if weather is not None:
+        weather = WeatherSummary(
+            temp_min=weather["temperature"]["min"],
+            temp_max=weather["temperature"]["max"],
+            temp_avg=weather["temperature"]["average"],
+            humidity_avg=weather["humidity"]["average"],
+            total_precipitation=weather["total_precipitation"],
+            key_events=weather["key_events"],
+            daily={} if daily is None else dict(
+                {"date": pack_array(daily.dates)}, **{name: pack_array(values) for name, values in daily.columns.items()}
+            ),
+        )
+
+    soil = data.get("soil_report")
+    if soil is not None:
+        soil = SoilSummary(
+            coordinates=soil["coordinates"],
+            probe_distance_km=soil["probe_distance_km"],
+            layers=[SoilLayer(**layer) for layer in soil["layers"]],
+        )
+
+    location = data.get("location") or {}
+    return CollectedDataV2(
+        correlation_id=correlation_id,
+        city=location.get("city", ""),
+        lat=location.get("lat"),
+        lon=location.get("lon"),
+        country_code=data.get("country_code") or "",
+        weather=weather,
+        soil=soil,
+        ndvi=encode_ndvi(data["ndvi_data"]) if "ndvi_data" in data else None,
+        source_points={stage: SourcePoint(**point) for stage, point in data.get("source_points", {}).items()},
+        errors=data.get("errors", {}),
+    )
+
+
+def encode_ndvi(summary):
+    if not isinstance(summary, dict):
+        # An error message in place of the report
+        return NdviSummary(details={"summary": str(summary)})
+
+    series = {}
+    if "periods" in summary:
+        series = {
+            "period": pack_array(np.array(summary["periods"], dtype="datetime64[D]")),
+            "ndvi": pack_array(np.array([np.nan if value is None else value for value in summary["ndvi"]]), NDVI_SCALE),
+            "clear_pixels": pack_array(np.array(summary["clear_pixels"], dtype="int64")),
+        }
+    return NdviSummary(
+        mean_ndvi=summary.get("mean_ndvi"),
+        max_ndvi=summary.get("max_ndvi"),
+        min_ndvi=summary.get("min_ndvi"),
+        valid_pixels=summary.get("valid_pixels"),
+        series=series,
+        details={key: value for key, value in summary.items() if key not in NDVI_FIELDS},
+    )
+
+
+def decode_collected_data(msg):
+    """
+    Turns either CollectedData version back into the collected data dict, so everything
+    downstream of the message handlers works the same whichever version arrived.
+    Version 2 weather statistics are recomputed from the daily series when it was sent.
+    """
+    if isinstance(msg, CollectedData):
+        return msg.data
+    if msg.error:
+        return {"error": msg.error}
+
+    data = {}
+    if msg.weather is not None:
+        weather = msg.weather
+        data["weather_data"] = {
+            "temperature": {"min": weather.temp_min, "max": weather.temp_max, "average": weather.temp_avg},
+            "humidity": {"average": weather.humidity_avg},
+            "total_precipitation": weather.total_precipitation,
+            "key_events": list(weather.key_events),
+            "statistics": {},
+        }
+        if weather.daily:
+            columns = {name: unpack_array(packed) for name, packed in weather.daily.items()}
+            series = WeatherSeries(columns.pop("date"), columns)
+            data["weather_data"]["statistics"] = weather_statistics(series)
+
+    if msg.soil is not None:
+        report = {
+            "coordinates": msg.soil.coordinates,
+            "probe_distance_km": msg.soil.probe_distance_km,
+            "layers": [layer.dict() for layer in msg.soil.layers],
+        }
+        data["soil_data"] = format_soil_summary(report)
+        data["soil_report"] = report
+
+    if msg.ndvi is not None:
+        data["ndvi_data"] = decode_ndvi(msg.ndvi)
+    if msg.country_code:
+        data["country_code"] = msg.country_code
+    data["source_points"] = {stage: point.dict() for stage, point in msg.source_points.items()}
+    if msg.errors:
+        data["errors"] = dict(msg.errors)
+    if msg.city or msg.lat is not None:
+        data["location"] = {"city": msg.city, "lat": msg.lat, "lon": msg.lon}
+    return data
+
+
+def decode_ndvi(ndvi):
+    summary = dict(ndvi.details)
+    for name in ("mean_ndvi", "max_ndvi", "min_ndvi", "valid_pixels"):
+        if getattr(ndvi, name) is not None:
+            summary[name] = getattr(ndvi, name)
+    if ndvi.series:
+        summary["periods"] = [str(day) for day in unpack_array(ndvi.series["period"])]
+        summary["ndvi"] = [round(float(value), 3) if np.isfinite(value) else None for value in unpack_array(ndvi.series["ndvi"])]
+        summary["clear_pixels"] = [int(count) for count in unpack_array(ndvi.series["clear_pixels"])]
+    return summary